@@ -4,18 +4,26 @@ from typing import TYPE_CHECKING, Optional, Any, Literal, TypedDict
 import aiohttp, json, os
 import deprecated
 from lires.utils import random_alphanumeric
-from lires.types.dataT import DataPointSummary
+from lires.types.dataT import DataPointSummary, SummaryBatch
 if TYPE_CHECKING:
     from lires.core.dataClass import DataPointSummary
+    from lires.core.dbConn import JournalPageT
+    from lires.core.backup import BackupStatsT
     from lires_server.types import ServerStatus
     from lires.user import UserInfo
 
 JsonDumpable = list | dict | str | int | float | bool | None
-SearchType = Literal[ 'title', 'author', 'year', 'note', 'publication', 'feature', 'uuid'] | None
+SearchType = Literal[ 'title', 'author', 'year', 'note', 'publication', 'feature', 'uuid', 'query'] | None
 ReturnType = Literal['json', 'text']
 class SearchRes(TypedDict):
     uids: list[str]
     scores: list[float]
+class KeysPage(TypedDict):
+    uids: list[str]
+    next_cursor: Optional[str]     # None if it is the last page
+class BulkImportResult(TypedDict):
+    uuid: Optional[str]
+    error: Optional[str]
 
 class Connector(LiresAPIBase):
     def __init__(
@@ -150,6 +158,23 @@ class ServerConn:
     async def get_all_keys(self) -> list[str]:
         return await self.__c.get("/api/database/keys")
 
+    async def get_keys_page(self, limit: int = 1000, cursor: Optional[str] = None) -> KeysPage:
+        """ Get a page of uuids (newest first), pass the next_cursor of the previous page to get the next one """
+        params: dict[str, JsonDumpable] = {"limit": limit}
+        if cursor is not None:
+            params["cursor"] = cursor
+        return await self.__c.get("/api/database/keys", params)
+
+    async def get_changes(self, since: int = 0, limit: Optional[int] = None) -> JournalPageT:
+        """
+        Get the changes after the sequence number 'since' (the 'latest' of the previous call), 
+        if 'resync' is true, the changes are incomplete, should fetch all data again
+        """
+        params: dict[str, JsonDumpable] = {"since": since}
+        if limit is not None:
+            params["limit"] = limit
+        return await self.__c.get("/api/database/changes", params)
+
     async def get_datapoint_summary(self, uuid: str) -> DataPointSummary:
         data = await self.__c.get(f"/api/datainfo/{uuid}")
         return DataPointSummary(**data)
@@ -158,6 +183,24 @@ class ServerConn:
         data = await self.__c.post("/api/datainfo-list", {"uids": uuids})
         return [DataPointSummary(**x) for x in data]
 
+    async def get_datapoint_summary_batch(self, uuids: list[str]) -> SummaryBatch:
+        """ Get the summaries by columns, lighter than get_datapoint_summaries for many entries """
+        data = await self.__c.post("/api/datainfo-list", {"uids": uuids, "columns": "true"})
+        return SummaryBatch(data)
+    
+    async def get_datapoint_summaries_page(
+        self, limit: int = 1000, cursor: Optional[str] = None
+        ) -> tuple[list[DataPointSummary], Optional[str]]:
+        """
+        Get a page of summaries of the database (newest first), 
+        return the summaries and the cursor for the next page (None if it is the last page)
+        """
+        params: dict[str, JsonDumpable] = {"limit": limit}
+        if cursor is not None:
+            params["cursor"] = cursor
+        data = await self.__c.post("/api/datainfo-list", params)
+        return [DataPointSummary(**x) for x in data["data"]], data["next_cursor"]
+
     async def get_datapoint_abstract(self, uuid: str) -> str:
         return await self.__c.get(f"/api/datainfo-supp/abstract/{uuid}", return_type="text")
 
@@ -176,6 +219,13 @@ class ServerConn:
     async def delete_tag_all(self, tag: str):
         return await self.__c.post(f"/api/database/tag-delete", {"tag": tag}, return_type="text")
     
+    async def backup_databases(self, usernames: Optional[list[str]] = None) -> dict[str, BackupStatsT]:
+        """ Backup the databases (of all users if not given) on the server, admin only, return {user id: stats} """
+        params: dict[str, JsonDumpable] = {}
+        if usernames is not None:
+            params["usernames"] = usernames
+        return await self.__c.post("/api/database/backup", params)
+    
     async def delete_datapoint(self, uuid: str):
         return await self.__c.post(f"/api/dataman/delete", {
             "uuid": uuid
@@ -231,6 +281,19 @@ class ServerConn:
         res = await self.__c.post("/api/dataman/update", params)
         return DataPointSummary(**res)
     
+    async def bulk_import(self, citations: list[str], tags: list[str] = []) -> list[BulkImportResult]:
+        """
+        Create many entries at once, each citation should be a bibtex string of a single entry.
+        Return a result for each citation, in the same order, 
+        the `uuid` is None if the entry is not created (e.g. invalid bibtex or duplicate), 
+        and `error` tells the reason.
+        """
+        params = {
+            "citations": citations,
+            "tags": tags,
+        }
+        return await self.__c.post("/api/dataman/bulk-import", params)
+    
     async def query(
         self, 
         tags: list[str] = [],
@@ -0,0 +1,46 @@
+"""
+Online backup of the user databases,
+can be run while the server is running, the repeated backups only copy the changed files
+"""
+import argparse, asyncio, os
+from lires.config import BACKUP_HOME
+from lires.loader import init_resources
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backup the user databases")
+    parser.add_argument("users", nargs="*", type=str, help="user names, backup all users if not given")
+    parser.add_argument("-o", "--output", action="store", type=str, default=BACKUP_HOME,
+                        help="backup directory, the databases are backed up to <output>/<user id>, default: {}".format(BACKUP_HOME))
+    return parser.parse_args()
+
+async def entry(args):
+    user_pool, db_pool = await init_resources()
+    try:
+        if args.users:
+            users = []
+            for username in args.users:
+                user = await user_pool.get_user_by_username(username)
+                if user is None:
+                    print(f"Error: User {username} does not exist")
+                    return
+                users.append(user)
+        else:
+            users = await user_pool.all()
+
+        for user in users:
+            stats = (await db_pool.backup([user], args.output))[user.id]
+            print("{}: {} of {} files copied ({:.1f} MB), {} removed, in {:.2f}s -> {}".format(
+                (await user.info())["username"], stats["n_copied"], stats["n_files"],
+                stats["bytes_copied"]/1048576, stats["n_removed"], stats["time"],
+                os.path.join(args.output, str(user.id))
+                ))
+    finally:
+        await user_pool.close()
+        await db_pool.close()
+
+def main():
+    args = parse_arguments()
+    asyncio.run(entry(args))
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,9 @@ def main():
     parser_edit_config = sub_parser.add_parser("edit-config", help="edit configuration file")
     parser_edit_config.add_argument("-u", "--use_editor", default="", help="choose editor, e.g. . -u vim will invoke 'vim <config>.json'")
 
+    sub_parser.add_parser("migrate-files", help="move the documents and attachments of all users to the sharded file layout, can be run while the server is running")
+    sub_parser.add_parser("dedupe-docs", help="move the documents of all users into the content-addressed store (db_blob_store of the configuration), report the bytes saved")
+
     args = parser.parse_args()
 
     if args.subparser == "init-pdfjs":
@@ -28,6 +31,23 @@ def main():
         else:
             open_file(CONF_FILE_PATH)
 
+    if args.subparser == "dedupe-docs":
+        from lires.config import get_conf
+        from lires.loader import DatabasePool
+        import asyncio
+        if not get_conf()['db_blob_store']:
+            print("Error: the blob store is not enabled, set db_blob_store to true in the configuration first")
+            exit(1)
+        stats = asyncio.run(DatabasePool().dedupe_documents())
+        print("{} documents checked, {} replaced by links, {:.1f} MB saved".format(
+            stats["n_files"], stats["n_linked"], stats["bytes_saved"]/1048576
+            ))
+
+    if args.subparser == "migrate-files":
+        from lires.loader import DatabasePool
+        import asyncio
+        stats = asyncio.run(DatabasePool().migrate_file_layout())
+        print("{} entries moved, {} skipped".format(stats["n_moved"], stats["n_skipped"]))
 
 if __name__ == "__main__":
     main()
@@ -19,6 +19,8 @@ WEBPAGE = "https://github.com/MenxLi/Lires"
 # ├── Users
 # │   ├── user.db
 # │   └── avatar
+# ├── Backup [BACKUP_HOME]
+# │   └── ...
 # ├── Lires.cache [TMP_DIR]
 # │   └── ...
 
@@ -35,6 +37,8 @@ DATABASE_DIR = join(LRS_HOME, "Database")   # will be deprecated
 
 DATABASE_HOME = join(LRS_HOME, "Data")
 USER_DIR = join(LRS_HOME, "Users")
+# default destination of the database backups, see lrs-backup
+BACKUP_HOME = join(LRS_HOME, "Backup")
 
 # for log files
 LOG_DIR = os.path.join(LRS_HOME, "log")
@@ -66,6 +70,11 @@ __default_config: LiresConfT = {
     'default_user_max_storage': '512m',
     'service_port_range': [21000, 22000],
     'allow_public_query': True,
+    'db_reader_pool_size': 2,
+    'db_durability': 'group',
+    'db_group_commit_ms': 50,
+    'db_blob_store': False,
+    'db_datapoint_cache_size': 1024,
 }
 __essential_config_keys = []  # keys that must be in the configuration file
 __g_config: Optional[LiresConfT] = None     # buffer
@@ -114,6 +123,9 @@ def get_conf() -> LiresConfT:
             "Invalid database id: {}".format(conf["group"]) + ", must be alphanumeric or underscore"
         assert conf['default_user_max_storage'][-1].lower() in ["m", "g", "t"], "Invalid storage unit"
         assert conf['default_user_max_storage'][:-1].isdigit(), "Invalid storage size"
+        assert conf['db_reader_pool_size'] >= 0, "Invalid database reader pool size"
+        assert conf['db_durability'] in ["immediate", "group", "periodic"], "Invalid database durability mode"
+        assert conf['db_group_commit_ms'] >= 0, "Invalid database group commit window"
         
         __g_config = conf
 
@@ -0,0 +1,148 @@
+"""
+Online backup of a database directory,
+the sqlite databases are copied with the backup API while the database is in use,
+other files (documents, attachments, summaries) are copied incrementally,
+only the new or changed files (by content hash) since the last backup are copied.
+
+The backup directory has the same structure as the database directory,
+plus a manifest file recording the size, modification time and hash of the backed up files.
+"""
+from __future__ import annotations
+import os, json, time, shutil, hashlib, asyncio
+from typing import TypedDict, TYPE_CHECKING
+import aiosqlite
+from .base import LiresBase
+
+if TYPE_CHECKING:
+    from .dataClass import DataBase
+
+MANIFEST_FNAME = "backup-manifest.json"
+# number of pages copied per step of the sqlite backup,
+# the writers can proceed between the steps
+BACKUP_PAGES_PER_STEP = 1024
+_HASH_CHUNK_SIZE = 1024*1024
+
+class ManifestItemT(TypedDict):
+    size: int
+    mtime: float
+    sha256: str
+
+class BackupStatsT(TypedDict):
+    n_files: int            # number of files in the backup, excluding the sqlite databases
+    n_copied: int           # number of files copied by this backup
+    n_removed: int          # number of files removed from the backup (removed from the database)
+    bytes_copied: int
+    time: float             # time spent, in seconds
+
+logger = LiresBase.loggers().core
+# serialize the backups to the same destination
+_backup_locks: dict[str, asyncio.Lock] = {}
+
+async def backup_sqlite(src_path: str, dst_path: str, pages: int = BACKUP_PAGES_PER_STEP):
+    """
+    Copy a sqlite database (can be in use) to dst_path,
+    the copy is done with a separate read-only connection, page by page,
+    and written to a temporary file first, so that the previous backup is kept if failed
+    """
+    tmp_path = dst_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    src = await aiosqlite.connect(f"file:{src_path}?mode=ro", uri=True)
+    try:
+        dst = await aiosqlite.connect(tmp_path)
+        try:
+            await src.backup(dst, pages=pages, sleep=0)
+        finally:
+            await dst.close()
+    finally:
+        await src.close()
+    os.replace(tmp_path, dst_path)
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _sync_files(src_dir: str, dst_dir: str, exclude: set[str]) -> BackupStatsT:
+    """ Copy the files under src_dir to dst_dir incrementally, exclude: relative paths to skip """
+    t_start = time.time()
+    manifest_path = os.path.join(dst_dir, MANIFEST_FNAME)
+    old_manifest: dict[str, ManifestItemT] = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            old_manifest = json.load(f)["files"]
+
+    manifest: dict[str, ManifestItemT] = {}
+    n_copied = bytes_copied = 0
+    for root, _, files in os.walk(src_dir):
+        for fname in files:
+            src = os.path.join(root, fname)
+            rel = os.path.relpath(src, src_dir)
+            if rel in exclude:
+                continue
+            dst = os.path.join(dst_dir, rel)
+            stat = os.stat(src)
+            old = old_manifest.get(rel)
+            if old is not None and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime and os.path.exists(dst):
+                # assume unchanged, skip hashing
+                manifest[rel] = old
+                continue
+            item: ManifestItemT = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": _file_hash(src)}
+            manifest[rel] = item
+            if old is not None and old["sha256"] == item["sha256"] and os.path.exists(dst):
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(src, dst + ".tmp")
+            os.replace(dst + ".tmp", dst)
+            n_copied += 1
+            bytes_copied += stat.st_size
+
+    removed = [rel for rel in old_manifest if rel not in manifest]
+    for rel in removed:
+        if os.path.exists(dst := os.path.join(dst_dir, rel)):
+            os.remove(dst)
+
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump({"time": t_start, "files": manifest}, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return {
+        "n_files": len(manifest), "n_copied": n_copied, "n_removed": len(removed),
+        "bytes_copied": bytes_copied, "time": time.time() - t_start
+    }
+
+async def backup_database(db: DataBase, dst_dir: str) -> BackupStatsT:
+    """
+    Backup the database directory to dst_dir,
+    the database can be modified during the backup,
+    the modifications are committed before the backup
+    """
+    dst_dir = os.path.abspath(dst_dir)
+    src_dir = db.path.main_dir
+    if os.path.commonpath([dst_dir, os.path.abspath(src_dir)]) == os.path.abspath(src_dir):
+        raise ValueError("Backup directory should not be inside the database directory")
+
+    lock = _backup_locks.setdefault(dst_dir, asyncio.Lock())
+    async with lock:
+        t_start = time.time()
+        await logger.info("Backing up {} to {}".format(src_dir, dst_dir))
+        os.makedirs(dst_dir, exist_ok=True)
+        await db.commit()
+
+        exclude = set()
+        for db_path in [db.conn.db_path, db.path.vector_db_file]:
+            rel = os.path.relpath(db_path, src_dir)
+            exclude.update(rel + suffix for suffix in ("", "-wal", "-shm", "-journal"))
+            if os.path.exists(db_path):
+                os.makedirs(os.path.dirname(os.path.join(dst_dir, rel)), exist_ok=True)
+                await backup_sqlite(db_path, os.path.join(dst_dir, rel))
+
+        stats = await asyncio.to_thread(_sync_files, src_dir, dst_dir, exclude)
+        stats["time"] = time.time() - t_start
+        await logger.info("Backup of {} done, {} of {} files copied ({:.1f} MB), {} removed, in {:.2f}s".format(
+            src_dir, stats["n_copied"], stats["n_files"], stats["bytes_copied"]/1048576, stats["n_removed"], stats["time"]
+            ))
+        return stats
+
+__all__ = ["BackupStatsT", "backup_sqlite", "backup_database"]
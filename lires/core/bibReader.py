@@ -7,6 +7,8 @@ import warnings, logging
 import nbib
 from pybtex.database import BibliographyData, Entry
 import pybtex.scanner
+import pybtex.database.input.bibtex
+import pybtex.database.output.bibtex
 from pylatexenc import latex2text
 import multiprocessing as mp
 from ..utils import random_alphanumeric
@@ -39,6 +41,14 @@ async def check_bibtex_validity(
         await onerror("Error when parsing bib string: {}".format(e))
         return False
 
+# pybtex.database.parse_string / BibliographyData.to_string look up the format plugin 
+# through the package entry points on every call, which dominates the parsing time, 
+# so we use the bibtex parser and writer directly
+def _parse_bib_string(bib_str: str) -> BibliographyData:
+    return pybtex.database.input.bibtex.Parser().parse_string(bib_str)
+def _dump_bib_data(bib_data: BibliographyData) -> str:
+    return pybtex.database.output.bibtex.Writer().to_string(bib_data)
+
 class BibParser(LiresBase):
     logger = LiresBase.loggers().core
     def __init__(self, mode = "single"):
@@ -49,17 +59,17 @@ class BibParser(LiresBase):
         """
         Remove abstract from bib string
         """
-        bib_data = pybtex.database.parse_string(bib_str, bib_format="bibtex")
+        bib_data = _parse_bib_string(bib_str)
         for k in bib_data.entries.keys():
             if "abstract" in bib_data.entries[k].fields:
                 bib_data.entries[k].fields.pop("abstract")
-        return bib_data.to_string("bibtex")
+        return _dump_bib_data(bib_data)
     
     @classmethod
     def format(cls, bib_str: str) -> str:
         """ Format bib string """
-        bib_data = pybtex.database.parse_string(bib_str, bib_format="bibtex")
-        return bib_data.to_string("bibtex")
+        bib_data = _parse_bib_string(bib_str)
+        return _dump_bib_data(bib_data)
     
     async def __call__(self, bib_str: str) -> list[dict]:
         """
@@ -76,21 +86,33 @@ class BibParser(LiresBase):
                 "pages": <>,
                 "abstract": <str>
         """
-        bib_data = pybtex.database.parse_string(bib_str, bib_format="bibtex")
+        bibs, warning_msgs = self.parse(bib_str)
+        for msg in warning_msgs:
+            await self.logger.warning(msg)
+        return bibs
+    
+    def parse(self, bib_str: str) -> tuple[list[dict], list[str]]:
+        """
+        Synchronous version of __call__, 
+        return the parsed entries and the warning messages (instead of logging them), 
+        so that it can be used in a worker process
+        """
+        bib_data = _parse_bib_string(bib_str)
         if len(bib_data.entries.keys()) >1 and self.mode == "single":
             warnings.warn("During parsing bib strings, multiple entries found, but single mode is assumed")
 
         bibs = []
+        warning_msgs = []
         for k in bib_data.entries.keys():
             _d = bib_data.entries[k]
             assert "title" in _d.fields, "No title found in bib entry {} ({})".format(k, _d.fields)
 
             if not "year" in _d.fields:
-                await self.logger.warning(f"No year found in bib entry {k} ({_d.fields['title']})")
+                warning_msgs.append(f"No year found in bib entry {k} ({_d.fields['title']})")
                 _d.fields["year"] = date.today().year
             
             if not "author" in _d.persons:
-                await self.logger.warning(f"No author found in bib entry {k} ({_d.fields['title']})")
+                warning_msgs.append(f"No author found in bib entry {k} ({_d.fields['title']})")
                 _d.persons["author"] = ["_"]
 
             data = {
@@ -104,7 +126,7 @@ class BibParser(LiresBase):
                 if bib_entry in _d.fields:
                     data[bib_entry] = _d.fields[bib_entry],
             bibs.append(data)
-        return bibs
+        return bibs, warning_msgs
 
 
 class ParsedRef(TypedDict):
@@ -118,7 +140,17 @@ async def parse_bibtex(bib_single: str) -> ParsedRef:
     """
     parse bibtex and extract useful entries
     """
-    parsed = (await BibParser()(bib_single))[0]
+    return _uniform_parsed((await BibParser()(bib_single))[0])
+
+def parse_bibtex_sync(bib_single: str) -> tuple[ParsedRef, list[str]]:
+    """
+    Synchronous version of parse_bibtex, also return the warning messages, 
+    can be used in a process pool
+    """
+    bibs, warning_msgs = BibParser().parse(bib_single)
+    return _uniform_parsed(bibs[0]), warning_msgs
+
+def _uniform_parsed(parsed: dict) -> ParsedRef:
     publication = ""
     for k in ["journal", "booktitle", "eprint"]:
         if k in parsed:
@@ -137,13 +169,6 @@ async def parse_bibtex(bib_single: str) -> ParsedRef:
         "authors": [ latex2text.latex2text(au) for au in parsed["authors"] ],
         "publication": publication
     }
-# def parallelParseBibtex(bib_strs: list[str]) -> list[ParsedRef]:
-#     N_PROC = mp.cpu_count()-1
-#     if N_PROC > 8:
-#         N_PROC = 8
-#     with mp.Pool(N_PROC) as p:
-#         return p.map(parseBibtex, bib_strs)
-
 
 class BibConverter(LiresBase):
     logger = LiresBase.loggers().core
@@ -190,7 +215,7 @@ class BibConverter(LiresBase):
             f"{data_dict['year']}_{random_alphanumeric(5)}":
             Entry(doc_type, data)
         })
-        return bib_data.to_string("bibtex")
+        return _dump_bib_data(bib_data)
     
     def from_endnote(self, en: str):
         parser = refparser.EndnoteParser()
@@ -0,0 +1,157 @@
+"""
+Content-addressed storage of the documents, shared by the databases (of different users),
+identical documents are stored once, as <root>/<sha256[:2]>/<sha256>,
+and the document paths of the entries (files/<uuid><ext>) are hard links to the blobs.
+
+The reference count of a blob is the link count of its file minus one,
+so the store needs no bookkeeping besides the file system,
+the blob is removed once the last document linking to it is released.
+If the file system does not support hard links (e.g. the database is on another device),
+the document is copied instead, without deduplication.
+"""
+from __future__ import annotations
+import os, shutil, hashlib, threading
+from typing import TypedDict, Optional, Iterable
+
+BLOB_STORE_DIRNAME = ".blobs"
+_HASH_CHUNK_SIZE = 1024*1024
+
+class DedupeStatsT(TypedDict):
+    n_files: int            # number of documents checked
+    n_linked: int           # number of documents replaced by a link to an existing blob
+    bytes_saved: int
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+class BlobStore:
+    """
+    The methods are blocking, and thread-safe,
+    should be called in a thread (e.g. asyncio.to_thread) from the event loop
+    """
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def ref_count(self, digest: str) -> int:
+        """ number of documents linked to the blob """
+        blob = self.blob_path(digest)
+        return os.stat(blob).st_nlink - 1 if os.path.exists(blob) else 0
+
+    def _link(self, blob: str, dst: str):
+        """ replace dst with a link to the blob, atomically """
+        tmp = dst + ".tmp"
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            shutil.copyfile(blob, tmp)
+        os.replace(tmp, dst)
+
+    def _adopt(self, src: str, blob: str) -> bool:
+        """
+        make the file at src a new blob by linking it, 
+        if the file can not be linked, it is kept out of the store (not copied), return if adopted
+        """
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(src, blob)
+            return True
+        except OSError:
+            return False
+
+    def put(self, data: bytes, dst: str) -> str:
+        """ Store the data and link dst to it, the document at dst is released if exists, return the digest """
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self.blob_path(digest)
+        old_digest = self._linked_digest(dst)
+        with self._lock:
+            if os.path.lexists(dst):
+                self._release(dst, old_digest)
+            if not os.path.exists(blob):
+                tmp = dst + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                self._adopt(tmp, blob)
+                os.replace(tmp, dst)
+            else:
+                self._link(blob, dst)
+        return digest
+
+    def put_file(self, path: str) -> int:
+        """
+        Move an existing document into the store,
+        the file is replaced by a link to the blob of the same content if exists,
+        return the number of bytes saved
+        """
+        digest = _file_digest(path)
+        blob = self.blob_path(digest)
+        with self._lock:
+            if not os.path.exists(blob):
+                self._adopt(path, blob)
+                return 0
+            if os.path.samefile(blob, path):
+                return 0
+            size = os.path.getsize(path)
+            self._link(blob, path)
+            return size if os.path.samefile(blob, path) else 0
+
+    def _linked_digest(self, path: str) -> Optional[str]:
+        """ digest of the document if it may be linked to a blob, computed without the lock """
+        if not os.path.exists(path) or os.stat(path).st_nlink == 1:
+            return None
+        return _file_digest(path)
+
+    def _release(self, path: str, digest: Optional[str]):
+        # should be called with the lock held
+        if os.stat(path).st_nlink == 1:
+            # not in the store
+            os.remove(path)
+            return
+        if digest is None:
+            # linked to a blob since checked
+            digest = _file_digest(path)
+        blob = self.blob_path(digest)
+        os.remove(path)
+        if os.path.exists(blob) and os.stat(blob).st_nlink == 1:
+            os.remove(blob)
+
+    def release(self, path: str, digest: Optional[str] = None):
+        """ Remove the document at path, and its blob if no other document links to it """
+        if digest is None:
+            digest = self._linked_digest(path)
+        with self._lock:
+            self._release(path, digest)
+
+    def gc(self) -> int:
+        """ Remove the blobs without any link (e.g. the database was deleted), return the number of removed blobs """
+        n_removed = 0
+        with self._lock:
+            for root, _, fnames in os.walk(self.root):
+                for fname in fnames:
+                    blob = os.path.join(root, fname)
+                    if os.stat(blob).st_nlink == 1:
+                        os.remove(blob)
+                        n_removed += 1
+        return n_removed
+
+    def dedupe(self, paths: Iterable[str]) -> DedupeStatsT:
+        """ Move the existing documents into the store, see put_file """
+        stats: DedupeStatsT = {"n_files": 0, "n_linked": 0, "bytes_saved": 0}
+        for path in paths:
+            stats["n_files"] += 1
+            if (saved := self.put_file(path)) > 0:
+                stats["n_linked"] += 1
+                stats["bytes_saved"] += saved
+        return stats
+
+__all__ = ["BLOB_STORE_DIRNAME", "BlobStore", "DedupeStatsT"]
@@ -1,14 +1,19 @@
 from __future__ import annotations
-import os, asyncio, dataclasses, zipfile
-from io import BytesIO
+import os, asyncio, dataclasses, tempfile
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Union, Optional, Literal
+from typing import List, Union, Optional, Literal, AsyncIterator, Callable, Awaitable
 from .dataTags import DataTags, TagRule
 from .fileTools import FileManipulator
-from .dbConn import DBFileInfo, DBConnection
+from .dbConn import DBFileInfo, DBConnection, SUMMARY_FIELDS
+from .dbQuery import QueryNode, QAnd, QTerm
 from .base import LiresBase
+from .backup import BackupStatsT, backup_database, backup_sqlite
 from ..vector.database import VectorDatabase
-from ..types.dataT import DataPointSummary
+from ..types.dataT import DataPointSummary, SummaryBatch
+from ..utils.author import get_authors_abbr
+from ..utils.compressTools import stream_zip
+from ..utils.lru import LRUCache, CacheStatsT
+from ..config import TMP_DIR
 
 class DataCore(LiresBase):
     logger = LiresBase.loggers().core
@@ -19,16 +24,22 @@ class DataPoint(DataCore):
     Provide quick access to data information and some high-level operations
     """
     MAX_AUTHOR_ABBR = 36
-    fm: FileManipulator
     def __init__(self, summary: DataPointSummary):
         """ The basic data structure that holds single data """
         self.__summary = summary
+        self.__fm: Optional[FileManipulator] = None
 
     async def init(self, db: DataBase) -> DataPoint:
-        self.fm = await FileManipulator(self.summary.uuid).init(db.conn)
         self.__parent = db
         return self
     
+    @property
+    def fm(self) -> FileManipulator:
+        # created on first access, as most datapoints are only used for their summary
+        if self.__fm is None:
+            self.__fm = FileManipulator(self.uuid).bind(self.parent.conn)
+        return self.__fm
+    
     @property
     def summary(self) -> DataPointSummary: return self.__summary
     @property
@@ -72,21 +83,7 @@ class DataPoint(DataCore):
             otherwise return the first author's first name + et al.
         Author name abbreviation has a maximum length of self.MAX_AUTHOR_ABBR
         """
-        if len(authors) == 0:
-            return ""
-        if len(authors) == 1:
-            author = cls._get_first_name(authors[0]) + "."
-        else:
-            author = cls._get_first_name(authors[0]) + " et al."
-        if len(author) < cls.MAX_AUTHOR_ABBR:
-            return author
-        else:
-            return author[:cls.MAX_AUTHOR_ABBR-4] + "..."
-
-    @classmethod
-    def _get_first_name(cls, name: str):
-        x = name.split(", ")
-        return x[0]
+        return get_authors_abbr(authors, cls.MAX_AUTHOR_ABBR)
     
     def __str__(self) -> str:
         return f"{self.year}-{self.title}"
@@ -107,34 +104,37 @@ def sort_datalist(data_list: List[DataPoint], sort_by: SortType) -> List[DataPoi
     else:
         raise ValueError("Unknown sort type")
 
-async def assemble_datapoint(raw_info: DBFileInfo, db: DataBase) -> DataPoint:
+def summary_values(raw_info: DBFileInfo) -> tuple:
+    """
+    The summary field values (in the order of SUMMARY_JSON_FIELDS) of the raw info,
+    raw_info should contain at least the SUMMARY_FIELDS
+    """
+    return (
+        raw_info['type'],                               # doc_type
+        raw_info["doc_size"] > 0,                       # has_file
+        raw_info["doc_ext"],                            # file_type
+        raw_info["year"],
+        raw_info["title"],
+        raw_info["author_abbr"],                        # author
+        raw_info["authors"],
+        raw_info["publication"],
+        raw_info["tags"],
+        raw_info["uuid"],
+        raw_info["url"],
+        raw_info["time_import"],                        # time_added
+        raw_info["time_modify"],                        # time_modified
+        raw_info["bibtex"],
+        round(raw_info["doc_size"]/(1048576), 2),       # doc_size, convert to MB
+        raw_info["note_linecount"],
+        raw_info["has_abstract"],
+    )
 
-    # it's a bit tricky to get file information in one go
-    _fm = await FileManipulator(raw_info["uuid"]).init(db.conn)     # type: ignore
-    _file_size = await _fm.doc_size()
-    _has_file = True if _file_size > 0 else False
-    _file_size = round(_file_size/(1048576), 2) if _has_file else 0 # convert to MB
+async def assemble_datapoint(raw_info: DBFileInfo, db: DataBase) -> DataPoint:
+    """ raw_info should contain at least the SUMMARY_FIELDS """
+    return await DataPoint(DataPointSummary(*summary_values(raw_info))).init(db)
 
-    summary = DataPointSummary(
-        doc_type = raw_info['type'], 
-        has_file =_has_file,
-        file_type=raw_info["doc_ext"],
-        year = raw_info["year"],
-        title = raw_info["title"],
-        authors = raw_info["authors"],
-        author = DataPoint.get_authors_abbr(raw_info["authors"]),
-        publication=raw_info["publication"],
-        tags = raw_info["tags"],
-        uuid = raw_info["uuid"],
-        url = raw_info["url"],
-        time_added = raw_info["time_import"],
-        time_modified = raw_info["time_modify"],
-        bibtex = raw_info["bibtex"],
-        doc_size= _file_size,
-        note_linecount = len([line for line in raw_info["comments"].split("\n") if line.strip() != ""]),
-        has_abstract= (abs_ := raw_info["abstract"].strip()) != "" and abs_ != "<Not avaliable>",
-    )
-    return await DataPoint(summary).init(db)
+# called with (number of processed entries, total) during the bulk operations
+ProgressCallbackT = Callable[[int, int], Awaitable[None]]
 
 class DataBase(DataCore):
     @dataclasses.dataclass(frozen=True)
@@ -151,6 +151,8 @@ class DataBase(DataCore):
         super().__init__()
         self.__conn: DBConnection | None = None   # type: ignore
         self.__vector_db: VectorDatabase | None = None
+        # the recently used datapoints, invalidated on the modifications of the entries
+        self.__dp_cache: LRUCache[str, DataPoint] = LRUCache(0)
 
     @property
     def conn(self) -> DBConnection:
@@ -158,16 +160,20 @@ class DataBase(DataCore):
             raise RuntimeError("Database not initialized")
         return self.__conn
     
-    async def init(self, db: str) -> DataBase:
+    async def init(self, db: str, cache_size: int = 1024, **conn_kwargs) -> DataBase:
         """
         - db: str | DBConnection, the database path or the database connection instance
+        - cache_size: number of the recently used datapoints kept in memory, 0 to disable
+        - conn_kwargs: passed to DBConnection, e.g. n_readers, durability
         """
         assert isinstance(db, str), "Invalid input"     # type check
         if not os.path.exists(db):
             os.mkdir(db)
         # to prevent multiple loading of the same database
-        conn = await FileManipulator.get_database_connection(db) 
+        conn = await FileManipulator.get_database_connection(db, **conn_kwargs)
         self.__conn = conn      # set database-wise connection instance
+        self.__dp_cache = LRUCache(cache_size)
+        conn.add_change_listener(self.__dp_cache.invalidate)
 
         self.__vector_db = await VectorDatabase(self.path.vector_db_file, [
             {
@@ -188,7 +194,13 @@ class DataBase(DataCore):
         await asyncio.gather(self.conn.commit(), self.vector.commit())
     async def close(self):
         await asyncio.gather(self.conn.close(), self.vector.close())
+        self.conn.remove_change_listener(self.__dp_cache.invalidate)
+        self.__dp_cache.clear()
         self.__conn = None
+    
+    def cache_stats(self) -> CacheStatsT:
+        """ hit / miss counters of the datapoint cache """
+        return self.__dp_cache.stats()
 
     @property
     def path(self):
@@ -202,7 +214,7 @@ class DataBase(DataCore):
             │     └── summary
             |          └── ...
             └── files
-                └── ...
+                └── ab/cd/abcd...     (sharded by uuid, see core.fileLayout)
         """
         if not os.path.exists(os.path.join(self.conn.db_dir, "index")):
             os.mkdir(os.path.join(self.conn.db_dir, "index"))
@@ -224,25 +236,44 @@ class DataBase(DataCore):
         """
         if include files, dump the database to a zip file. 
         else, dump the database to a sqlite file
+        prefer dump_stream for the zip file, which does not hold the archive in memory
         """
+        if include_files:
+            return b"".join([chunk async for chunk in self.dump_stream()])
+
         dump_lock = asyncio.Lock()
         async with dump_lock:
             await self.conn.commit()
-
-            if not include_files:
-                with open(self.conn.db_path, "rb") as f:
-                    return f.read()
-            else:
-                zip_buffer = BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w") as zf:
-                    # include the database file
-                    db_fname = os.path.basename(self.conn.db_path)
-                    zf.write(self.conn.db_path, db_fname)
-                    # include the document files and attachments
-                    for root, _, files in os.walk(self.path.file_dir):
-                        for f in files:
-                            zf.write(os.path.join(root, f), os.path.relpath(os.path.join(root, f), self.path.main_dir))
-                return zip_buffer.getvalue()
+            await self.conn.checkpoint()
+            with open(self.conn.db_path, "rb") as f:
+                return f.read()
+    
+    async def dump_stream(self) -> AsyncIterator[bytes]:
+        """
+        Dump the database and the files (documents and attachments) as a zip archive, chunk by chunk, 
+        the database file is a snapshot taken with the sqlite backup API
+        """
+        await self.conn.commit()
+        fd, snapshot = tempfile.mkstemp(suffix=".db", dir=TMP_DIR)
+        os.close(fd)
+        try:
+            await backup_sqlite(self.conn.db_path, snapshot)
+            files = [(snapshot, os.path.basename(self.conn.db_path))]
+            for root, _, fnames in os.walk(self.path.file_dir):
+                for f in fnames:
+                    files.append((os.path.join(root, f), os.path.relpath(os.path.join(root, f), self.path.main_dir)))
+            async for chunk in stream_zip(files):
+                yield chunk
+        finally:
+            os.remove(snapshot)
+    
+    async def backup(self, dst_dir: str) -> BackupStatsT:
+        """
+        Backup the database to dst_dir while it is in use, 
+        only the files changed since the last backup to the same directory are copied, 
+        see core.backup
+        """
+        return await backup_database(self, dst_dir)
     
     async def delete(self, uuid: str) -> bool:
         """ Delete a DataPoint by uuid"""
@@ -263,100 +294,162 @@ class DataBase(DataCore):
     async def keys(self) -> List[str]:
         return await self.conn.keys(sortby="time_import", reverse=True)
     async def has(self, uuid: str) -> bool:
-        return await self.conn.get(uuid) is not None
+        return await self.conn.get(uuid, fields=["uuid"]) is not None
     
+    def __sqlite_files(self) -> list[str]:
+        return [
+            db_path + suffix for db_path in [self.conn.db_path, self.path.vector_db_file]
+            for suffix in ("", "-wal", "-shm", "-journal")
+        ]
+
     async def disk_usage(self) -> int:
-        """ return the disk usage of the database in bytes """
+        """
+        return the disk usage of the database in bytes, 
+        the size of the files is maintained by a counter (see reconcile_disk_usage), 
+        only the sizes of the sqlite databases are read from the file system
+        """
+        files_usage = self.conn.files_usage
+        if files_usage is None:
+            files_usage = await self.reconcile_disk_usage()
+        return files_usage + sum(os.path.getsize(p) for p in self.__sqlite_files() if os.path.exists(p))
+    
+    async def reconcile_disk_usage(self) -> int:
+        """
+        Count the size of the files (except the sqlite databases) from the file system, 
+        and correct the counter with it, return the size
+        """
+        exclude = set(self.__sqlite_files())
         def _get_size(path: str) -> int:
             size = 0
             for root, _, files in os.walk(path):
                 for f in files:
-                    size += os.path.getsize(os.path.join(root, f))
+                    if (f_path := os.path.join(root, f)) in exclude:
+                        continue
+                    try:
+                        size += os.path.getsize(f_path)
+                    except FileNotFoundError:
+                        pass    # removed during the walk
             return size
-        return await asyncio.get_event_loop().run_in_executor(self.__thread_pool, _get_size, self.path.main_dir)
+        size = await asyncio.get_event_loop().run_in_executor(self.__thread_pool, _get_size, self.path.main_dir)
+        if (counted := self.conn.files_usage) != size:
+            if counted is not None:
+                await self.logger.info("Disk usage of {} reconciled: {} -> {} bytes".format(self.path.main_dir, counted, size))
+            await self.conn.set_files_usage(size)
+        return size
 
     async def get(self, uuid: str) -> DataPoint:
         """ Get DataPoint by uuid """
-        if (info := await self.conn.get(uuid)) is None:
+        if (dp := self.__dp_cache.get(uuid)) is not None:
+            return dp
+        epoch = self.__dp_cache.epoch
+        if (info := await self.conn.get(uuid, fields=SUMMARY_FIELDS)) is None:
             raise self.Error.LiresEntryNotFoundError(f"Data not found: {uuid}")
-        return await assemble_datapoint(info, self)
+        dp = await assemble_datapoint(info, self)
+        self.__dp_cache.put(uuid, dp, epoch)
+        return dp
 
     async def gets(self, uuids: list[str], sort_by='time_import', reverse = True) -> list[DataPoint]:
         """ Get DataPoints by uuids """
-        conn = self.conn
-        all_info = await conn.get_many(uuids, sort_by=sort_by, reverse=reverse)
-        tasks = [assemble_datapoint(info, self) for info in all_info]
-        return await asyncio.gather(*tasks)
+        cached = {uid: dp for uid in uuids if (dp := self.__dp_cache.get(uid)) is not None}
+        epoch = self.__dp_cache.epoch
+        if not cached:
+            all_info = await self.conn.get_many(uuids, sort_by=sort_by, reverse=reverse, fields=SUMMARY_FIELDS)
+            ret = await asyncio.gather(*[assemble_datapoint(info, self) for info in all_info])
+            for dp in ret:
+                self.__dp_cache.put(dp.uuid, dp, epoch)
+            return ret
+
+        # only the order is read for the cached ones
+        order = await self.conn.sort_keys(uuids, sort_by=sort_by, reverse=reverse)
+        if len(order) != len(uuids):
+            raise self.Error.LiresEntryNotFoundError("Some uuids not found")
+        if (missing := [uid for uid in uuids if uid not in cached]):
+            all_info = await self.conn.get_many(missing, fields=SUMMARY_FIELDS)
+            for dp in await asyncio.gather(*[assemble_datapoint(info, self) for info in all_info]):
+                self.__dp_cache.put(dp.uuid, dp, epoch)
+                cached[dp.uuid] = dp
+        return [cached[uid] for uid in order]
     
+    async def gets_batch(self, uuids: list[str], sort_by='time_import', reverse = True) -> SummaryBatch:
+        """
+        Get the summaries of the uuids by columns,
+        the uncached entries are not assembled into DataPoints, for the responses of many entries
+        """
+        cached = {uid: dp.summary for uid in uuids if (dp := self.__dp_cache.get(uid)) is not None}
+        if not cached:
+            all_info = await self.conn.get_many(uuids, sort_by=sort_by, reverse=reverse, fields=SUMMARY_FIELDS)
+            return SummaryBatch.from_rows(summary_values(info) for info in all_info)
+
+        order = await self.conn.sort_keys(uuids, sort_by=sort_by, reverse=reverse)
+        if len(order) != len(uuids):
+            raise self.Error.LiresEntryNotFoundError("Some uuids not found")
+        rows = {uid: s.values() for uid, s in cached.items()}
+        if (missing := [uid for uid in uuids if uid not in cached]):
+            for info in await self.conn.get_many(missing, fields=SUMMARY_FIELDS):
+                rows[info["uuid"]] = summary_values(info)
+        return SummaryBatch.from_rows(rows[uid] for uid in order)
+
     async def get_all(self, sort_by = 'time_import', reverse=True) -> list[DataPoint]:
         """ Get all DataPoints, may remove in the future """
-        all_info = await self.conn.get_all(sort_by=sort_by, reverse=reverse)
+        all_info = await self.conn.get_all(sort_by=sort_by, reverse=reverse, fields=SUMMARY_FIELDS)
         return await asyncio.gather(*[assemble_datapoint(info, self) for info in all_info])
     
-    async def ids_from_tags(self, tags: Union[list, set, DataTags], from_uids: Optional[List[str]] = None) -> list[str]:
+    @staticmethod
+    def tags_query(tags: Union[list, set, DataTags]) -> QueryNode:
+        """ The query matching all the tags (normalized as DataTags), each tag also matches its child tags """
+        return QAnd(tuple(QTerm("tag", t, subtree=True) for t in DataTags(tags)))
+
+    async def ids_from_tags(
+        self, tags: Union[list, set, DataTags], from_uids: Optional[List[str]] = None, sort: bool = True
+        ) -> list[str]:
         """
-        Get data IDs by tags, including all child tags
+        Get data IDs by tags, including all child tags, 
+        resolved with the in-memory tag tree, 
+        newest first if sort, otherwise in arbitrary order (without querying the database), 
+        all entries (of from_uids) if no tags are given
         """
-        async def _getByStrictIntersect(tags: DataTags, from_uids: Optional[List[str]] = None) -> list[str]:
-            return await self.conn.filter(from_uids=from_uids, tags=tags.to_ordered_list(), strict=True, ignore_case=False)
-        async def _getBySingle(tag: str, from_uids: Optional[List[str]] = None) -> list[str]:
-            return await self.conn.filter(from_uids=from_uids, tags=[tag], strict=True, ignore_case=False)
-
-        all_tags = DataTags(await self.conn.tags())
-        strict_query_tags = DataTags()                      # the exact tags to be queried
-        relaxed_query_tag_groups: list[DataTags] = []       # the tags groups that will be relaxed by union of each group
-        for t in tags:
-            if len(_w_child_t:= DataTags([t]).with_childs_from(all_tags))==1:
-                strict_query_tags.add(_w_child_t.pop())
-            else:
-                relaxed_query_tag_groups.append(_w_child_t)
-        # get all possible combinations
-        to_be_intersect = [await _getByStrictIntersect(strict_query_tags, from_uids)]
-        for r in relaxed_query_tag_groups:
-            to_be_union: list[list[str]] = []
-            for t in r:
-                to_be_union.append(await _getBySingle(t, from_uids))
-            to_be_intersect.append(list(set().union(*to_be_union)))
-        # get the intersection
-        if len(to_be_intersect) == 1:
-            # return await self.gets(to_be_intersect[0])
-            return to_be_intersect[0]
+        tags = DataTags(tags)
+        if not tags:
+            if from_uids is None and sort:
+                return await self.conn.keys(sortby="time_import", reverse=True)
+            ret = set(await self.conn.keys())
         else:
-            return list(set(to_be_intersect[0]).intersection(*to_be_intersect[1:]))
+            ret = await self.conn.cache.query_tag_subtrees(list(tags))
+        if from_uids is not None:
+            ret.intersection_update(from_uids)
+        if not sort:
+            return list(ret)
+        return await self.conn.sort_keys(list(ret), "time_import", reverse=True)
 
     async def data_from_tags(self, tags: Union[list, set, DataTags], from_uids: Optional[List[str]] = None) -> list[DataPoint]:
-        return await self.gets(await self.ids_from_tags(tags, from_uids))
+        return await self.gets(await self.ids_from_tags(tags, from_uids, sort=False))
     
-    async def rename_tag(self, tag_old: str, tag_new: str) -> bool:
+    async def rename_tag(self, tag_old: str, tag_new: str, progress: Optional[ProgressCallbackT] = None) -> bool:
         """
-        Rename a tag for the entire database
+        Rename a tag (and the child tags, see TagRule.rename_tag) for the entire database, 
+        in a single transaction
+        - progress: called with (number of processed entries, total)
         return if success
         """
-        data = await self.data_from_tags(DataTags([tag_old]))
-        await self.logger.info(f"Rename tag: {tag_old} -> {tag_new} [count: {len(data)}]")
-        tasks = []
-        for d in data:
-            d: DataPoint
-            t = d.tags
-            t = TagRule.rename_tag(t, tag_old, tag_new)
-            if t is not None:
-                tasks.append(d.fm.set_tags(t))
-        await asyncio.gather(*tasks)
+        uids = await self.ids_from_tags([tag_old], sort=False)
+        await self.logger.info(f"Rename tag: {tag_old} -> {tag_new} [count: {len(uids)}]")
+        def _rename(tags: list[str]) -> Optional[list[str]]:
+            t = TagRule.rename_tag(DataTags(tags), tag_old, tag_new)
+            return t.to_ordered_list() if t is not None else None
+        await self.conn.update_tags_many(uids, _rename, progress)
         return True
     
-    async def delete_tag(self, tag: str) -> bool:
+    async def delete_tag(self, tag: str, progress: Optional[ProgressCallbackT] = None) -> bool:
         """
-        Delete a tag for the entire database
+        Delete a tag (and the child tags) for the entire database, 
+        in a single transaction
+        - progress: called with (number of processed entries, total)
         return if success
         """
-        data = await self.data_from_tags(DataTags([tag]))
-        await self.logger.info(f"Delete tag: {tag}")
-        tasks = []
-        for d in data:
-            d: DataPoint
-            ori_tags = d.tags
-            after_deleted = TagRule.delete_tag(ori_tags, tag)
-            if after_deleted is not None:
-                tasks.append(d.fm.set_tags(after_deleted))
-        await asyncio.gather(*tasks)
+        uids = await self.ids_from_tags([tag], sort=False)
+        await self.logger.info(f"Delete tag: {tag} [count: {len(uids)}]")
+        def _delete(tags: list[str]) -> Optional[list[str]]:
+            t = TagRule.delete_tag(DataTags(tags), tag)
+            return t.to_ordered_list() if t is not None else None
+        await self.conn.update_tags_many(uids, _delete, progress)
         return True
\ No newline at end of file
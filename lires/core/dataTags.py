@@ -30,12 +30,8 @@ class TagRule(LiresBase):
         input: (a.b, [a, a.b, a.b.c, a.b.d])
         return: [a.b.c, a.b.d]
         """
-        ret = []
-        for t in tag_pool:
-            if t.startswith(tag) and len(t)>len(tag)+len(cls.SEP):
-                if t[len(tag): len(tag) + 2] == cls.SEP:
-                    ret.append(t)
-        return DataTags(ret)
+        prefix = cls.strip_tag(tag) + cls.SEP
+        return DataTags([t for t in tag_pool if t.startswith(prefix)])
     
     @classmethod
     def rename_tag(cls, src: DataTags, aim_tag: str, new_tag: str) -> Optional[DataTags]:
@@ -141,16 +137,24 @@ class DataTags(Set[str], LiresBase):
         return DataTags(super().union(*s))
     
     def with_parents(self) -> DataTags:
-        parents = DataTags()
+        ret = set(self)
         for s in self:
-            parents = parents.union(TagRule.all_parents(s))
-        return self.union(parents)
+            sp = s.split(TagRule.SEP)
+            ret.update(TagRule.SEP.join(sp[:i]) for i in range(1, len(sp)))
+        return DataTags._from_stripped(ret)
 
     def with_childs_from(self, child_choices: DataTags):
-        childs = DataTags()
-        for s in self:
-            childs = childs.union(TagRule.all_childs(s, child_choices))
-        return self.union(childs) # type: ignore
+        ret = set(self)
+        prefixes = tuple(s + TagRule.SEP for s in self)
+        ret.update(t for t in DataTags(child_choices) if t.startswith(prefixes))
+        return DataTags._from_stripped(ret)
+    
+    @classmethod
+    def _from_stripped(cls, tags: set[str]) -> DataTags:
+        """ from the tags already stripped, e.g. from the other DataTags or the database """
+        ret = cls()
+        set.update(ret, tags)
+        return ret
     
     def to_string(self):
         if len(self) > 0:
@@ -2,26 +2,27 @@
 Sqlite connection interface
 """
 from __future__ import annotations
-import json, os, uuid, asyncio
-import typing
-from typing import TypedDict, Optional, TYPE_CHECKING
+import json, os, uuid, asyncio, re, hashlib, bisect, time, sqlite3
+import typing, contextlib
+from typing import TypedDict, Optional, Literal, Callable, Awaitable, TYPE_CHECKING
 import dataclasses
 import platform
 import aiosqlite
-import functools
 
 from .dbConnUpgrade import *
 from .base import LiresBase
-from ..utils import TimeUtils
-from ..utils.author import format_author_name
+from .dbQuery import FTS_MIN_QUERY_LEN, QueryNode, parse_query, compile_query
+from .fileLayout import entry_path
+from .tagTree import TagTree
+from ..utils import TimeUtils, InstrumentedLock, LockStatsT
+from ..utils.author import format_author_name, get_authors_abbr
 from ..version import VERSION, versionize
 
 if TYPE_CHECKING:
     from ..types.dataT import FileTypeT
+    from .blobStore import BlobStore
 
 
-DB_MOD_LOCK = asyncio.Lock()
-
 @dataclasses.dataclass
 class DocInfo:
     """
@@ -58,6 +59,7 @@ class DocInfo:
 # use this, we can easily split and join the string, 
 # it should be faster than json?
 LIST_SEP = "&sp;"
+
 class DBFileRawInfo(TypedDict):
     uuid: str           # File uuid, should be unique for each file
     bibtex: str         # Bibtex string, should be valid and remove abstract, at least contains title, year, authors
@@ -74,6 +76,27 @@ class DBFileRawInfo(TypedDict):
     time_modify: float  # Time modified, float
     info_str: str       # Info string, json serializable string of DocInfo
     doc_ext: FileTypeT  # Document file type
+    dedupe_key: str     # Normalized title and year hash, for duplicate detection
+    # materialized summary fields, maintained on write
+    doc_size: int       # Document size in bytes, 0 if no document
+    note_linecount: int # Number of non-empty lines in comments
+    has_abstract: int   # 1 if the abstract is available, otherwise 0
+    author_abbr: str    # Authors abbreviation, e.g. "Doe et al."
+
+def make_dedupe_key(title: str, year: int | str) -> str:
+    """
+    A normalized key for duplicate detection, 
+    entries with the same (case-, punctuation- and latex-insensitive) title and year share the same key
+    """
+    title = re.sub(r"[\W_]+", " ", title.lower()).strip()
+    year = str(year).strip()
+    return hashlib.sha1(f"{title}|{year}".encode("utf-8")).hexdigest()
+
+def count_note_lines(comments: str) -> int:
+    return len([line for line in comments.split("\n") if line.strip() != ""])
+
+def check_has_abstract(abstract: str) -> bool:
+    return (abs_ := abstract.strip()) != "" and abs_ != "<Not avaliable>"
 
 def parse_list(s: str) -> list[str]:
     if s == "": return []
@@ -81,6 +104,19 @@ def parse_list(s: str) -> list[str]:
 def dump_list(l: list[str]) -> str:
     return LIST_SEP.join(l)
 
+# lists longer than this are passed to sqlite as a single json array (expanded by json_each), 
+# instead of one placeholder per item, which is slow to prepare for long lists, 
+# and fails if exceeding the maximum number of host parameters (32766 by default)
+SQL_INLINE_LIST_MAX = 256
+# number of entries updated per statement in the bulk updates, the progress is reported per batch
+BULK_UPDATE_BATCH_SIZE = 1000
+
+def sql_in_list(values: typing.Sequence[str]) -> tuple[str, list[str]]:
+    """ The right-hand side of `x IN ...` for the values, and the parameters """
+    if len(values) <= SQL_INLINE_LIST_MAX:
+        return "({})".format(",".join(["?"]*len(values))), list(values)
+    return "(SELECT value FROM json_each(?))", [json.dumps(list(values))]
+
 
 class DBFileInfo(TypedDict):
     # The same as DBFileRawInfo, but with some fields converted to their original type
@@ -99,7 +135,133 @@ class DBFileInfo(TypedDict):
     time_modify: float  # Time modified, float
     info_str: str 
     doc_ext: FileTypeT
+    doc_size: int
+    note_linecount: int
+    has_abstract: bool
+    author_abbr: str
+
+class DBEntryT(TypedDict, total=False):
+    # Arguments of DBConnection.add_entry, for adding entries in bulk
+    bibtex: str
+    dtype: str
+    title: str
+    year: int | str
+    publication: str
+    authors: list[str]
+    tags: list[str]
+    url: str
+    abstract: str
+    comments: str
+    doc_ext: FileTypeT
+    doc_size: Optional[int]     # will be read from the file if not provided
+    doc_info: Optional[DocInfo | dict]
+
+# the fields of DBFileInfo, all are columns of the main table
+DB_FILE_FIELDS = tuple(DBFileInfo.__annotations__.keys())
+# the fields needed to assemble a datapoint summary, 
+# use these to avoid fetching unnecessary data (the notes and abstracts can be large)
+SUMMARY_FIELDS = tuple(f for f in DB_FILE_FIELDS if f not in ("info_str", "comments", "abstract"))
+
+# secondary indexes of the main table, (name, columns), 
+# the uuid is included so that the keyset pagination (see PageCursorT) 
+# and the queries only return uuids can be served by the indexes alone
+FILES_INDEXES = [
+    ("idx_files_dedupe_key", "dedupe_key"),
+    ("idx_files_time_import", "time_import, uuid"),
+    ("idx_files_time_modify", "time_modify, uuid"),
+    ("idx_files_year", "year, uuid"),
+    ("idx_files_doc_ext", "doc_ext"),
+]
+async def create_files_indexes(conn: aiosqlite.Connection):
+    for name, cols in FILES_INDEXES:
+        await conn.execute("CREATE INDEX IF NOT EXISTS {} ON files ({})".format(name, cols))
+
+# the tag / author index tables are written in the same transaction as the main table,
+# and the changes of tags / authors not followed by an index update 
+# (e.g. by an older version, or other tools) are logged to entry_index_log by the triggers, 
+# those entries are re-indexed on the next init, see DBConnection.sync_entry_index
+async def create_entry_index_triggers(conn: aiosqlite.Connection):
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS entry_index_log (
+        uuid TEXT PRIMARY KEY
+    ) WITHOUT ROWID
+    """)
+    for name, event, cond, uid in [
+        ("trg_files_index_insert", "INSERT", "1", "NEW.uuid"),
+        ("trg_files_index_delete", "DELETE", "1", "OLD.uuid"),
+        ("trg_files_index_update", "UPDATE OF tags, authors", "OLD.tags IS NOT NEW.tags OR OLD.authors IS NOT NEW.authors", "NEW.uuid"),
+    ]:
+        await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS {} AFTER {} ON files WHEN {}
+        BEGIN INSERT OR IGNORE INTO entry_index_log (uuid) VALUES ({}); END
+        """.format(name, event, cond, uid))
+
+# the full-text search table is keyed by the fts_rowid column of the main table, 
+# not the implicit rowid, which may change by VACUUM or dump / restore, 
+# and kept in sync with the main table by the triggers, 
+# the trigram tokenizer requires sqlite >= 3.34, otherwise the text queries fall back to LIKE
+FTS_MIN_SQLITE_VERSION = (3, 34, 0)
+FTS_TRIGGERS = ("trg_files_fts_insert", "trg_files_fts_delete", "trg_files_fts_update")
+async def create_fts_triggers(conn: aiosqlite.Connection):
+    await conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_files_fts_insert AFTER INSERT ON files
+    BEGIN 
+        UPDATE files SET fts_rowid = (SELECT IFNULL(MAX(fts_rowid), 0) + 1 FROM files) 
+        WHERE rowid = NEW.rowid AND NEW.fts_rowid IS NULL;
+        INSERT INTO files_fts (rowid, title, abstract, publication, comments)
+        SELECT fts_rowid, title, abstract, publication, comments FROM files WHERE rowid = NEW.rowid;
+    END
+    """)
+    await conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_files_fts_delete AFTER DELETE ON files
+    BEGIN DELETE FROM files_fts WHERE rowid = OLD.fts_rowid; END
+    """)
+    await conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_files_fts_update AFTER UPDATE OF title, abstract, publication, comments ON files 
+    WHEN OLD.title IS NOT NEW.title OR OLD.abstract IS NOT NEW.abstract 
+        OR OLD.publication IS NOT NEW.publication OR OLD.comments IS NOT NEW.comments
+    BEGIN 
+        UPDATE files_fts SET title = NEW.title, abstract = NEW.abstract, publication = NEW.publication, comments = NEW.comments 
+        WHERE rowid = NEW.fts_rowid; 
+    END
+    """)
+
+# cursor of keyset pagination, 
+# (value of the sort field, uuid) of the last entry of the previous page
+PageCursorT = tuple[typing.Any, str]
+
+# when to commit the modifications:
+# - immediate: commit after every modification
+# - group: commit once within a time window after the first uncommitted modification, 
+#     the modifications in the window (e.g. from concurrent requests) share one transaction
+# - periodic: only commit when DBConnection.commit is called (e.g. by a periodic callback)
+DurabilityModeT = Literal["immediate", "group", "periodic"]
 
+# the change journal, an append-only log of the modifications of the entries, 
+# for the clients to sync incrementally, see DBConnection.changes
+JournalOpT = Literal["add", "update", "delete"]
+class JournalEntryT(TypedDict):
+    seq: int                # monotonically increasing sequence number
+    uuid: str
+    op: JournalOpT
+    fields: list[str]       # the modified fields of 'update', empty for 'add' and 'delete'
+    time: float
+
+class JournalPageT(TypedDict):
+    changes: list[JournalEntryT]
+    latest: int             # pass as 'since' to get the following changes
+    resync: bool            # some changes after 'since' are compacted, the client should fetch everything again
+
+# the journal entries older than this (in seconds), or beyond the maximum size, are removed by compaction
+JOURNAL_MAX_AGE = 30*24*60*60
+JOURNAL_MAX_SIZE = 100_000
+
+class CommitStatsT(TypedDict):
+    durability: DurabilityModeT
+    n_commit: int           # number of commits
+    latency_total: float    # total time spent in commits, in seconds
+    latency_max: float      # maximum time of a commit, in seconds
+    latency_last: float     # time of the last commit, in seconds
 
 __THIS_NODE__ = platform.node()
 class DBConnection(LiresBase):
@@ -108,7 +270,20 @@ class DBConnection(LiresBase):
     """
     logger = LiresBase.loggers().core
 
-    def __init__(self, db_dir: str, fname: str = "lrs.db") -> None:
+    def __init__(
+        self, db_dir: str, fname: str = "lrs.db", n_readers: int = 0, 
+        durability: DurabilityModeT = "periodic", group_commit_ms: int = 50, 
+        blob_store: Optional[BlobStore] = None
+        ) -> None:
+        """
+        - n_readers: number of read-only connections, 
+            the reads are distributed among them when there are no uncommitted writes, 
+            0 to use the writer connection for all reads
+        - durability: when to commit the modifications, see DurabilityModeT
+        - group_commit_ms: the time window of group commit, in milliseconds
+        - blob_store: the content-addressed store of the documents, shared with other databases, 
+            None to store the documents in the database directory only
+        """
         # create db if not exist
         self.db_fname = fname
         db_path = os.path.join(db_dir, self.db_fname)
@@ -121,18 +296,86 @@ class DBConnection(LiresBase):
         self.db_path = db_path
         self.__modified = False
 
+        # serialize the modifications of this database, 
+        # other databases (e.g. of other users) are not blocked
+        self.lock = InstrumentedLock(f"db:{db_path}", on_slow=self.__on_slow_lock)
+
+        self.n_readers = n_readers
+        self.readers: list[aiosqlite.Connection] = []
+        self.__reader_idx = 0
+
+        self.durability: DurabilityModeT = durability
+        self.group_commit_ms = group_commit_ms
+        self.__group_commit_task: Optional[asyncio.Task] = None
+        self.__commit_stats: CommitStatsT = {
+            "durability": durability, "n_commit": 0, 
+            "latency_total": 0., "latency_max": 0., "latency_last": 0.
+        }
+
+        self.blob_store = blob_store
         self.cache = DBConnectionCache()
+        self.__files_usage: Optional[int] = None
+        self.__fts_enabled = False      # see __init_fts
+        # called with the uuids of the modified entries, see add_change_listener
+        self.__change_listeners: list[Callable[[list[str]], None]] = []
+    
+    async def __on_slow_lock(self, name: str, wait: float):
+        await self.logger.warning("Waited {:.2f}s for the lock of {}".format(wait, name))
+    
+    async def lock_stats(self) -> LockStatsT:
+        return self.lock.stats()
+    
+    async def commit_stats(self) -> CommitStatsT:
+        return self.__commit_stats.copy()
+    
+    @contextlib.asynccontextmanager
+    async def _writing(self):
+        """
+        Hold the lock for a modification, 
+        and commit or schedule a commit after it, according to the durability mode
+        """
+        async with self.lock:
+            yield
+            if self.durability == "immediate":
+                await self.__commit()
+        if self.durability == "group":
+            self.__schedule_group_commit()
+    
+    def __schedule_group_commit(self):
+        if not self.__modified or self.__group_commit_task is not None:
+            return
+        async def _group_commit():
+            await asyncio.sleep(self.group_commit_ms / 1000)
+            # the modifications after this point will schedule another commit
+            self.__group_commit_task = None
+            await self.commit()
+        self.__group_commit_task = asyncio.create_task(_group_commit())
     
     async def init(self) -> DBConnection:
         """
         May call this function to re-init the connection after close
         """
-        async with DB_MOD_LOCK:
+        async with self.lock:
             self.conn = await aiosqlite.connect(self.db_path)
+            # write-ahead logging, so that readers do not block the writer and vice versa
+            await self.conn.execute("PRAGMA journal_mode=WAL")
             await self.__init_tables()
             await self.__auto_upgrade()
-            await self.cache.init()
-            await self.cache.build_init_cache(await self.get_all())
+            await self.__init_fts()
+            if self.n_readers > 0:
+                # the readers need the tables, commit the initialization first
+                await self.conn.commit()
+                self.readers = [
+                    await aiosqlite.connect(f"file:{self.db_path}?mode=ro", uri=True) 
+                    for _ in range(self.n_readers)
+                    ]
+            await self.sync_entry_index()
+            async with self.conn.execute("SELECT value FROM meta WHERE key='files_usage'") as cursor:
+                row = await cursor.fetchone()
+                self.__files_usage = int(row[0]) if row is not None else None
+            # the cache is loaded from the index tables on the first use, 
+            # so that opening a database does not read the entries
+            await self.cache.init(loader = self.__load_cache)
         return self
     
     async def is_initialized(self) -> bool:
@@ -202,11 +445,107 @@ class DBConnection(LiresBase):
                     time_modify REAL NOT NULL DEFAULT 0,
                     info_str TEXT NOT NULL,
                     doc_ext TEXT NOT NULL,
-                    misc_dir TEXT
+                    misc_dir TEXT,
+                    dedupe_key TEXT NOT NULL DEFAULT '',
+                    doc_size INTEGER NOT NULL DEFAULT 0,
+                    note_linecount INTEGER NOT NULL DEFAULT 0,
+                    has_abstract INTEGER NOT NULL DEFAULT 0,
+                    author_abbr TEXT NOT NULL DEFAULT '',
+                    fts_rowid INTEGER
                 )
                 """)
+                await create_files_indexes(self.conn)
+                await self.set_modified_flag(True)
+
+        # create tag / author index tables, for joining in the queries (see dbQuery), 
+        # the authors are formatted as in the cache
+        async with self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='entry_tags'") as cursor:
+            if not await cursor.fetchone():
+                for table, col in [("entry_tags", "tag"), ("entry_authors", "author")]:
+                    await cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS {0} (
+                        uuid TEXT NOT NULL,
+                        {1} TEXT NOT NULL,
+                        PRIMARY KEY ({1}, uuid)
+                    ) WITHOUT ROWID
+                    """.format(table, col))
+                    await cursor.execute("CREATE INDEX IF NOT EXISTS idx_{0}_uuid ON {0} (uuid)".format(table))
+                await self.set_modified_flag(True)
+        # create change journal table, 
+        # the modifications before the journal are unknown, treated as compacted
+        async with self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='change_journal'") as cursor:
+            if not await cursor.fetchone():
+                await cursor.execute("""
+                CREATE TABLE IF NOT EXISTS change_journal (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    uuid TEXT NOT NULL,
+                    op TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    time REAL NOT NULL
+                )
+                """)
+                await cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_journal_time ON change_journal (time)")
+                has_entries = await (await self.conn.execute("SELECT 1 FROM files LIMIT 1")).fetchone()
+                if has_entries:
+                    await cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_journal', 1)")
+                await cursor.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('journal_compacted', ?)", 
+                    ("1" if has_entries else "0",)
+                    )
+                await self.set_modified_flag(True)
+        async with self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='entry_index_log'") as cursor:
+            if not await cursor.fetchone():
+                await create_entry_index_triggers(self.conn)
                 await self.set_modified_flag(True)
     
+    async def __init_fts(self):
+        """
+        Create the full-text search table and its triggers if the trigram tokenizer is supported, 
+        the index is rebuilt if it may be out of sync, 
+        e.g. the triggers were missing (created before the triggers, or opened with an older sqlite)
+        """
+        self.__fts_enabled = sqlite3.sqlite_version_info >= FTS_MIN_SQLITE_VERSION
+        if not self.__fts_enabled:
+            await self.logger.warning("Full-text search disabled for {}, requires sqlite >= {} (current: {})".format(
+                self.db_path, ".".join(map(str, FTS_MIN_SQLITE_VERSION)), sqlite3.sqlite_version
+                ))
+            # the index can not be maintained, will be rebuilt when opened with a newer sqlite
+            for trigger in FTS_TRIGGERS:
+                await self.conn.execute("DROP TRIGGER IF EXISTS {}".format(trigger))
+            return
+
+        need_rebuild = False
+        async with self.conn.execute("PRAGMA table_info(files)") as cursor:
+            if "fts_rowid" not in [col[1] for col in await cursor.fetchall()]:
+                await self.conn.execute("ALTER TABLE files ADD COLUMN fts_rowid INTEGER")
+                need_rebuild = True
+        await self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_files_fts_rowid ON files (fts_rowid)")
+        async with self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='files_fts'") as cursor:
+            if not await cursor.fetchone():
+                await self.conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                    title,
+                    abstract,
+                    publication,
+                    comments,
+                    tokenize = 'trigram'
+                )
+                """)
+                need_rebuild = True
+        in_expr, params = sql_in_list(list(FTS_TRIGGERS))
+        async with self.conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='trigger' AND name IN " + in_expr, params) as cursor:
+            if (await cursor.fetchone())[0] != len(FTS_TRIGGERS):   # type: ignore
+                need_rebuild = True
+        if need_rebuild:
+            await self.rebuild_fts()
+            await create_fts_triggers(self.conn)
+            await self.set_modified_flag(True)
+    
+    @property
+    def fts_enabled(self) -> bool:
+        """ if the full-text search table is used, otherwise the text queries use LIKE """
+        return self.__fts_enabled
+    
     async def __auto_upgrade(self):
         """
         Auto upgrade database if needed, 
@@ -228,14 +567,26 @@ class DBConnection(LiresBase):
         if record_version < versionize("1.8.0"):
             await upgrade_1_8_0(self)
             await set_version_record("1.8.0")
+        
+        if record_version < versionize("1.9.0"):
+            await upgrade_1_9_0(self)
+            await set_version_record("1.9.0")
 
         if record_version != curr_version:
             await set_version_record(curr_version.string())
             await self.logger.info("Upgraded database {} from version {} to {}".format(self.db_path, record_version, curr_version))
         
     async def close(self):
+        if self.__group_commit_task is not None:
+            # do not lose the modifications waiting for the group commit
+            self.__group_commit_task.cancel()
+            self.__group_commit_task = None
+            await self.commit()
+        await self.optimize()
+        for reader in self.readers:
+            await reader.close()
+        self.readers = []
         await self.conn.close()
-        await self.cache.conn.close()
     
     async def __aenter__(self):
         return self
@@ -245,97 +596,324 @@ class DBConnection(LiresBase):
         await self.close()
 
     
-    def __formatRow(self, row: tuple | aiosqlite.Row) -> DBFileInfo:
-        return {
-            "uuid": row[0],
-            "bibtex": row[1],
-            "type": row[2],
-            "title": row[3],
-            "year": row[4],
-            "publication": row[5],
-            "authors": parse_list(row[6]),
-            "tags": parse_list(row[7]),
-            "url": row[8],
-            "abstract": row[9],
-            "comments": row[10],
-            "time_import": row[11],
-            "time_modify": row[12],
-            "info_str": row[13],
-            "doc_ext": row[14]
-        }
+    def _reader(self) -> aiosqlite.Connection:
+        """
+        Connection for reading, round-robin among the read-only connections, 
+        the readers only see committed data, 
+        so the writer connection is used if there is a pending transaction
+        """
+        if not self.readers or self.conn.in_transaction:
+            return self.conn
+        self.__reader_idx = (self.__reader_idx + 1) % len(self.readers)
+        return self.readers[self.__reader_idx]
+    
+    def __formatRow(self, row: tuple | aiosqlite.Row, fields: typing.Sequence[str] = DB_FILE_FIELDS) -> DBFileInfo:
+        ret = dict(zip(fields, row))
+        for k in ("authors", "tags"):
+            if k in ret:
+                ret[k] = parse_list(ret[k])
+        if "has_abstract" in ret:
+            ret["has_abstract"] = bool(ret["has_abstract"])
+        return ret     # type: ignore
+    
+    @staticmethod
+    def __select_columns(fields: Optional[typing.Sequence[str]]) -> tuple[str, typing.Sequence[str]]:
+        """ return the column expression for SELECT and the selected fields """
+        if fields is None:
+            fields = DB_FILE_FIELDS
+        for f in fields:
+            if f not in DB_FILE_FIELDS:
+                raise ValueError("Unknown field {}".format(f))
+        return ", ".join(fields), fields
+    
+    @staticmethod
+    def __keyset(
+        sort_by: str, reverse: bool, after: Optional[PageCursorT], limit: Optional[int]
+        ) -> tuple[Optional[str], list, str]:
+        """
+        Build the keyset pagination clauses, 
+        the entries are ordered by (sort_by, uuid), so that the order is total and the cursor is stable. 
+        return the condition (None if no cursor), its parameters, and the ORDER BY / LIMIT clause
+        """
+        if sort_by not in DB_FILE_FIELDS:
+            raise ValueError("Unknown field {}".format(sort_by))
+        order = "DESC" if reverse else "ASC"
+        cond, params = None, []
+        if after is not None:
+            cond = "({}, files.uuid) {} (?, ?)".format(sort_by, "<" if reverse else ">")
+            params = list(after)
+        tail = " ORDER BY {0} {1}, files.uuid {1}".format(sort_by, order)
+        if limit is not None:
+            tail += " LIMIT {}".format(int(limit))
+        return cond, params, tail
+    
+    async def page_cursor(self, uuid: str, sort_by: str = "time_import") -> Optional[PageCursorT]:
+        """ The cursor to fetch the entries after the given one, None if the entry does not exist """
+        if sort_by not in DB_FILE_FIELDS:
+            raise ValueError("Unknown field {}".format(sort_by))
+        async with self._reader().execute("SELECT {} FROM files WHERE uuid=?".format(sort_by), (uuid,)) as cursor:
+            row = await cursor.fetchone()
+        return None if row is None else (row[0], uuid)
 
     async def size(self) -> int:
-        async with self.conn.execute("SELECT COUNT(*) FROM files") as cursor:
+        async with self._reader().execute("SELECT COUNT(*) FROM files") as cursor:
             return (await cursor.fetchone())[0]     # type: ignore
     async def authors(self) -> list[str]:
         return await self.cache.all_authors()
     async def tags(self) -> list[str]:
         return await self.cache.all_tags()
-    async def keys(self, sortby = None, reverse = False) -> list[str]:
-        """ Return all uuids """
+    async def keys(
+        self, sortby = None, reverse = False, 
+        after: Optional[PageCursorT] = None, limit: Optional[int] = None
+        ) -> list[str]:
+        """
+        Return all uuids, 
+        or a page of them if after (see page_cursor) or limit is given, 
+        the pages are ordered by sortby (default to time_import)
+        """
+        if after is not None or limit is not None:
+            cond, params, tail = self.__keyset(sortby or "time_import", reverse, after, limit)
+            query = "SELECT uuid FROM files" + (" WHERE " + cond if cond else "") + tail
+            async with self._reader().execute(query, params) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
         if await self.size() == 0:
             # just return empty list if no entry,
             # otherwise the following query will raise an error if sortby is not None
             return []   
         if not sortby:
-            async with self.conn.execute("SELECT uuid FROM files") as cursor:
+            async with self._reader().execute("SELECT uuid FROM files") as cursor:
                 return [row[0] for row in await cursor.fetchall()]
         else:
-            async with self.conn.execute("SELECT uuid FROM files ORDER BY {} {}".format(sortby, "DESC" if reverse else "ASC")) as cursor:
+            async with self._reader().execute("SELECT uuid FROM files ORDER BY {} {}".format(sortby, "DESC" if reverse else "ASC")) as cursor:
                 return [row[0] for row in await cursor.fetchall()]
+    async def iter_keys(
+        self, sort_by: str = "time_import", reverse: bool = True, page_size: int = 1000
+        ) -> typing.AsyncGenerator[list[str], None]:
+        """ Iterate over all uuids page by page, ordered by (sort_by, uuid) """
+        after: Optional[PageCursorT] = None
+        while True:
+            cond, params, tail = self.__keyset(sort_by, reverse, after, page_size)
+            query = "SELECT uuid, {} FROM files".format(sort_by) + (" WHERE " + cond if cond else "") + tail
+            async with self._reader().execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+            if rows:
+                yield [row[0] for row in rows]
+            if len(rows) < page_size:
+                return
+            after = (rows[-1][1], rows[-1][0])
+    async def find_duplicates(self, title: str, year: int | str) -> list[str]:
+        """ Return uuids of the entries with the same normalized title and year """
+        async with self._reader().execute("SELECT uuid FROM files WHERE dedupe_key=?", (make_dedupe_key(title, year),)) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+    async def find_duplicates_many(self, dedupe_keys: list[str]) -> dict[str, str]:
+        """ Return a mapping from the given dedupe keys to the uuids of existing entries, keys without duplicates are omitted """
+        ret: dict[str, str] = {}
+        in_expr, params = sql_in_list(dedupe_keys)
+        async with self._reader().execute("SELECT dedupe_key, uuid FROM files WHERE dedupe_key IN " + in_expr, params) as cursor:
+            for row in await cursor.fetchall():
+                ret.setdefault(row[0], row[1])
+        return ret
     async def check_nonexist(self, uuids: list[str]) -> list[str]:
         """Check if uuids exist, return those not exist """
-        async with self.conn.execute("SELECT uuid FROM files WHERE uuid IN ({})".format(",".join(["?"]*len(uuids))), uuids) as cursor:
+        in_expr, params = sql_in_list(uuids)
+        async with self._reader().execute("SELECT uuid FROM files WHERE uuid IN " + in_expr, params) as cursor:
             exist = [row[0] for row in await cursor.fetchall()]
         return list(set(uuids).difference(exist))
     
-    async def sort_keys(self, keys: list[str], sort_by: str = "time_import", reverse: bool = True) -> list[str]:
-        """ Sort keys by a field """
-        async with self.conn.execute("SELECT uuid, {} FROM files WHERE uuid IN ({}) ORDER BY {} {}".format(sort_by, ",".join(["?"]*len(keys)), sort_by, "DESC" if reverse else "ASC"), keys) as cursor:
+    async def sort_keys(
+        self, keys: list[str], sort_by: str = "time_import", reverse: bool = True, 
+        after: Optional[PageCursorT] = None, limit: Optional[int] = None
+        ) -> list[str]:
+        """ Sort keys by a field, return a page of them if after (see page_cursor) or limit is given """
+        cond, params, tail = self.__keyset(sort_by, reverse, after, limit)
+        in_expr, in_params = sql_in_list(keys)
+        query = "SELECT uuid FROM files WHERE uuid IN " + in_expr
+        if cond:
+            query += " AND " + cond
+        async with self._reader().execute(query + tail, [*in_params, *params]) as cursor:
             rows = await cursor.fetchall()
         return [row[0] for row in rows]
     
-    async def get(self, uuid: str) -> Optional[DBFileInfo]:
+    async def get(self, uuid: str, fields: Optional[typing.Sequence[str]] = None) -> Optional[DBFileInfo]:
         """
-        Get file info by uuid
+        Get file info by uuid, 
+        if fields is provided, only those fields are fetched (and present in the returned dict)
         """
-        async with self.conn.execute("SELECT * FROM files WHERE uuid=?", (uuid,)) as cursor:
+        cols, fields = self.__select_columns(fields)
+        async with self._reader().execute("SELECT {} FROM files WHERE uuid=?".format(cols), (uuid,)) as cursor:
             row = await cursor.fetchone()
             if row is None:
                 return None
-        return self.__formatRow(row)
+        return self.__formatRow(row, fields)
     
-    async def get_many(self, uuids: list[str], sort_by = 'time_import', reverse = True) -> list[DBFileInfo]:
+    async def get_many(
+        self, uuids: list[str], sort_by = 'time_import', reverse = True, 
+        fields: Optional[typing.Sequence[str]] = None
+        ) -> list[DBFileInfo]:
         """ Get file info by uuid, this will use new order specified by orderBy!  """
         if await self.size() == 0: return []
-        async with self.conn.execute("SELECT * FROM files WHERE uuid IN ({}) ORDER BY {} {}".format(",".join(["?"]*len(uuids)), sort_by, "DESC" if reverse else "ASC"), uuids) as cursor:
+        cols, fields = self.__select_columns(fields)
+        in_expr, params = sql_in_list(uuids)
+        async with self._reader().execute("SELECT {} FROM files WHERE uuid IN {} ORDER BY {} {}".format(cols, in_expr, sort_by, "DESC" if reverse else "ASC"), params) as cursor:
             rows = await cursor.fetchall()
         if len(list(rows)) != len(uuids):
             raise self.Error.LiresEntryNotFoundError("Some uuids not found")
-        ret = [self.__formatRow(row) for row in rows]
+        ret = [self.__formatRow(row, fields) for row in rows]
         return ret
     
-    async def get_all(self, sort_by = 'time_import', reverse = True) -> list[DBFileInfo]:
+    async def get_all(self, sort_by = 'time_import', reverse = True, fields: Optional[typing.Sequence[str]] = None) -> list[DBFileInfo]:
         """
         Get all file info
         """
         if await self.size() == 0: return []
-        async with self.conn.execute("SELECT * FROM files ORDER BY {} {}".format(sort_by, "DESC" if reverse else "ASC")) as cursor:
+        cols, fields = self.__select_columns(fields)
+        async with self._reader().execute("SELECT {} FROM files ORDER BY {} {}".format(cols, sort_by, "DESC" if reverse else "ASC")) as cursor:
+            rows = await cursor.fetchall()
+        return [self.__formatRow(row, fields) for row in rows]
+    
+    async def __write_index(self, table: typing.Literal["entry_tags", "entry_authors"], items: list[tuple[str, list[str]]]):
+        """
+        Replace the rows of the entries in the tag / author index table, 
+        items are (uuid, tags) or (uuid, authors), an empty list removes the entry from the table
+        """
+        col = "tag" if table == "entry_tags" else "author"
+        await self.conn.executemany("DELETE FROM {} WHERE uuid=?".format(table), [(uid,) for uid, _ in items])
+        await self.conn.executemany(
+            "INSERT OR IGNORE INTO {} (uuid, {}) VALUES (?, ?)".format(table, col), 
+            [(uid, v if col == "tag" else format_author_name(v)) for uid, values in items for v in values]
+            )
+        # the entries are up-to-date in this table, 
+        # the other table should be written in the same transaction
+        await self.conn.executemany("DELETE FROM entry_index_log WHERE uuid=?", [(uid,) for uid, _ in items])
+    
+    async def rebuild_entry_index(self):
+        """ Rebuild the tag / author index tables from the main table """
+        await self.logger.info("Rebuilding tag and author index for {}".format(self.db_path))
+        async with self.conn.execute("SELECT uuid, tags, authors FROM files") as cursor:
+            rows = await cursor.fetchall()
+        await self.conn.execute("DELETE FROM entry_tags")
+        await self.conn.execute("DELETE FROM entry_authors")
+        await self.__write_index("entry_tags", [(row[0], parse_list(row[1])) for row in rows])
+        await self.__write_index("entry_authors", [(row[0], parse_list(row[2])) for row in rows])
+        await self.conn.execute("DELETE FROM entry_index_log")
+        await self.cache.reset()
+        await self.set_modified_flag(True)
+    
+    async def sync_entry_index(self) -> int:
+        """
+        Re-index the entries logged in entry_index_log, 
+        i.e. modified without updating the tag / author index tables, 
+        return the number of re-indexed entries
+        """
+        async with self.conn.execute("SELECT uuid FROM entry_index_log") as cursor:
+            uids = [row[0] for row in await cursor.fetchall()]
+        if not uids:
+            return 0
+        await self.logger.info("Re-indexing tags and authors of {} entries for {}".format(len(uids), self.db_path))
+        cond, params = sql_in_list(uids)
+        async with self.conn.execute("SELECT uuid, tags, authors FROM files WHERE uuid IN {}".format(cond), params) as cursor:
+            rows = {row[0]: row for row in await cursor.fetchall()}
+        # the removed entries are written with empty lists, to be deleted from the index tables
+        await self.__write_index("entry_tags", [(uid, parse_list(rows[uid][1]) if uid in rows else []) for uid in uids])
+        await self.__write_index("entry_authors", [(uid, parse_list(rows[uid][2]) if uid in rows else []) for uid in uids])
+        await self.cache.reset()
+        await self.set_modified_flag(True)
+        return len(uids)
+    
+    async def __load_cache(self) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+        """ read the index tables to fill the cache, see CacheLoaderT """
+        # the lock ensures the cache updates following the index updates are not missed
+        async with self.lock:
+            async with self.conn.execute("SELECT tag, uuid FROM entry_tags") as cursor:
+                tags = await cursor.fetchall()
+            async with self.conn.execute("SELECT author, uuid FROM entry_authors") as cursor:
+                authors = await cursor.fetchall()
+        return tags, authors     # type: ignore
+    
+    async def __journal(self, records: list[tuple[str, JournalOpT, list[str]]]):
+        """ Append (uuid, op, fields) to the change journal, should be in the same transaction as the modification """
+        now = TimeUtils.now_stamp()
+        await self.conn.executemany(
+            "INSERT INTO change_journal (uuid, op, fields, time) VALUES (?,?,?,?)", 
+            [(uid, op, dump_list(fields), now) for uid, op, fields in records]
+            )
+        if self.__change_listeners:
+            uids = [uid for uid, _, _ in records]
+            for listener in self.__change_listeners:
+                listener(uids)
+    
+    def add_change_listener(self, listener: Callable[[list[str]], None]):
+        """
+        The listener is called on every modification of the entries (including the document changes), 
+        with the modified uuids, before the modification is committed, 
+        should not block, e.g. to invalidate the caches of the entries
+        """
+        self.__change_listeners.append(listener)
+    
+    def remove_change_listener(self, listener: Callable[[list[str]], None]):
+        if listener in self.__change_listeners:
+            self.__change_listeners.remove(listener)
+    
+    async def changes(self, since: int = 0, limit: Optional[int] = None) -> JournalPageT:
+        """
+        The changes with sequence number greater than since, in order, 
+        a client may keep the returned 'latest' and sync with the changes after it, 
+        unless 'resync' is true
+        """
+        reader = self._reader()
+        async with reader.execute("SELECT value FROM meta WHERE key='journal_compacted'") as cursor:
+            compacted = int((await cursor.fetchone())[0])     # type: ignore
+        async with reader.execute("SELECT seq FROM sqlite_sequence WHERE name='change_journal'") as cursor:
+            latest = (row[0] if (row:=await cursor.fetchone()) else 0)
+        if since < compacted or since > latest:
+            # the client is too old, or from another database
+            return {"changes": [], "latest": latest, "resync": True}
+
+        async with reader.execute(
+            "SELECT seq, uuid, op, fields, time FROM change_journal WHERE seq > ? ORDER BY seq" + 
+            (" LIMIT {}".format(int(limit)) if limit is not None else ""), (since,)
+            ) as cursor:
             rows = await cursor.fetchall()
-        return [self.__formatRow(row) for row in rows]
+        changes: list[JournalEntryT] = [
+            {"seq": seq, "uuid": uid, "op": op, "fields": parse_list(fields), "time": t} 
+            for seq, uid, op, fields, t in rows
+            ]
+        if limit is not None and len(changes) == limit:
+            latest = changes[-1]["seq"]
+        return {"changes": changes, "latest": latest, "resync": False}
+    
+    async def compact_journal(self, max_age: float = JOURNAL_MAX_AGE, max_size: int = JOURNAL_MAX_SIZE) -> int:
+        """
+        Remove the journal entries older than max_age (in seconds), and the oldest ones beyond max_size, 
+        the clients behind the removed entries will be asked to resync, 
+        return the number of removed entries
+        """
+        async with self._writing():
+            async with self.conn.execute(
+                "SELECT max(seq), count(*) FROM change_journal WHERE time < ? OR seq <= (SELECT max(seq) FROM change_journal) - ?",
+                (TimeUtils.now_stamp() - max_age, max_size)
+                ) as cursor:
+                last_removed, n_removed = await cursor.fetchone()     # type: ignore
+            if not n_removed:
+                return 0
+            await self.conn.execute("DELETE FROM change_journal WHERE seq <= ?", (last_removed,))
+            await self.conn.execute("UPDATE meta SET value=? WHERE key='journal_compacted'", (str(last_removed),))
+            await self.set_modified_flag(True)
+        await self.logger.info("Compacted {} journal entries of {}".format(n_removed, self.db_path))
+        return n_removed
     
     async def _insert_item(self, item_raw: DBFileRawInfo) -> bool:
         """
         Insert item into database, will overwrite if uuid already exists
         """
         await self.logger.debug("(db_conn) Inserting item {}".format(item_raw["uuid"]))
-        if await self.get(item_raw["uuid"]) is not None:
+        if await self.get(item_raw["uuid"], fields=["uuid"]) is not None:
             # if uuid already exists, delete it first
             await self.conn.execute("DELETE FROM files WHERE uuid=?", (item_raw["uuid"],))
         await self.conn.execute(
             """
-            INSERT INTO files (uuid, bibtex, type, title, year, publication, authors, tags, url, abstract, comments, time_import, time_modify, info_str, doc_ext)
-            VALUES (?,?,?, ?,?,?,?, ?,?,?, ?,?,?, ?,?)
+            INSERT INTO files (uuid, bibtex, type, title, year, publication, authors, tags, url, abstract, comments, time_import, time_modify, info_str, doc_ext, dedupe_key, doc_size, note_linecount, has_abstract, author_abbr)
+            VALUES (?,?,?, ?,?,?,?, ?,?,?, ?,?,?, ?,?,?, ?,?,?,?)
             """,
             (
                 item_raw["uuid"],
@@ -352,17 +930,79 @@ class DBConnection(LiresBase):
                 item_raw["time_import"],
                 item_raw["time_modify"],
                 item_raw["info_str"],
-                item_raw["doc_ext"]
+                item_raw["doc_ext"],
+                item_raw["dedupe_key"],
+                item_raw["doc_size"],
+                item_raw["note_linecount"],
+                item_raw["has_abstract"],
+                item_raw["author_abbr"]
             ))
+        await self.__write_index("entry_tags", [(item_raw["uuid"], parse_list(item_raw["tags"]))])
+        await self.__write_index("entry_authors", [(item_raw["uuid"], parse_list(item_raw["authors"]))])
+        await self.__journal([(item_raw["uuid"], "add", [])])
                                 
         await self.set_modified_flag(True)
         return True
     
     async def _ensure_exist(self, uuid: str) -> Optional[DBFileInfo]:
-        if not (ret:=await self.get(uuid)):
+        """ return the entry with the fields needed for cache maintenance (uuid, authors, tags), None if not exists """
+        if not (ret:=await self.get(uuid, fields=["uuid", "authors", "tags"])):
             await self.logger.error("uuid {} not exists".format(uuid))
         return ret
     
+    async def __make_item(
+            self, 
+            bibtex: str, dtype: str, title: str, year: int | str, publication: str, authors: list[str],
+            tags: list[str], url: str, abstract: str, comments: str, doc_ext: FileTypeT, 
+            doc_size: Optional[int], doc_info: Optional[DocInfo | dict]
+            ) -> Optional[DBFileRawInfo]:
+        """ Build the raw item to be inserted, return None if doc_info is invalid """
+        year = int(year)
+        # generate info
+        doc_info_default = DocInfo(
+            uuid = str(uuid.uuid4()),
+            version_import = VERSION,
+            version_modify = VERSION,
+            device_import = __THIS_NODE__,
+            device_modify = __THIS_NODE__,
+        )
+        if doc_info is None:
+            doc_info = doc_info_default
+        elif isinstance(doc_info, dict):
+            docinfo_dict = doc_info_default.to_dict()
+            docinfo_dict.update(doc_info)   # type: ignore
+            # check if all keys are valid
+            for key in docinfo_dict.keys():
+                if key not in doc_info_default.__annotations__:
+                    await self.logger.error("Invalid key {} in doc_info".format(key))
+                    return None
+            doc_info = DocInfo(**docinfo_dict)
+        else:
+            assert isinstance(doc_info, DocInfo)
+        
+        return {
+            "uuid": doc_info.uuid,
+            "bibtex": bibtex,
+            "type": dtype,
+            "title": title,
+            "year": year,
+            "publication": publication,
+            "authors": dump_list(authors),
+            "tags": dump_list(tags),
+            "url": url,
+            "abstract": abstract,
+            "comments": comments,
+            "time_import": TimeUtils.now_stamp(),
+            "time_modify": TimeUtils.now_stamp(),
+            "info_str": doc_info.to_string(),
+            "doc_ext": doc_ext,
+            "dedupe_key": make_dedupe_key(title, year),
+            "doc_size": doc_size if doc_size is not None else self.get_doc_size(doc_info.uuid, doc_ext),
+            "note_linecount": count_note_lines(comments),
+            "has_abstract": int(check_has_abstract(abstract)),
+            "author_abbr": get_authors_abbr(authors),
+        }
+    
     async def add_entry(
             self, 
 
@@ -388,91 +1028,176 @@ class DBConnection(LiresBase):
             or a dict that contains partial information (will be merged with generated default info)
         return uuid if success, None if failed
         """
-        year = int(year)
-        # generate info
-        doc_info_default = DocInfo(
-            uuid = str(uuid.uuid4()),
-            version_import = VERSION,
-            version_modify = VERSION,
-            device_import = __THIS_NODE__,
-            device_modify = __THIS_NODE__,
-        )
-        if doc_info is None:
-            doc_info = doc_info_default
-        elif isinstance(doc_info, dict):
-            docinfo_dict = doc_info_default.to_dict()
-            docinfo_dict.update(doc_info)   # type: ignore
-            # check if all keys are valid
-            for key in docinfo_dict.keys():
-                if key not in doc_info_default.__annotations__:
-                    await self.logger.error("Invalid key {} in doc_info".format(key))
-                    return None
-            doc_info = DocInfo(**docinfo_dict)
-        else:
-            assert isinstance(doc_info, DocInfo)
-            
-        uid = doc_info.uuid
+        item = await self.__make_item(
+            bibtex, dtype, title, year, publication, authors, 
+            tags, url, abstract, comments, doc_ext, None, doc_info
+            )
+        if item is None:
+            return None
+        uid = item["uuid"]
         # check if uuid already exists
-        if await self.get(uid) is not None:
+        if await self.get(uid, fields=["uuid"]) is not None:
             await self.logger.error("uuid {} already exists".format(uid))
             return None
         # insert
         await self.logger.debug("(db_conn) Adding entry {}".format(uid))
-        async with DB_MOD_LOCK:
-            await self._insert_item({
-                "uuid": uid,
-                "bibtex": bibtex,
-                "type": dtype,
-                "title": title,
-                "year": year,
-                "publication": publication,
-                "authors": dump_list(authors),
-                "tags": dump_list(tags),
-                "url": url,
-                "abstract": abstract,
-                "comments": comments,
-                "time_import": TimeUtils.now_stamp(),
-                "time_modify": TimeUtils.now_stamp(),
-                "info_str": doc_info.to_string(),
-                "doc_ext": doc_ext
-            })
+        async with self._writing():
+            await self._insert_item(item)
             # add cache
             await self.cache.add_tag_cache(uid, tags)
             await self.cache.add_author_cache(uid, authors)
             await self.set_modified_flag(True)
         return uid
     
-    async def _touch_entry(self, uuid: str) -> bool:
+    async def add_entries(self, entries: list[DBEntryT]) -> list[Optional[str]]:
+        """
+        Add many entries to the database in a single transaction, 
+        the entries take the same arguments as add_entry, 
+        the cache is updated once after all entries are inserted.
+        return a list of uuids (None for failed entries) in the same order as the input
+        """
+        items: list[Optional[DBFileRawInfo]] = []
+        for entry in entries:
+            items.append(await self.__make_item(
+                entry["bibtex"], entry["dtype"], entry["title"], entry["year"], entry["publication"], entry["authors"],
+                entry.get("tags", []), entry.get("url", ""), entry.get("abstract", ""), entry.get("comments", ""),
+                entry.get("doc_ext", ""), entry.get("doc_size", None), entry.get("doc_info", None)
+            ))
+
+        # uuids should be unique, in the database and in the batch
+        _uids = [item["uuid"] for item in items if item is not None]
+        existing = set(_uids).difference(await self.check_nonexist(_uids)) if _uids else set()
+        _seen = set()
+        for i, item in enumerate(items):
+            if item is None: continue
+            if item["uuid"] in existing or item["uuid"] in _seen:
+                await self.logger.error("uuid {} already exists".format(item["uuid"]))
+                items[i] = None
+                continue
+            _seen.add(item["uuid"])
+        to_insert = [item for item in items if item is not None]
+
+        await self.logger.debug("(db_conn) Adding {} entries".format(len(to_insert)))
+        async with self._writing():
+            # the savepoint starts a transaction if there is no pending one, 
+            # and makes the batch atomic even if there are pending changes
+            await self.conn.execute("SAVEPOINT add_entries")
+            try:
+                await self.conn.executemany(
+                    """
+                    INSERT INTO files (uuid, bibtex, type, title, year, publication, authors, tags, url, abstract, comments, time_import, time_modify, info_str, doc_ext, dedupe_key, doc_size, note_linecount, has_abstract, author_abbr)
+                    VALUES (?,?,?, ?,?,?,?, ?,?,?, ?,?,?, ?,?,?, ?,?,?,?)
+                    """,
+                    [(
+                        item["uuid"], item["bibtex"], item["type"], item["title"], item["year"], item["publication"],
+                        item["authors"], item["tags"], item["url"], item["abstract"], item["comments"],
+                        item["time_import"], item["time_modify"], item["info_str"], item["doc_ext"], item["dedupe_key"],
+                        item["doc_size"], item["note_linecount"], item["has_abstract"], item["author_abbr"]
+                    ) for item in to_insert])
+                await self.__write_index("entry_tags", [(item["uuid"], parse_list(item["tags"])) for item in to_insert])
+                await self.__write_index("entry_authors", [(item["uuid"], parse_list(item["authors"])) for item in to_insert])
+                await self.__journal([(item["uuid"], "add", []) for item in to_insert])
+                await self.__add_files_usage(sum(item["doc_size"] for item in to_insert))
+            except Exception:
+                await self.conn.execute("ROLLBACK TO add_entries")
+                await self.conn.execute("RELEASE add_entries")
+                raise
+            await self.conn.execute("RELEASE add_entries")
+
+            # add cache
+            await self.cache.add_entries_cache([
+                (item["uuid"], parse_list(item["tags"]), parse_list(item["authors"])) for item in to_insert
+                ])
+            await self.set_modified_flag(True)
+        return [item["uuid"] if item is not None else None for item in items]
+    
+    async def _touch_entry(self, uuid: str, fields: list[str]) -> bool:
+        """ Update the modification time and info, and journal the modified fields """
         # exist check should be done before calling this function
         await self.conn.execute("UPDATE files SET time_modify=? WHERE uuid=?", (TimeUtils.now_stamp(), uuid))
-        info = DocInfo.from_string(
-            (await (await self.conn.execute("SELECT info_str FROM files WHERE uuid=?", (uuid,))).fetchone())[0]  # type: ignore
-        )
-        info.version_modify = VERSION
-        info.device_modify = __THIS_NODE__
-        await self.conn.execute("UPDATE files SET info_str=? WHERE uuid=?", (info.to_string(), uuid))
+        info_str = (await (await self.conn.execute("SELECT info_str FROM files WHERE uuid=?", (uuid,))).fetchone())[0]  # type: ignore
+        await self.conn.execute("UPDATE files SET info_str=? WHERE uuid=?", (self._touched_info(info_str), uuid))
+        await self.__journal([(uuid, "update", fields)])
         await self.set_modified_flag(True)
         return True
     
+    @staticmethod
+    def _touched_info(info_str: str) -> str:
+        """ The info string with the modification recorded """
+        info = DocInfo.from_string(info_str)
+        info.version_modify = VERSION
+        info.device_modify = __THIS_NODE__
+        return info.to_string()
+    
     async def remove_entry(self, uuid: str) -> bool:
-        if not (entry:=await self._ensure_exist(uuid)): return False
-        await self.conn.execute("DELETE FROM files WHERE uuid=?", (uuid,))
+        async with self._writing():
+            if not (entry:=await self._ensure_exist(uuid)): return False
+            await self.conn.execute("DELETE FROM files WHERE uuid=?", (uuid,))
+            await self.__write_index("entry_tags", [(uuid, [])])
+            await self.__write_index("entry_authors", [(uuid, [])])
+            await self.__journal([(uuid, "delete", [])])
 
-        # remove related cache
-        await self.cache.remove_tag_cache(uuid, entry["tags"])
-        await self.cache.remove_author_cache(uuid, entry["authors"])
+            # remove related cache
+            await self.cache.remove_tag_cache(uuid, entry["tags"])
+            await self.cache.remove_author_cache(uuid, entry["authors"])
 
-        await self.set_modified_flag(True)
+            await self.set_modified_flag(True)
         await self.logger.debug("(db_conn) Removed entry {}".format(uuid))
         return True
     
-    async def set_doc_ext(self, uuid: str, ext: Optional[str]) -> bool:
-        if not await self._ensure_exist(uuid): return False
-        await self.logger.debug("(db_conn) Setting doc_ext for {} to {}".format(uuid, ext))
-        await self.conn.execute("UPDATE files SET doc_ext=? WHERE uuid=?", (ext, uuid))
-        await self._touch_entry(uuid)
+    def get_doc_size(self, uuid: str, ext: Optional[str]) -> int:
+        """ Read the document size (in bytes) from the file system, 0 if no document """
+        if not ext:
+            return 0
+        doc_path = entry_path(os.path.join(self.db_dir, "files"), uuid, ext)
+        return os.path.getsize(doc_path) if os.path.exists(doc_path) else 0
+    
+    async def set_doc_ext(self, uuid: str, ext: Optional[str], doc_size: Optional[int] = None) -> bool:
+        """
+        Should be called after the document is created or removed, 
+        the document size will be read from the file if not provided
+        """
+        async with self._writing():
+            if not await self._ensure_exist(uuid): return False
+            await self.logger.debug("(db_conn) Setting doc_ext for {} to {}".format(uuid, ext))
+            if doc_size is None:
+                doc_size = self.get_doc_size(uuid, ext)
+            async with self.conn.execute("SELECT doc_size FROM files WHERE uuid=?", (uuid,)) as cursor:
+                old_size = (await cursor.fetchone())[0]     # type: ignore
+            await self.conn.execute("UPDATE files SET doc_ext=?, doc_size=? WHERE uuid=?", (ext, doc_size, uuid))
+            await self._touch_entry(uuid, ["doc_ext", "doc_size"])
+            await self.__add_files_usage(doc_size - old_size)
         return True
     
+    @property
+    def files_usage(self) -> Optional[int]:
+        """
+        Total size (in bytes) of the files in the database directory, except the sqlite databases, 
+        maintained on the changes of the documents and misc files, 
+        None if not counted yet, see DataBase.disk_usage
+        """
+        return self.__files_usage
+    
+    async def __add_files_usage(self, delta: int):
+        # should be called with the lock held
+        if self.__files_usage is None or delta == 0:
+            return
+        self.__files_usage = max(0, self.__files_usage + delta)
+        await self.conn.execute("UPDATE meta SET value=? WHERE key='files_usage'", (str(self.__files_usage),))
+        await self.set_modified_flag(True)
+    
+    async def add_files_usage(self, delta: int):
+        """ Should be called after the files are created (positive delta) or removed (negative delta) """
+        async with self._writing():
+            await self.__add_files_usage(delta)
+    
+    async def set_files_usage(self, size: int):
+        """ Reset the counter with the size counted from the file system """
+        async with self._writing():
+            self.__files_usage = size
+            await self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('files_usage', ?)", (str(size),))
+            await self.set_modified_flag(True)
+    
     async def update_bibtex(
         self, uuid: str, 
         bibtex: str, 
@@ -483,72 +1208,160 @@ class DBConnection(LiresBase):
         authors: list[str],
         ) -> bool:
         """Provide a new bibtex string, and update the title, year, publication, authors accordingly."""
-        if not (old_entry:=await self._ensure_exist(uuid)): return False
-        await self.logger.debug("(db_conn) Updating bibtex for {}".format(uuid))
-
-        async with DB_MOD_LOCK:
-            await self.conn.execute("UPDATE files SET bibtex=?, type=?, title=?, year=?, publication=?, authors=? WHERE uuid=?", (
-                bibtex, dtype, title, year, publication, dump_list(authors), uuid
+        async with self._writing():
+            if not (old_entry:=await self._ensure_exist(uuid)): return False
+            await self.logger.debug("(db_conn) Updating bibtex for {}".format(uuid))
+            await self.conn.execute("UPDATE files SET bibtex=?, type=?, title=?, year=?, publication=?, authors=?, dedupe_key=?, author_abbr=? WHERE uuid=?", (
+                bibtex, dtype, title, year, publication, dump_list(authors), make_dedupe_key(title, year), get_authors_abbr(authors), uuid
             ))
 
             # check if authors changed and maybe update cache
-            if set(old_entry["authors"]) != set(authors):
+            if old_entry["authors"] != authors:
                 await self.logger.debug("(db_conn) Updating author cache for {}".format(uuid))
                 await self.cache.remove_author_cache(uuid, old_entry["authors"])
                 await self.cache.add_author_cache(uuid, authors)
+                await self.__write_index("entry_authors", [(uuid, authors)])
 
-            await self._touch_entry(uuid)
+            await self._touch_entry(uuid, ["bibtex", "type", "title", "year", "publication", "authors"])
         return True
     
     async def update_tags(self, uuid: str, tags: list[str]) -> bool:
-        async with DB_MOD_LOCK:
+        async with self._writing():
             if not (old_entry:=await self._ensure_exist(uuid)): return False
             await self.logger.debug("(db_conn) Updating tags for {}".format(uuid))
             await self.conn.execute("UPDATE files SET tags=? WHERE uuid=?", (dump_list(tags), uuid))
 
             # check if tags changed and maybe update cache
-            if set(old_entry["tags"]) != set(tags):
+            if old_entry["tags"] != tags:
                 await self.logger.debug("(db_conn) Updating tag cache for {}".format(uuid))
                 await self.cache.remove_tag_cache(uuid, old_entry["tags"])
                 await self.cache.add_tag_cache(uuid, tags)
+                await self.__write_index("entry_tags", [(uuid, tags)])
 
-            await self._touch_entry(uuid)
+            await self._touch_entry(uuid, ["tags"])
         return True
     
+    async def update_tags_many(
+        self, uuids: list[str], 
+        update_fn: Callable[[list[str]], Optional[list[str]]], 
+        progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+        ) -> int:
+        """
+        Update the tags of many entries in a single transaction, 
+        - update_fn: maps the old tags of an entry to the new ones, None to keep the entry unchanged
+        - progress: called with (number of processed entries, total) after each batch
+        return the number of changed entries
+        """
+        n_changed = 0
+        async with self._writing():
+            for i in range(0, len(uuids), BULK_UPDATE_BATCH_SIZE):
+                batch = uuids[i:i+BULK_UPDATE_BATCH_SIZE]
+                in_expr, params = sql_in_list(batch)
+                async with self.conn.execute("SELECT uuid, tags, info_str FROM files WHERE uuid IN " + in_expr, params) as cursor:
+                    rows = await cursor.fetchall()
+                changes: list[tuple[str, list[str], list[str], str]] = []
+                for uid, tags_str, info_str in rows:
+                    old_tags = parse_list(tags_str)
+                    if (new_tags := update_fn(old_tags)) is not None and new_tags != old_tags:
+                        changes.append((uid, old_tags, new_tags, info_str))
+                if changes:
+                    now = TimeUtils.now_stamp()
+                    await self.conn.executemany(
+                        "UPDATE files SET tags=?, time_modify=?, info_str=? WHERE uuid=?", 
+                        [(dump_list(new), now, self._touched_info(info_str), uid) for uid, _, new, info_str in changes]
+                        )
+                    await self.__write_index("entry_tags", [(uid, new) for uid, _, new, _ in changes])
+                    await self.__journal([(uid, "update", ["tags"]) for uid, _, _, _ in changes])
+                    for uid, old, new, _ in changes:
+                        await self.cache.remove_tag_cache(uid, old)
+                        await self.cache.add_tag_cache(uid, new)
+                    await self.set_modified_flag(True)
+                    n_changed += len(changes)
+                if progress is not None:
+                    await progress(i + len(batch), len(uuids))
+        await self.logger.debug("(db_conn) Updated tags of {} entries".format(n_changed))
+        return n_changed
+    
     async def update_url(self, uuid: str, url: str) -> bool:
-        async with DB_MOD_LOCK:
+        async with self._writing():
             if not await self._ensure_exist(uuid): return False
             await self.logger.debug("(db_conn) Updating url for {}".format(uuid))
             await self.conn.execute("UPDATE files SET url=? WHERE uuid=?", (url, uuid))
-            await self._touch_entry(uuid)
+            await self._touch_entry(uuid, ["url"])
         return True
     
     async def update_comments(self, uuid: str, comments: str) -> bool:
-        async with DB_MOD_LOCK:
+        async with self._writing():
             if not await self._ensure_exist(uuid): return False
             # await self.logger.debug("(db_conn) Updating comments for {}".format(uuid))   # too verbose
-            await self.conn.execute("UPDATE files SET comments=? WHERE uuid=?", (comments, uuid))
-            await self._touch_entry(uuid)
+            await self.conn.execute("UPDATE files SET comments=?, note_linecount=? WHERE uuid=?", (comments, count_note_lines(comments), uuid))
+            await self._touch_entry(uuid, ["comments"])
         return True
     
     async def update_abstract(self, uuid: str, abstract: str) -> bool:
-        async with DB_MOD_LOCK:
+        async with self._writing():
             if not await self._ensure_exist(uuid): return False
             # await self.logger.debug("(db_conn) Updating abstract for {}".format(uuid))   # too verbose
-            await self.conn.execute("UPDATE files SET abstract=? WHERE uuid=?", (abstract, uuid))
-            await self._touch_entry(uuid)
+            await self.conn.execute("UPDATE files SET abstract=?, has_abstract=? WHERE uuid=?", (abstract, int(check_has_abstract(abstract)), uuid))
+            await self._touch_entry(uuid, ["abstract"])
         return True
     
     async def commit(self):
         """
         Be sure to register this function to the event loop!
+        (unless the durability mode is immediate or group)
         """
+        async with self.lock:
+            await self.__commit()
+    
+    async def __commit(self):
         if not self.__modified: return
+        t_start = time.perf_counter()
         await self.conn.commit()
-        await self.cache.conn.commit()
+        latency = time.perf_counter() - t_start
+        stats = self.__commit_stats
+        stats["n_commit"] += 1
+        stats["latency_total"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        stats["latency_last"] = latency
         await self.set_modified_flag(False)
         await self.logger.debug("Committed document database")
     
+    async def optimize(self, analyze: bool = False):
+        """
+        Update the statistics of the query planner, 
+        - analyze: analyze all tables and indexes, 
+            otherwise (PRAGMA optimize) only those that seem to need it, which is cheap and can be called periodically
+        """
+        async with self.lock:
+            await self.conn.execute("ANALYZE" if analyze else "PRAGMA optimize")
+    
+    async def checkpoint(self):
+        """
+        Write the committed changes in the write-ahead log back to the database file, 
+        should be called before reading the database file directly (e.g. for backup)
+        """
+        await self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    async def rebuild_fts(self):
+        """
+        Rebuild the full-text search table from the main table, 
+        the index is normally maintained by the triggers, see __init_fts
+        """
+        if not self.__fts_enabled:
+            return
+        await self.logger.info("Rebuilding full-text search index for {}".format(self.db_path))
+        await self.conn.execute("DELETE FROM files_fts")
+        # reset first, as the unique index is checked row by row
+        await self.conn.execute("UPDATE files SET fts_rowid = NULL")
+        await self.conn.execute("UPDATE files SET fts_rowid = rowid")
+        await self.conn.execute(
+            """
+            INSERT INTO files_fts (rowid, title, abstract, publication, comments)
+            SELECT fts_rowid, title, abstract, publication, comments FROM files
+            """)
+        await self.set_modified_flag(True)
+    
     async def print_data(self, uuid: str):
         if not await self._ensure_exist(uuid): return False
         async with self.conn.execute("SELECT * FROM files WHERE uuid=?", (uuid,)) as cursor:
@@ -570,20 +1383,32 @@ class DBConnection(LiresBase):
         time_import: Optional[tuple[Optional[float], Optional[float]]] = None,
         time_modify: Optional[tuple[Optional[float], Optional[float]]] = None,
         authors: Optional[list[str]] = None,
-        tags: Optional[list[str]] = None
+        tags: Optional[list[str]] = None, 
+        sort_by: Optional[str] = None,
+        reverse: bool = True,
+        after: Optional[PageCursorT] = None,
+        limit: Optional[int] = None,
     ) -> list[str]:
         '''
         A simple filter function for fast search,
 
         (tag, and author) will involve more search operations,
 
+        - title, publication, note: non-strict queries are served by the full-text search table,
+            and the results are ranked by relevance (bm25)
+
         - year: tuple of two int, [start, end), if start or end is None, it will be treated as -inf or inf
+
+        - sort_by, reverse: sort the results by a field instead of the relevance
+        - after, limit: return a page of the sorted results, see page_cursor, 
+            sort_by defaults to time_import if not given
         '''
         # build query
         if await self.size() == 0:
             return []
         query_conds = []
         query_items = []
+        fts_conds = []      # full-text search conditions, will be combined into a single MATCH expression
 
         for [field, value] in [
             ["title", title],
@@ -591,6 +1416,12 @@ class DBConnection(LiresBase):
             ["comments", note]
         ]:
             if value:
+                if not strict and len(value) >= FTS_MIN_QUERY_LEN and self.__fts_enabled:
+                    # the trigram tokenizer is case-insensitive, 
+                    # same as LIKE in sqlite for ascii characters
+                    fts_conds.append('{} : "{}"'.format(field, value.replace('"', '""')))
+                    continue
+
                 if strict and not ignore_case:
                     query_conds.append("{}=?".format(field))
                 elif strict and ignore_case:
@@ -634,196 +1465,289 @@ class DBConnection(LiresBase):
 
         # better debug info, put uid in the end
         if from_uids is not None:
-            query_conds.append("uuid IN ({})".format(",".join(["?"]*len(from_uids))))
-            query_items.extend(from_uids)
+            in_expr, in_params = sql_in_list(from_uids)
+            query_conds.append("files.uuid IN " + in_expr)
+            query_items.extend(in_params)
 
-        if query_conds:
+        if sort_by is None and (after is not None or limit is not None):
+            sort_by = "time_import"
+        # sort and paginate in the query if there is no further filtering by the cache
+        paginate_in_query = sort_by is not None and not authors and not tags
+        if paginate_in_query:
+            assert sort_by is not None
+            page_cond, page_items, page_tail = self.__keyset(sort_by, reverse, after, limit)
+            if page_cond:
+                query_conds.append(page_cond)
+                query_items.extend(page_items)
+
+        if fts_conds:
+            # full-text search, ranked by bm25 relevance
+            query = "SELECT files.uuid FROM files_fts JOIN files ON files.fts_rowid = files_fts.rowid WHERE files_fts MATCH ?"
+            query_items.insert(0, " AND ".join(fts_conds))
+            if query_conds:
+                query += " AND " + " AND ".join(query_conds)
+            query += page_tail if paginate_in_query else " ORDER BY bm25(files_fts)"
+        elif query_conds:
+            query = "SELECT files.uuid FROM files WHERE " + " AND ".join(query_conds)
+            if paginate_in_query:
+                query += page_tail
+        else:
+            query = None
+
+        if query is not None:
             # execute
-            query = "SELECT uuid FROM files WHERE " + " AND ".join(query_conds)
             await self.logger.debug(
                 "Executing query: {} | with items: {}"
                 .format(_q[:100] + "..." if len(_q:=str(query)) > 100 else _q, 
                         _it[:100] + "..." if len(_it:=str(query_items)) > 100 else _it)
                 )
 
-            async with self.conn.execute(
+            async with self._reader().execute(
                 query, tuple(query_items)
                 ) as cursor:
                 ret = [row[0] for row in await cursor.fetchall()]
+        elif paginate_in_query:
+            ret = await self.keys(sort_by, reverse, after, limit)
         else:
             ret = await self.keys()
         
+        # keep the order of the (maybe ranked) results
         if authors:
-            ret = set(ret).intersection(await self.cache.query_authors(authors, strict, ignore_case))
+            _author_match = await self.cache.query_authors(authors, strict, ignore_case)
+            ret = [uid for uid in ret if uid in _author_match]
         if tags:
-            ret = set(ret).intersection(await self.cache.query_tags(tags, strict, ignore_case))
-        return list(ret)
+            _tag_match = await self.cache.query_tags(tags, strict, ignore_case)
+            ret = [uid for uid in ret if uid in _tag_match]
+        
+        if sort_by is not None and not paginate_in_query:
+            ret = await self.sort_keys(ret, sort_by, reverse, after, limit)
+        return ret
+    
+    async def query(
+        self, q: str | QueryNode, 
+        sort_by: Optional[str] = None,
+        reverse: bool = True,
+        after: Optional[PageCursorT] = None,
+        limit: Optional[int] = None,
+        ) -> list[str]:
+        """
+        Search with the query language (see dbQuery), in a single SQL statement, 
+        - q: the query string, or the parsed query
+        - sort_by, reverse: sort the results by a field, 
+            if not given, the results are ranked by relevance if the query has full-text search terms, 
+            otherwise sorted by time_import
+        - after, limit: return a page of the sorted results, see page_cursor
+        raise LiresQuerySyntaxError if the query is invalid
+        """
+        node = parse_query(q) if isinstance(q, str) else q
+        where, params, rank_phrases = compile_query(node, fts=self.__fts_enabled)
+        if sort_by is None and (not rank_phrases or after is not None or limit is not None):
+            sort_by = "time_import"
+
+        if sort_by is None:
+            # rank by the bm25 score of the full-text search terms
+            query = """
+            WITH ranked AS (SELECT rowid, bm25(files_fts) AS score FROM files_fts WHERE files_fts MATCH ?)
+            SELECT files.uuid FROM files LEFT JOIN ranked ON ranked.rowid = files.fts_rowid 
+            WHERE {} ORDER BY ranked.score IS NULL, ranked.score
+            """.format(where)
+            params = [" OR ".join(rank_phrases), *params]
+        else:
+            page_cond, page_items, page_tail = self.__keyset(sort_by, reverse, after, limit)
+            query = "SELECT files.uuid FROM files WHERE " + where
+            if page_cond:
+                query += " AND " + page_cond
+                params.extend(page_items)
+            query += page_tail
+        
+        await self.logger.debug("Executing query: {} | with items: {}".format(where[:100], str(params)[:100]))
+        async with self._reader().execute(query, params) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+class _InvertedIndex:
+    """
+    key -> set of uuids, 
+    with auxiliary lookup tables for case-insensitive and prefix queries
+    """
+    def __init__(self) -> None:
+        self.entries: dict[str, set[str]] = {}
+        self._lower: dict[str, set[str]] = {}   # lower case key -> keys
+        self._sorted_keys: Optional[list[str]] = None   # lazily built, for prefix lookup
+
+    def clear(self):
+        self.entries.clear()
+        self._lower.clear()
+        self._sorted_keys = None
+
+    def add(self, key: str, uuid: str):
+        if (uids := self.entries.get(key)) is None:
+            uids = self.entries[key] = set()
+            self._lower.setdefault(key.lower(), set()).add(key)
+            self._sorted_keys = None
+        uids.add(uuid)
 
+    def remove(self, key: str, uuid: str) -> bool:
+        """ return False if the uuid is not indexed under the key """
+        if (uids := self.entries.get(key)) is None or uuid not in uids:
+            return False
+        uids.remove(uuid)
+        if not uids:
+            del self.entries[key]
+            _lower_keys = self._lower[key.lower()]
+            _lower_keys.remove(key)
+            if not _lower_keys:
+                del self._lower[key.lower()]
+            self._sorted_keys = None
+        return True
+
+    def keys_with_prefix(self, prefix: str) -> list[str]:
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self.entries.keys())
+        i = bisect.bisect_left(self._sorted_keys, prefix)
+        ret = []
+        while i < len(self._sorted_keys) and self._sorted_keys[i].startswith(prefix):
+            ret.append(self._sorted_keys[i])
+            i += 1
+        return ret
+
+    def match_keys(self, item: str, strict: bool, ignore_case: bool) -> list[str]:
+        if strict and not ignore_case:
+            return [item] if item in self.entries else []
+        elif strict and ignore_case:
+            return list(self._lower.get(item.lower(), ()))
+        else:
+            # substring match, case-insensitive as LIKE
+            item = item.lower()
+            return [k for lk, ks in self._lower.items() if item in lk for k in ks]
+
+# returns the (tag, uuid) and (author, uuid) pairs to fill DBConnectionCache
+CacheLoaderT = Callable[[], Awaitable[tuple[list[tuple[str, str]], list[tuple[str, str]]]]]
 class DBConnectionCache(LiresBase):
     """
     Reverse index for authors and tags, for faster searching (maybe more?)
-    The subtables must be two columns, the first is the key, the second is the value (named "entries")
-    the value should be a json string of a list of uuids
+    The indices are kept in memory as mappings from the author / tag to the set of uuids, 
+    and should be updated incrementally after the main database is updated
     """
     logger = LiresBase.loggers().core
     def __init__(self) -> None:
-        self.__conn: aiosqlite.Connection
-    
-    @property
-    def conn(self):
-        try:
-            return self.__conn
-        except AttributeError:
-            raise AttributeError("DBConnectionCache is not initialized")
-
-    async def init(self):
-        # create in-memory database, remember to close it after use!
-        # self.__conn = await aiosqlite.connect(f"file:{self.__id}?mode=memory&cache=shared", uri=True)
-        self.__conn = await aiosqlite.connect(f":memory:")
+        self._authors = _InvertedIndex()
+        self._tags = _InvertedIndex()
+        # the tag hierarchy, for resolving the sub-tags, see query_tag_subtrees
+        self._tag_tree = TagTree()
+        self._loader: Optional[CacheLoaderT] = None
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
 
-        # two cache tables for authors and tags
-        async with self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='authors'") as cursor:
-            if not await cursor.fetchone():
-                await cursor.execute("""
-                CREATE TABLE IF NOT EXISTS authors (
-                    author TEXT PRIMARY KEY,
-                    entries TEXT NOT NULL
-                )
-                """)
-        async with self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='tags'") as cursor:
-            if not await cursor.fetchone():
-                await cursor.execute("""
-                CREATE TABLE IF NOT EXISTS tags (
-                    tag TEXT PRIMARY KEY,
-                    entries TEXT NOT NULL
-                )
-                """)
+    async def init(self, loader: Optional[CacheLoaderT] = None):
+        """
+        - loader: called to fill the cache on the first query, the authors should be formatted
+        """
+        self._loader = loader
+        await self.reset()
         return self
 
-    async def build_init_cache(self, all_items: list[DBFileInfo]):
-        await self.logger.debug("[DBCache] Building initial cache")
-        # build cache for authors and tags
-        authors_cache: dict[str, list[str]] = {}
-        tags_cache: dict[str, list[str]] = {}
-        for item in all_items:
-            for author in item["authors"]:
-                # format author name!
-                author = format_author_name(author)
-
-                if author not in authors_cache:
-                    authors_cache[author] = []
-                authors_cache[author].append(item["uuid"])
-            for tag in item["tags"]:
-                if tag not in tags_cache:
-                    tags_cache[tag] = []
-                tags_cache[tag].append(item["uuid"])
+    async def reset(self):
+        """ Drop the cache, it will be loaded again on the next query """
+        self._loaded = False
         await self._remove_all_cache()
-        for author, entries in authors_cache.items():
-            await self.conn.execute("INSERT INTO authors (author, entries) VALUES (?, ?)", (author, json.dumps(entries)))
-        for tag, entries in tags_cache.items():
-            await self.conn.execute("INSERT INTO tags (tag, entries) VALUES (?, ?)", (tag, json.dumps(entries)))
-        await self.logger.debug("[DBCache] Initial cache built")
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded or self._loader is None:
+                return
+            await self.logger.debug("[DBCache] Loading cache")
+            tags, authors = await self._loader()
+            await self._remove_all_cache()
+            for tag, uuid in tags:
+                self._tags.add(tag, uuid)
+                self._tag_tree.add(tag, uuid)
+            for author, uuid in authors:
+                self._authors.add(author, uuid)
+            self._loaded = True
+            await self.logger.debug("[DBCache] Cache loaded, {} tags, {} authors".format(len(self._tags.entries), len(self._authors.entries)))
     
     async def _remove_all_cache(self):
-        async with self.conn.execute("DELETE FROM authors") as cursor:
-            await cursor.fetchall()
-        async with self.conn.execute("DELETE FROM tags") as cursor:
-            await cursor.fetchall()
+        self._authors.clear()
+        self._tags.clear()
+        self._tag_tree.clear()
     
     async def all_authors(self) -> list[str]:
-        async with self.conn.execute("SELECT author FROM authors") as cursor:
-            return [row[0] for row in await cursor.fetchall()]
+        await self._ensure_loaded()
+        return list(self._authors.entries.keys())
     
     async def all_tags(self) -> list[str]:
-        async with self.conn.execute("SELECT tag FROM tags") as cursor:
-            return [row[0] for row in await cursor.fetchall()]
+        await self._ensure_loaded()
+        return list(self._tags.entries.keys())
+    
+    async def authors_with_prefix(self, prefix: str) -> list[str]:
+        await self._ensure_loaded()
+        return self._authors.keys_with_prefix(prefix)
+    
+    async def tags_with_prefix(self, prefix: str) -> list[str]:
+        await self._ensure_loaded()
+        return self._tags.keys_with_prefix(prefix)
 
-    async def _query_by(self, table: str, col: str, q: list[str], strict: bool, ignore_case: bool) -> set[str]:
+    async def _query_by(self, index: _InvertedIndex, q: list[str], strict: bool, ignore_case: bool) -> set[str]:
         """ return a set of uuids that match the query """
+        await self._ensure_loaded()
         res_list: list[set[str]] = []
 
         for item in q:
-            if strict and not ignore_case:
-                q_cond = "{}=?".format(col)
-            elif strict and ignore_case:
-                q_cond = "{}=? COLLATE NOCASE".format(col)
-            elif not strict and not ignore_case:
-                q_cond = "{} LIKE ?".format(col)
-            else:
-                q_cond = "{} LIKE ? COLLATE NOCASE".format(col)
-
-            if not strict:
-                q_item = f"%{item}%"
-            else:
-                q_item = item
-
-            query = "SELECT entries FROM {} WHERE ".format(table) + q_cond
-            found_uids = []
-            async with self.conn.execute(query, (q_item,)) as cursor:
-                for row in await cursor.fetchall():
-                    found_uids.append(json.loads(row[0]))
+            found_keys = index.match_keys(item, strict, ignore_case)
 
             # for every search query, get result's union
-            if not found_uids: continue
-            res_list.append(set(functools.reduce(lambda x, y: x+y, found_uids)))
+            if not found_keys: continue
+            res_list.append(set().union(*(index.entries[k] for k in found_keys)))
         
         # return intersection of all results
         if not res_list: return set()
-        return functools.reduce(lambda x, y: x.intersection(y), res_list)
+        return set.intersection(*res_list)
 
     async def query_authors(self, q: list[str], strict: bool = False, ignore_case: bool = True) -> set[str]:
         q = [format_author_name(x) for x in q]
-        return await self._query_by("authors", "author", q, strict, ignore_case)
+        return await self._query_by(self._authors, q, strict, ignore_case)
     async def query_tags(self, q: list[str], strict: bool = False, ignore_case: bool = True) -> set[str]:
-        return await self._query_by("tags", "tag", q, strict, ignore_case)
+        return await self._query_by(self._tags, q, strict, ignore_case)
+    async def query_tag_subtrees(self, tags: list[str]) -> set[str]:
+        """ return the uuids that have all the tags, each tag also matches its sub-tags """
+        await self._ensure_loaded()
+        if not tags:
+            return set()
+        subtrees = sorted((self._tag_tree.subtree_uuids(t) for t in tags), key=len)
+        return set(subtrees[0]).intersection(*subtrees[1:])
     
-    # These functions are for updating cache, should be called after the main database is updated
+    # These functions are for updating cache, should be called after the main database is updated, 
+    # nothing to do if the cache is not loaded yet, the loader will read the updated index tables
     async def remove_tag_cache(self, uuid: str, tags: list[str]):
+        if not self._loaded: return
         for tag in tags:
-            async with self.conn.execute("SELECT entries FROM tags WHERE tag=?", (tag,)) as cursor:
-                ret = await cursor.fetchone()
-            if ret is None:
-                continue
-            entries: list[str] = json.loads(ret[0])
-            entries.remove(uuid)
-            if not entries:
-                await self.conn.execute("DELETE FROM tags WHERE tag=?", (tag,))
-            await self.conn.execute("UPDATE tags SET entries=? WHERE tag=?", (json.dumps(entries), tag))
+            self._tags.remove(tag, uuid)
+            self._tag_tree.remove(tag, uuid)
     
     async def remove_author_cache(self, uuid: str, authors: list[str]):
+        if not self._loaded: return
         for author in authors:
-            async with self.conn.execute("SELECT entries FROM authors WHERE author=?", (author,)) as cursor:
-                ret = await cursor.fetchone()
-            if ret is None:
-                continue
-            entries: list[str] = json.loads(ret[0])
-            try:
-                entries.remove(uuid)
-            except ValueError as e:
-                await self.logger.error(f"Failed to remove {uuid} from author {author}, {e}. Maybe the entry is not in the list?")
-            if not entries:
-                await self.conn.execute("DELETE FROM authors WHERE author=?", (author,))
-            await self.conn.execute("UPDATE authors SET entries=? WHERE author=?", (json.dumps(entries), author))
+            author = format_author_name(author)
+            if not self._authors.remove(author, uuid) and author in self._authors.entries:
+                await self.logger.error(f"Failed to remove {uuid} from author {author}. Maybe the entry is not in the list?")
     
     async def add_tag_cache(self, uuid: str, tags: list[str]):
+        if not self._loaded: return
         for tag in tags:
-            async with self.conn.execute("SELECT entries FROM tags WHERE tag=?", (tag,)) as cursor:
-                ret = await cursor.fetchone()
-            if ret is None:
-                await self.conn.execute("INSERT INTO tags (tag, entries) VALUES (?, ?)", (tag, json.dumps([uuid])))
-            else:
-                entries: list[str] = json.loads(ret[0])
-                entries.append(uuid)
-                await self.conn.execute("UPDATE tags SET entries=? WHERE tag=?", (json.dumps(entries), tag))
+            self._tags.add(tag, uuid)
+            self._tag_tree.add(tag, uuid)
     
     async def add_author_cache(self, uuid: str, authors: list[str]):
+        if not self._loaded: return
         for author in authors:
-            author = format_author_name(author)
-            async with self.conn.execute("SELECT entries FROM authors WHERE author=?", (author,)) as cursor:
-                ret = await cursor.fetchone()
-            if ret is None:
-                await self.conn.execute("INSERT INTO authors (author, entries) VALUES (?, ?)", (author, json.dumps([uuid])))
-            else:
-                entries: list[str] = json.loads(ret[0])
-                entries.append(uuid)
-                await self.conn.execute("UPDATE authors SET entries=? WHERE author=?", (json.dumps(entries), author))
\ No newline at end of file
+            self._authors.add(format_author_name(author), uuid)
+    
+    async def add_entries_cache(self, entries: list[tuple[str, list[str], list[str]]]):
+        """
+        Add cache for many entries at once, each entry is a tuple of (uuid, tags, authors)
+        """
+        for uuid, tags, authors in entries:
+            await self.add_tag_cache(uuid, tags)
+            await self.add_author_cache(uuid, authors)
@@ -65,4 +65,51 @@ async def upgrade_1_8_0(db: DBConnection):
     # drop old table
     await db.conn.execute("DROP TABLE files")
     # rename new table
-    await db.conn.execute("ALTER TABLE files_new RENAME TO files")
\ No newline at end of file
+    await db.conn.execute("ALTER TABLE files_new RENAME TO files")
+
+
+async def upgrade_1_9_0(db: DBConnection):
+    """
+    - Add 'dedupe_key' column, for duplicate detection
+    - Add materialized summary columns: 'doc_size', 'note_linecount', 'has_abstract', 'author_abbr'
+    - Fill the tag / author index tables for existing entries, 
+        and add the triggers to log the changes not followed by an index update
+    - Add secondary indexes of the main table, see FILES_INDEXES
+    (the full-text search table is created and filled on init, see DBConnection.__init_fts)
+    """
+    from .dbConn import make_dedupe_key, count_note_lines, check_has_abstract, parse_list, create_files_indexes, create_entry_index_triggers
+    from ..utils.author import get_authors_abbr
+    await db.logger.debug("Elevating database to version 1.9.0")
+    await db.rebuild_entry_index()
+
+    async with db.conn.execute("PRAGMA table_info(files)") as cursor:
+        cols = [col[1] for col in await cursor.fetchall()]
+    if "dedupe_key" not in cols:
+        await db.conn.execute("ALTER TABLE files ADD COLUMN dedupe_key TEXT NOT NULL DEFAULT ''")
+        async with db.conn.execute("SELECT uuid, title, year FROM files") as cursor:
+            rows = await cursor.fetchall()
+        await db.conn.executemany(
+            "UPDATE files SET dedupe_key=? WHERE uuid=?", 
+            [(make_dedupe_key(title, year), uid) for uid, title, year in rows]
+        )
+
+    if "doc_size" not in cols:
+        await db.conn.execute("ALTER TABLE files ADD COLUMN doc_size INTEGER NOT NULL DEFAULT 0")
+        await db.conn.execute("ALTER TABLE files ADD COLUMN note_linecount INTEGER NOT NULL DEFAULT 0")
+        await db.conn.execute("ALTER TABLE files ADD COLUMN has_abstract INTEGER NOT NULL DEFAULT 0")
+        await db.conn.execute("ALTER TABLE files ADD COLUMN author_abbr TEXT NOT NULL DEFAULT ''")
+        async with db.conn.execute("SELECT uuid, doc_ext, comments, abstract, authors FROM files") as cursor:
+            rows = await cursor.fetchall()
+        await db.conn.executemany(
+            "UPDATE files SET doc_size=?, note_linecount=?, has_abstract=?, author_abbr=? WHERE uuid=?", 
+            [(
+                db.get_doc_size(uid, doc_ext), count_note_lines(comments), check_has_abstract(abstract), 
+                get_authors_abbr(parse_list(authors)), uid
+            ) for uid, doc_ext, comments, abstract, authors in rows]
+        )
+    
+    await create_files_indexes(db.conn)
+    # the triggers are dropped with the main table if it was re-created by the previous upgrade
+    await create_entry_index_triggers(db.conn)
+    # statistics for the query planner to choose among the indexes
+    await db.conn.execute("ANALYZE")
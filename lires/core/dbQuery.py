@@ -0,0 +1,270 @@
+"""
+A small query language for searching the database,
+the query is compiled to a single SQL condition on the main table (files),
+with sub-queries on the full-text search table and the tag / author index tables.
+
+Syntax:
+    - terms are combined by AND (implicit, or explicit `AND`), `OR`, `NOT` (or a leading `-`),
+        and grouped by parentheses, AND binds tighter than OR
+    - field:value, where field is one of
+        - title, publication (pub), note: case-insensitive substring match
+        - author: case-insensitive substring match on the formatted author names (family, given)
+        - tag: exact match, `tag:a->b->*` also matches the sub-tags of a->b
+        - year: `year:2020`, `year:2018..2020` (inclusive), `year:2018..`, `year:..2020`,
+            `year:>2018`, `year:>=2018`, `year:<2020`, `year:<=2020`
+        - type: entry type, e.g. `type:article`
+        - uuid: uuid prefix
+        - has: one of abstract, note, doc
+    - a value without field matches the title, abstract, publication or note
+    - values with spaces or parentheses should be double-quoted, use \\" for a quote inside
+
+e.g. `tag:ml->* (author:hinton OR author:lecun) year:2015.. -has:doc`
+"""
+from __future__ import annotations
+import re, dataclasses
+from typing import Optional, Union
+from .error import LiresError
+from ..utils.author import format_author_name
+
+TAG_SEP = "->"          # same as TagRule.SEP
+# the trigram tokenizer of the full-text search table 
+# can not match queries shorter than 3 characters, 
+# those queries will fall back to LIKE
+FTS_MIN_QUERY_LEN = 3
+
+QUERY_FIELDS = ("title", "publication", "note", "author", "tag", "year", "type", "uuid", "has")
+_FIELD_ALIAS = {"pub": "publication", "comments": "note"}
+# full-text search column of the text fields
+_FTS_COLUMN = {"title": "title", "publication": "publication", "note": "comments"}
+_HAS_CONDITION = {
+    "abstract": "files.has_abstract = 1",
+    "note": "files.note_linecount > 0",
+    "doc": "files.doc_ext > ''",     # not "!=", so that the index can be used
+}
+
+@dataclasses.dataclass(frozen=True)
+class QTerm:
+    field: str                      # one of QUERY_FIELDS, or "" for any text field
+    value: str = ""
+    subtree: bool = False           # tag only, also match the sub-tags
+    range: tuple[Optional[int], Optional[int]] = (None, None)    # year only, [start, end)
+
+@dataclasses.dataclass(frozen=True)
+class QAnd:
+    children: tuple[QueryNode, ...]
+
+@dataclasses.dataclass(frozen=True)
+class QOr:
+    children: tuple[QueryNode, ...]
+
+@dataclasses.dataclass(frozen=True)
+class QNot:
+    child: QueryNode
+
+QueryNode = Union[QTerm, QAnd, QOr, QNot]
+
+def _syntax_error(msg: str):
+    return LiresError.LiresQuerySyntaxError(msg)
+
+# ---------------------------------------------------------------------------
+#                               Parsing
+# ---------------------------------------------------------------------------
+_TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<lp>\() | (?P<rp>\)) |
+        (?P<term>-?(?:[A-Za-z_]+:)?(?:"(?:[^"\\]|\\.)*"|[^\s()"]+))
+    )''', re.VERBOSE)
+_FIELD_RE = re.compile(r'^([A-Za-z_]+):(.*)$', re.DOTALL)
+
+def _tokenize(q: str) -> list[str]:
+    tokens = []
+    pos = 0
+    q = q.rstrip()
+    while pos < len(q):
+        m = _TOKEN_RE.match(q, pos)
+        if m is None or m.end() == pos:
+            raise _syntax_error("Unexpected character at position {}: {}".format(pos, q[pos:pos+10]))
+        tokens.append(m.group("lp") or m.group("rp") or m.group("term"))
+        pos = m.end()
+    return tokens
+
+def _unquote(s: str) -> str:
+    if len(s) >= 2 and s[0] == '"' and s[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', s[1:-1])
+    return s
+
+def _parse_year(value: str) -> tuple[Optional[int], Optional[int]]:
+    try:
+        for op in (">=", "<=", ">", "<"):
+            if value.startswith(op):
+                y = int(value[len(op):])
+                return {">=": (y, None), "<=": (None, y+1), ">": (y+1, None), "<": (None, y)}[op]
+        if ".." in value:
+            start, end = value.split("..", 1)
+            return (int(start) if start else None, int(end)+1 if end else None)
+        y = int(value)
+        return (y, y+1)
+    except ValueError:
+        raise _syntax_error("Invalid year: {}".format(value))
+
+def _parse_term(token: str) -> QueryNode:
+    negate = token.startswith("-") and len(token) > 1
+    if negate:
+        token = token[1:]
+    field, value = "", token
+    if (m := _FIELD_RE.match(token)) is not None:
+        _field = _FIELD_ALIAS.get(m.group(1).lower(), m.group(1).lower())
+        if _field in QUERY_FIELDS:
+            field, value = _field, m.group(2)
+    value = _unquote(value)
+    if field and not value:
+        raise _syntax_error("Empty value for field {}".format(field))
+
+    if field == "year":
+        term = QTerm("year", range=_parse_year(value))
+    elif field == "tag" and value.endswith(TAG_SEP + "*"):
+        term = QTerm("tag", value[:-len(TAG_SEP + "*")], subtree=True)
+    elif field == "has" and value.lower() not in _HAS_CONDITION:
+        raise _syntax_error("Invalid value for has: {}, should be one of {}".format(value, list(_HAS_CONDITION)))
+    else:
+        term = QTerm(field, value.lower() if field == "has" else value)
+    return QNot(term) if negate else term
+
+def parse_query(q: str) -> QueryNode:
+    """ Parse a query string, raise LiresQuerySyntaxError if the query is invalid """
+    tokens = _tokenize(q)
+    pos = 0
+
+    def peek() -> Optional[str]:
+        return tokens[pos] if pos < len(tokens) else None
+
+    def parse_or() -> QueryNode:
+        nonlocal pos
+        children = [parse_and()]
+        while peek() == "OR":
+            pos += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else QOr(tuple(children))
+
+    def parse_and() -> QueryNode:
+        nonlocal pos
+        children = []
+        while (tok := peek()) is not None and tok not in (")", "OR"):
+            if tok == "AND":
+                pos += 1
+                continue
+            children.append(parse_not())
+        if not children:
+            raise _syntax_error("Empty expression")
+        return children[0] if len(children) == 1 else QAnd(tuple(children))
+
+    def parse_not() -> QueryNode:
+        nonlocal pos
+        tok = peek()
+        if tok == "NOT":
+            pos += 1
+            return QNot(parse_not())
+        if tok == "(":
+            pos += 1
+            node = parse_or()
+            if peek() != ")":
+                raise _syntax_error("Missing closing parenthesis")
+            pos += 1
+            return node
+        if tok is None or tok in (")", "AND", "OR"):
+            raise _syntax_error("Unexpected {}".format(tok or "end of query"))
+        pos += 1
+        return _parse_term(tok)
+
+    if not tokens:
+        return QAnd(())
+    node = parse_or()
+    if pos != len(tokens):
+        raise _syntax_error("Unexpected {}".format(tokens[pos]))
+    return node
+
+# ---------------------------------------------------------------------------
+#                               Compiling
+# ---------------------------------------------------------------------------
+def _escape_like(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _fts_phrase(column: Optional[str], value: str) -> str:
+    phrase = '"{}"'.format(value.replace('"', '""'))
+    return phrase if column is None else "{} : {}".format(column, phrase)
+
+def _compile_text(term: QTerm, params: list, rank_phrases: Optional[list[str]], fts: bool) -> str:
+    column = _FTS_COLUMN.get(term.field)     # None for any column
+    if fts and len(term.value) >= FTS_MIN_QUERY_LEN:
+        phrase = _fts_phrase(column, term.value)
+        params.append(phrase)
+        if rank_phrases is not None:
+            rank_phrases.append(phrase)
+        return "files.fts_rowid IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)"
+    # short strings (or without the full-text search table) fall back to LIKE
+    columns = [column] if column is not None else ["title", "abstract", "publication", "comments"]
+    params.extend(["%{}%".format(_escape_like(term.value))] * len(columns))
+    return "(" + " OR ".join("files.{} LIKE ? ESCAPE '\\'".format(c) for c in columns) + ")"
+
+def _compile_term(term: QTerm, params: list, rank_phrases: Optional[list[str]], fts: bool) -> str:
+    if term.field in ("", "title", "publication", "note"):
+        return _compile_text(term, params, rank_phrases, fts)
+    if term.field == "author":
+        params.append("%{}%".format(_escape_like(format_author_name(term.value))))
+        return "files.uuid IN (SELECT uuid FROM entry_authors WHERE author LIKE ? ESCAPE '\\')"
+    if term.field == "tag":
+        if not term.subtree:
+            params.append(term.value)
+            return "files.uuid IN (SELECT uuid FROM entry_tags WHERE tag = ?)"
+        # the sub-tags are in the range [prefix, prefix with the last character incremented),
+        # a range is used instead of LIKE, which is case-insensitive
+        prefix = term.value + TAG_SEP
+        params.extend([term.value, prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        return "files.uuid IN (SELECT uuid FROM entry_tags WHERE tag = ? OR (tag >= ? AND tag < ?))"
+    if term.field == "year":
+        conds = []
+        if term.range[0] is not None:
+            conds.append("files.year >= ?")
+            params.append(term.range[0])
+        if term.range[1] is not None:
+            conds.append("files.year < ?")
+            params.append(term.range[1])
+        return "(" + " AND ".join(conds) + ")" if conds else "1"
+    if term.field == "type":
+        params.append(term.value)
+        return "files.type = ? COLLATE NOCASE"
+    if term.field == "uuid":
+        params.append("{}%".format(_escape_like(term.value)))
+        return "files.uuid LIKE ? ESCAPE '\\'"
+    if term.field == "has":
+        return _HAS_CONDITION[term.value]
+    raise _syntax_error("Unknown field {}".format(term.field))
+
+def compile_query(node: QueryNode, fts: bool = True) -> tuple[str, list, list[str]]:
+    """
+    Compile the query to a SQL condition on the files table,
+    return the condition, its parameters,
+    and the full-text search phrases not under NOT (for ranking the results), 
+    the text terms are matched with LIKE if fts is False (no full-text search table)
+    """
+    params: list = []
+    rank_phrases: list[str] = []
+
+    def _compile(node: QueryNode, negated: bool) -> str:
+        if isinstance(node, QTerm):
+            return _compile_term(node, params, None if negated else rank_phrases, fts)
+        if isinstance(node, QNot):
+            return "NOT ({})".format(_compile(node.child, not negated))
+        if isinstance(node, (QAnd, QOr)):
+            if not node.children:
+                return "1" if isinstance(node, QAnd) else "0"
+            sep = " AND " if isinstance(node, QAnd) else " OR "
+            return "(" + sep.join(_compile(c, negated) for c in node.children) + ")"
+        raise TypeError("Unknown query node: {}".format(node))
+
+    return _compile(node, False), params, rank_phrases
+
+__all__ = [
+    "QTerm", "QAnd", "QOr", "QNot", "QueryNode", "QUERY_FIELDS",
+    "parse_query", "compile_query",
+]
@@ -15,6 +15,7 @@ class LiresError:
     class LiresDocTypeNotSupportedError(LiresToBeImplementedError):...
 
     class LiresProhibitedKeywordError(LiresErrorBase):...
+    class LiresQuerySyntaxError(LiresErrorBase, ValueError):...
 
     class LiresConnectionError(LiresErrorBase):...
     class LiresConnectionAuthError(LiresConnectionError):...    # 401 or 403
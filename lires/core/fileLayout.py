@@ -0,0 +1,107 @@
+"""
+Layout of the documents and the miscellaneous directories in the files directory of a database,
+the entries are fanned out by the leading characters of the uuid,
+so that a directory holds a bounded number of entries:
+    files
+    ├── ab
+    │   └── cd
+    │       ├── abcd1234-...pdf     (document)
+    │       └── abcd1234-...        (misc directory)
+    ├── abcd5678-...pdf             (flat layout, before 1.9.0)
+    └── ...
+
+The entries are looked up in the sharded layout first, then in the flat layout,
+new entries are always created in the sharded layout,
+so that an existing database can be migrated online, entry by entry, see migrate_layout.
+"""
+from __future__ import annotations
+import os, uuid as _uuid
+from typing import TypedDict, Iterator
+
+# number of characters of the uuid used for each level of the fan-out
+SHARD_WIDTH = 2
+SHARD_DEPTH = 2
+
+class MigrateStatsT(TypedDict):
+    n_moved: int            # number of documents and misc directories moved to the sharded layout
+    n_skipped: int          # number of entries not moved, e.g. the sharded path is already occupied
+
+def shard_dir(file_dir: str, uuid: str) -> str:
+    """ the directory of the entry in the sharded layout """
+    parts = [uuid[i*SHARD_WIDTH:(i+1)*SHARD_WIDTH] for i in range(SHARD_DEPTH)]
+    return os.path.join(file_dir, *parts)
+
+def entry_path(file_dir: str, uuid: str, suffix: str = "") -> str:
+    """
+    Path of the entry's document (suffix is the file extension) or misc directory (empty suffix),
+    the flat layout path is returned only if the entry is not yet migrated,
+    otherwise the sharded path, which may not exist
+    """
+    name = uuid + suffix
+    sharded = os.path.join(shard_dir(file_dir, uuid), name)
+    if os.path.lexists(sharded):
+        return sharded
+    flat = os.path.join(file_dir, name)
+    if os.path.lexists(flat):
+        return flat
+    # may be moved by a concurrent migration between the two checks
+    return sharded
+
+def new_entry_path(file_dir: str, uuid: str, suffix: str = "") -> str:
+    """ Path to create the entry in the sharded layout, the parent directory is created """
+    d = shard_dir(file_dir, uuid)
+    os.makedirs(d, exist_ok=True)
+    return os.path.join(d, uuid + suffix)
+
+def _is_entry_name(name: str, document: bool = False) -> bool:
+    """ <uuid> (misc directory) or <uuid><ext> (document) """
+    stem, ext = name[:36], name[36:]
+    if ext and (not ext.startswith(".") or "." in ext[1:]):
+        return False
+    if document and not ext:
+        return False
+    try:
+        _uuid.UUID(stem)
+    except ValueError:
+        return False
+    return True
+
+def iter_documents(file_dir: str) -> Iterator[str]:
+    """ Paths of the documents in both layouts, the misc files are not included """
+    if not os.path.isdir(file_dir):
+        return
+    for name in os.listdir(file_dir):
+        path = os.path.join(file_dir, name)
+        if _is_entry_name(name, document=True) and os.path.isfile(path):
+            yield path
+        elif len(name) == SHARD_WIDTH and os.path.isdir(path):
+            dirs = [path]
+            for _ in range(SHARD_DEPTH - 1):
+                dirs = [os.path.join(d, n) for d in dirs for n in os.listdir(d) if len(n) == SHARD_WIDTH]
+            for d in dirs:
+                for fname in os.listdir(d):
+                    if _is_entry_name(fname, document=True) and os.path.isfile(os.path.join(d, fname)):
+                        yield os.path.join(d, fname)
+
+def migrate_layout(file_dir: str) -> MigrateStatsT:
+    """
+    Move the entries in the flat layout to the sharded layout,
+    each entry is moved with an atomic rename, can be run while the database is in use
+    """
+    stats: MigrateStatsT = {"n_moved": 0, "n_skipped": 0}
+    if not os.path.isdir(file_dir):
+        return stats
+    for name in os.listdir(file_dir):
+        if not _is_entry_name(name):
+            continue
+        src = os.path.join(file_dir, name)
+        dst = os.path.join(shard_dir(file_dir, name), name)
+        if os.path.lexists(dst):
+            stats["n_skipped"] += 1
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.rename(src, dst)
+        stats["n_moved"] += 1
+    return stats
+
+__all__ = ["MigrateStatsT", "shard_dir", "entry_path", "new_entry_path", "iter_documents", "migrate_layout"]
@@ -2,13 +2,16 @@
 The tools that deals with files in the database
 """
 from __future__ import annotations
-import os, shutil
+import os, shutil, asyncio
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, TypedDict, Optional, TYPE_CHECKING, Any
 import aiofiles
 
 from .base import G, LiresBase
-from .dbConn import DBConnection, DocInfo
-from .bibReader import BibParser, parse_bibtex
+from .dbConn import DBConnection, DBEntryT, DocInfo, make_dedupe_key
+from .fileLayout import entry_path, new_entry_path
+from .bibReader import BibParser, ParsedRef, parse_bibtex, parse_bibtex_sync
 from ..config import ACCEPTED_EXTENSIONS
 
 if TYPE_CHECKING:
@@ -32,14 +35,25 @@ async def _add_document_blob(db_conn: DBConnection, uid: str, file_blob: bytes,
     """
     assert ext.startswith(".")
     dst_dir = os.path.join(db_conn.db_dir, "files")
-    if not os.path.exists(dst_dir):
-        os.mkdir(dst_dir)
-    dst = os.path.join(dst_dir, uid + ext)
-    # with open(dst, "wb") as f:
-    #     f.write(file_blob)
-    async with aiofiles.open(dst, "wb") as f:
-        await f.write(file_blob)
-    await db_conn.set_doc_ext(uid, ext)
+    dst = new_entry_path(dst_dir, uid, ext)
+    if (old_dst := entry_path(dst_dir, uid, ext)) != dst:
+        # the document in the flat layout is replaced
+        if db_conn.blob_store is not None:
+            await asyncio.to_thread(db_conn.blob_store.release, old_dst)
+        else:
+            os.remove(old_dst)
+    if db_conn.blob_store is not None:
+        # the replaced document (if any) is released by the store
+        await asyncio.to_thread(db_conn.blob_store.put, file_blob, dst)
+    else:
+        if os.path.exists(dst):
+            # may be a link to a shared blob, should not be written in place
+            os.remove(dst)
+        # with open(dst, "wb") as f:
+        #     f.write(file_blob)
+        async with aiofiles.open(dst, "wb") as f:
+            await f.write(file_blob)
+    await db_conn.set_doc_ext(uid, ext, len(file_blob))
 
 async def _add_document_file(db_conn: DBConnection, uid: str, src: str):
     """
@@ -98,19 +112,10 @@ async def add_document(
     uniform_bib = await parse_bibtex(citation)
 
     if check_duplicate:
-        # check if duplicate
-        def getSearchStr(bib: dict[str, Any]) -> str:
-            return f"title:{bib['title'].lower()} AND year:{bib['year']}"
-        search_str = getSearchStr(bib)
-        # traverse all entries in the database and check if there is duplicate
-        for _uid in await db_conn.keys():
-            d_file_info = await db_conn.get(_uid)
-            assert d_file_info is not None  # type checking purpose
-            aim_bib = (await parser(d_file_info["bibtex"]))[0]
-            aim_search_str = getSearchStr(aim_bib)
-            if search_str == aim_search_str:
-                await G.loggers.core.warning(f"Duplicate entry found: {_uid}")
-                return None
+        # check if duplicate, by the normalized title and year
+        if (duplicates := await db_conn.find_duplicates(uniform_bib["title"], uniform_bib["year"])):
+            await G.loggers.core.warning(f"Duplicate entry found: {duplicates[0]}")
+            return None
 
     uid = await db_conn.add_entry(
         bibtex=citation,
@@ -135,20 +140,175 @@ async def add_document(
     return uid
     
 
+# batches smaller than this are parsed in the current process, 
+# as dispatching to the worker processes costs more than parsing
+BULK_PARSE_MIN_PARALLEL = 64
+BULK_PARSE_MAX_WORKERS = min(os.cpu_count() or 1, 8)
+
+# the process pool for parsing the citations, shared by the imports, created on first use
+_parse_executor: Optional[ProcessPoolExecutor] = None
+def _get_parse_executor() -> ProcessPoolExecutor:
+    global _parse_executor
+    if _parse_executor is None:
+        # use spawn to avoid forking the event loop and database threads
+        _parse_executor = ProcessPoolExecutor(max_workers=BULK_PARSE_MAX_WORKERS, mp_context=mp.get_context("spawn"))
+    return _parse_executor
+
+class BulkImportResultT(TypedDict):
+    uuid: Optional[str]     # uuid of the new entry, None if failed
+    error: Optional[str]    # reason of the failure, None if success
+
+def _prepare_citation(citation: str, remove_abstract: bool) -> tuple[str, str, Optional[ParsedRef], list[str]]:
+    """
+    Synchronous parsing for add_documents, run in a worker process.
+    return (citation, abstract, parsed bibtex, messages), 
+    the parsed bibtex is None if failed and the messages contain the error, 
+    otherwise the messages are warnings
+    """
+    import pybtex.scanner
+    try:
+        bib = BibParser(mode = "single").parse(citation)[0][0]
+        abstract = bib["abstract"][0] if "abstract" in bib else ""
+        if remove_abstract:
+            citation = BibParser.remove_abstract(citation)
+        else:
+            citation = BibParser.format(citation)
+        uniform_bib, warning_msgs = parse_bibtex_sync(citation)
+    except IndexError as e:
+        return citation, "", None, [f"IndexError while parsing bibtex, check if your bibtex info is empty: {e}"]
+    except pybtex.scanner.PrematureEOF:
+        return citation, "", None, ["PrematureEOF while parsing bibtex, invalid bibtex"]
+    except KeyError:
+        return citation, "", None, ["KeyError. (Author year and title must be provided)"]
+    except Exception as e:
+        return citation, "", None, ["Error when parsing bib string: {}".format(e)]
+    return citation, abstract, uniform_bib, warning_msgs
+
+async def add_documents(
+        db_conn: DBConnection, 
+        citations: list[str],
+        doc_srcs: Optional[list[Optional[str]]] = None,
+        tags: list[str] = [],
+        check_duplicate: bool = True, 
+        remove_abstract: bool = True, 
+        ) -> list[BulkImportResultT]:
+    """
+    Bulk version of add_document, for importing many entries at once (e.g. from a .bib export)
+
+    - citations: bibtex strings, one entry each
+    - doc_srcs: document source paths, should be the same length as citations if provided, 
+        None for entries without document
+    - tags: tags applied to all the new entries
+
+    Large batches are parsed in a process pool (shared by the calls, started on the first large batch), 
+    and all entries are inserted in a single transaction.
+    The workers are spawned, so a script calling this should guard its entry point with 
+    `if __name__ == "__main__":`, otherwise the script is re-executed in the workers.
+    return a result for each citation, in the same order
+    """
+    if doc_srcs is None:
+        doc_srcs = [None] * len(citations)
+    assert len(doc_srcs) == len(citations), "doc_srcs should have the same length as citations"
+    results: list[BulkImportResultT] = [{"uuid": None, "error": None} for _ in citations]
+    if not citations:
+        return results
+
+    if len(citations) < BULK_PARSE_MIN_PARALLEL:
+        prepared = [_prepare_citation(c, remove_abstract) for c in citations]
+    else:
+        executor = _get_parse_executor()
+        prepared = await asyncio.get_event_loop().run_in_executor(
+            None, lambda: list(executor.map(
+                _prepare_citation, citations, [remove_abstract]*len(citations), 
+                chunksize=max(1, len(citations)//(BULK_PARSE_MAX_WORKERS*4))
+                ))
+        )
+
+    # collect the valid entries
+    dedupe_keys: list[Optional[str]] = [None] * len(citations)
+    for i, (_, _, uniform_bib, msgs) in enumerate(prepared):
+        if uniform_bib is None:
+            results[i]["error"] = msgs[0]
+            continue
+        for msg in msgs:
+            await G.loggers.core.warning(msg)
+        if doc_srcs[i] is not None:
+            try:
+                if _get_file_extension(doc_srcs[i]) not in ACCEPTED_EXTENSIONS:    # type: ignore
+                    results[i]["error"] = "The file extension is not supported"
+                    continue
+            except ValueError as e:
+                results[i]["error"] = str(e)
+                continue
+        dedupe_keys[i] = make_dedupe_key(uniform_bib["title"], uniform_bib["year"])
+
+    if check_duplicate:
+        # check duplicates against the database and within the batch
+        existing = await db_conn.find_duplicates_many([k for k in dedupe_keys if k is not None])
+        batch_seen: dict[str, int] = {}
+        for i, key in enumerate(dedupe_keys):
+            if key is None: continue
+            if key in existing:
+                results[i]["error"] = f"Duplicate entry found: {existing[key]}"
+            elif key in batch_seen:
+                results[i]["error"] = f"Duplicate entry found in the batch: #{batch_seen[key]}"
+            else:
+                batch_seen[key] = i
+                continue
+            dedupe_keys[i] = None
+
+    to_add = [i for i, key in enumerate(dedupe_keys) if key is not None]
+    entries: list[DBEntryT] = []
+    for i in to_add:
+        citation, abstract, uniform_bib, _ = prepared[i]
+        assert uniform_bib is not None
+        entries.append({
+            "bibtex": citation,
+            "dtype": uniform_bib["type"],
+            "title": uniform_bib["title"],
+            "year": uniform_bib["year"],
+            "authors": uniform_bib["authors"],
+            "publication": uniform_bib["publication"] if uniform_bib["publication"] else "",
+            "tags": tags,
+            "abstract": abstract,
+        })
+    uids = await db_conn.add_entries(entries)
+
+    # add documents, in the same way as add_document (layout, blob store and disk usage)
+    for i, uid in zip(to_add, uids):
+        if uid is None:
+            results[i]["error"] = "Failed to insert entry"
+            continue
+        results[i]["uuid"] = uid
+        if (src := doc_srcs[i]) is not None:
+            try:
+                await _add_document_file(db_conn, uid, src)
+            except OSError as e:
+                await G.loggers.core.error(f"Failed to copy document {src} for {uid}: {e}")
+                results[i]["error"] = f"Entry added, but failed to copy document: {e}"
+
+    n_success = sum(1 for r in results if r["uuid"] is not None)
+    await G.loggers.core.info(f"Bulk import: {n_success} of {len(citations)} entries added")
+    return results
+
 class FileManipulator(LiresBase):
     logger = LiresBase.loggers().core
 
     @staticmethod
-    async def get_database_connection(db_dir: str) -> DBConnection:
-        return await DBConnection(db_dir).init()
+    async def get_database_connection(db_dir: str, **kwargs) -> DBConnection:
+        return await DBConnection(db_dir, **kwargs).init()
 
     def __init__(self, uid: str):
         self._uid = uid
 
     async def init(self, db_local: DBConnection) -> FileManipulator:
-        self._conn = db_local
         if not await db_local.is_initialized():
             await db_local.init()
+        return self.bind(db_local)
+    
+    def bind(self, db_local: DBConnection) -> FileManipulator:
+        """ Synchronous version of init, the connection should be initialized """
+        self._conn = db_local
         if not os.path.exists(self.file_dir):
             os.mkdir(self.file_dir)
         return self
@@ -167,7 +327,7 @@ class FileManipulator(LiresBase):
     
     async def file_extension(self) -> str:
         """Document file extension, empty string if not exists"""
-        d_info = await self.conn.get(self.uuid)
+        d_info = await self.conn.get(self.uuid, fields=["doc_ext"])
         assert d_info is not None, "uuid {} not exists".format(self.uuid)
         return d_info["doc_ext"]
     
@@ -176,7 +336,7 @@ class FileManipulator(LiresBase):
         file_ext = await self.file_extension()
         if file_ext == "":
             return None
-        file_path = os.path.join(self.file_dir, self.uuid + file_ext)
+        file_path = entry_path(self.file_dir, self.uuid, file_ext)
         if not os.path.exists(file_path):
             await self.conn.set_doc_ext(self.uuid, "")
             await self.logger.warning(
@@ -204,7 +364,8 @@ class FileManipulator(LiresBase):
             selected_files.append(self.get_misc_dir())
         for f in selected_files:
             assert (os.path.exists(f) and self.file_dir in f), "File {} not in db_dir {}".format(f, self.file_dir)
-        selected_fname = [os.path.basename(f) for f in selected_files]
+        # relative to the files directory, the entries may be in the sharded layout
+        selected_fname = [os.path.relpath(f, self.file_dir) for f in selected_files]
         return {
             "root": self.file_dir,
             "fname": selected_fname,
@@ -213,10 +374,10 @@ class FileManipulator(LiresBase):
     # miscelaneous files directory
     @property
     def _misc_dir(self):
-        return os.path.join(self.file_dir, self.uuid)
+        return entry_path(self.file_dir, self.uuid)
     def get_misc_dir(self, create = False):
         if create and not os.path.exists(self._misc_dir):
-            os.mkdir(self._misc_dir)
+            os.mkdir(new_entry_path(self.file_dir, self.uuid))
         return self._misc_dir
     def has_misc(self) -> bool:
         if not os.path.exists(self._misc_dir):
@@ -228,6 +389,12 @@ class FileManipulator(LiresBase):
     def list_misc_files(self) -> List[str]:
         if not self.has_misc(): return []
         return os.listdir(self.get_misc_dir())
+    def misc_size(self) -> int:
+        """ total size of the misc files in bytes """
+        size = 0
+        for root, _, fnames in os.walk(self._misc_dir):
+            size += sum(os.path.getsize(os.path.join(root, f)) for f in fnames)
+        return size
     
     async def add_file(self, extern_file_p) -> bool:
         """
@@ -274,7 +441,7 @@ class FileManipulator(LiresBase):
         return os.path.getsize(_f_path)
 
     async def get_bibtex(self) -> str:
-        db_data = await self.conn.get(self.uuid); assert db_data
+        db_data = await self.conn.get(self.uuid, fields=["bibtex"]); assert db_data
         return db_data["bibtex"]
 
     async def set_bibtex(self, bib: str, format = False):
@@ -292,7 +459,7 @@ class FileManipulator(LiresBase):
             )
     
     async def get_abstract(self) -> str:
-        db_data = await self.conn.get(self.uuid); assert db_data
+        db_data = await self.conn.get(self.uuid, fields=["abstract"]); assert db_data
         return db_data["abstract"]
     
     async def set_abstract(self, abstract: str):
@@ -300,7 +467,7 @@ class FileManipulator(LiresBase):
         return await self.conn.update_abstract(self.uuid, abstract)
     
     async def get_comments(self) -> str:
-        db_data = await self.conn.get(self.uuid); assert db_data
+        db_data = await self.conn.get(self.uuid, fields=["comments"]); assert db_data
         return db_data["comments"]
     
     async def set_comments(self, comments: str):
@@ -308,7 +475,7 @@ class FileManipulator(LiresBase):
         await self.conn.update_comments(self.uuid, comments)
     
     async def get_tags(self) -> list[str]:
-        assert (data:=await self.conn.get(self.uuid)) is not None
+        assert (data:=await self.conn.get(self.uuid, fields=["tags"])) is not None
         return data["tags"]
     
     async def set_tags(self, tags: list[str] | DataTags):
@@ -318,7 +485,7 @@ class FileManipulator(LiresBase):
         await self.conn.update_tags(self.uuid, tags)
     
     async def get_weburl(self) -> str:
-        assert (data:=await self.conn.get(self.uuid)) is not None
+        assert (data:=await self.conn.get(self.uuid, fields=["url"])) is not None
         return data["url"]
     
     async def set_weburl(self, url: str):
@@ -326,11 +493,11 @@ class FileManipulator(LiresBase):
         await self.conn.update_url(self.uuid, url)
     
     async def get_time_added(self) -> float:
-        assert (data:=await self.conn.get(self.uuid)) is not None
+        assert (data:=await self.conn.get(self.uuid, fields=["time_import"])) is not None
         return data["time_import"]
     
     async def get_time_modified(self) -> float:
-        assert (data:=await self.conn.get(self.uuid)) is not None
+        assert (data:=await self.conn.get(self.uuid, fields=["time_modify"])) is not None
         return data["time_modify"]
     
     async def delete_entry(self, create_backup = True) -> bool:
@@ -344,7 +511,13 @@ class FileManipulator(LiresBase):
                 os.mkdir(_backup_dir)
             old_entry = await self.conn.get(self.uuid)
             assert old_entry
-            async with (await DBConnection(_backup_dir).init()) as trash_db:
+            trash_db = DBConnection(_backup_dir)
+            # the trash database is in the database directory, its size is counted in the files usage
+            trash_db_files = [trash_db.db_path + suffix for suffix in ("", "-wal", "-shm", "-journal")]
+            def _trash_db_size() -> int:
+                return sum(os.path.getsize(p) for p in trash_db_files if os.path.exists(p))
+            trash_db_size = _trash_db_size()
+            async with (await trash_db.init()):
                 _success = await trash_db.add_entry(
                     bibtex=old_entry["bibtex"],
                     dtype=old_entry["type"],
@@ -361,21 +534,30 @@ class FileManipulator(LiresBase):
                 if _success:    # otherwise, maybe duplicate entry
                     if await self.has_file():
                         await _add_document_file(trash_db, self.uuid, await self.filePath())  # type: ignore
+                        await self.conn.add_files_usage(await self.doc_size())
                     if self.has_misc():
                         shutil.copytree(self._misc_dir, os.path.join(_backup_dir, self.uuid))
+                        await self.conn.add_files_usage(self.misc_size())
+            await self.conn.add_files_usage(_trash_db_size() - trash_db_size)
             await self.logger.debug("(fm) deleteEntry: {} (backup created)".format(self.uuid))
         
         if await self.has_file():
             await self.delete_document()
         if os.path.exists(self._misc_dir):
+            misc_size = self.misc_size()
             shutil.rmtree(self._misc_dir)
+            await self.conn.add_files_usage(-misc_size)
         return await self.conn.remove_entry(self.uuid)
     
     async def delete_document(self) -> bool:
         if not await self.has_file():
             return False
         file_p = await self.filePath(); assert file_p is not None
-        os.remove(file_p)
+        if self.conn.blob_store is not None:
+            # the blob is removed if not linked by other documents
+            await asyncio.to_thread(self.conn.blob_store.release, file_p)
+        else:
+            os.remove(file_p)
         await self.conn.set_doc_ext(self.uuid, "")
         await self.logger.debug("(fm) deleteDocument: {}".format(self.uuid))
         return True
@@ -0,0 +1,102 @@
+"""
+A trie over the segments of the hierarchical tags (e.g. a->b->c),
+each node keeps the entries tagged with the node's tag or any of its sub-tags,
+so that the entries of a tag subtree are resolved without scanning the tags.
+"""
+from __future__ import annotations
+from typing import Optional, Iterator, KeysView
+from .dbQuery import TAG_SEP
+
+class TagNode:
+    __slots__ = ("children", "uuids", "subtree")
+    def __init__(self):
+        self.children: dict[str, TagNode] = {}
+        self.uuids: set[str] = set()            # entries with exactly this tag
+        # entries with this tag or a sub-tag -> number of such tags of the entry
+        self.subtree: dict[str, int] = {}
+
+class TagTree:
+    """
+    The tags are split by TAG_SEP into segments, the empty tag is the root,
+    should be updated incrementally with add / remove on every change of the tags
+    """
+    def __init__(self):
+        self.root = TagNode()
+
+    def clear(self):
+        self.root = TagNode()
+
+    def _path(self, tag: str) -> list[str]:
+        return tag.split(TAG_SEP)
+
+    def _node(self, tag: str) -> Optional[TagNode]:
+        node = self.root
+        for seg in self._path(tag):
+            if (node := node.children.get(seg)) is None:
+                return None
+        return node
+
+    def add(self, tag: str, uuid: str):
+        node = self.root
+        path = [node]
+        for seg in self._path(tag):
+            if (child := node.children.get(seg)) is None:
+                child = node.children[seg] = TagNode()
+            node = child
+            path.append(node)
+        if uuid in node.uuids:
+            return
+        node.uuids.add(uuid)
+        for n in path:
+            n.subtree[uuid] = n.subtree.get(uuid, 0) + 1
+
+    def remove(self, tag: str, uuid: str) -> bool:
+        """ return False if the uuid is not under the tag """
+        path: list[tuple[str, TagNode]] = [("", self.root)]
+        node = self.root
+        for seg in self._path(tag):
+            if (node := node.children.get(seg)) is None:
+                return False
+            path.append((seg, node))
+        if uuid not in node.uuids:
+            return False
+        node.uuids.remove(uuid)
+        for _, n in path:
+            if (count := n.subtree[uuid]) == 1:
+                del n.subtree[uuid]
+            else:
+                n.subtree[uuid] = count - 1
+        # prune the empty branch
+        for i in range(len(path) - 1, 0, -1):
+            seg, n = path[i]
+            if n.subtree:
+                break
+            del path[i-1][1].children[seg]
+        return True
+
+    def has(self, tag: str) -> bool:
+        return (node := self._node(tag)) is not None and bool(node.uuids)
+
+    def subtree_uuids(self, tag: str) -> KeysView[str]:
+        """ the entries with the tag or any of its sub-tags """
+        if (node := self._node(tag)) is None:
+            return {}.keys()
+        return node.subtree.keys()
+
+    def subtree_tags(self, tag: str) -> list[str]:
+        """ the tag (if used) and its sub-tags that are used by any entry """
+        if (node := self._node(tag)) is None:
+            return []
+        return list(self._iter_tags(node, tag))
+
+    def _iter_tags(self, node: TagNode, tag: str) -> Iterator[str]:
+        if node.uuids:
+            yield tag
+        for seg, child in node.children.items():
+            yield from self._iter_tags(child, tag + TAG_SEP + seg if tag else seg)
+
+    def tags(self) -> list[str]:
+        """ all tags used by any entry """
+        return [t for seg, child in self.root.children.items() for t in self._iter_tags(child, seg)]
+
+__all__ = ["TagTree"]
@@ -5,7 +5,10 @@ Utilities to load the database and other resources
 import os, shutil
 from .core.base import LiresBase
 from .core.dataClass import DataBase
-from .config import DATABASE_HOME, USER_DIR
+from .core.backup import BackupStatsT
+from .core.blobStore import BlobStore, DedupeStatsT, BLOB_STORE_DIRNAME
+from .core.fileLayout import MigrateStatsT, iter_documents, migrate_layout
+from .config import DATABASE_HOME, USER_DIR, BACKUP_HOME, ACCEPTED_EXTENSIONS, get_conf
 from .user import UserPool, LiresUser
 
 import asyncio
@@ -17,6 +20,9 @@ class DatabasePool(LiresBase):
 
         self.__db_ins_cache: dict[int, DataBase] = {}
         self.__getting_db_lock = asyncio.Lock()
+        # the content-addressed document store shared by the databases, see db_blob_store of the configuration
+        self.blob_store = BlobStore(os.path.join(self._home, BLOB_STORE_DIRNAME)) \
+            if get_conf()['db_blob_store'] else None
     
     async def get(self, user: LiresUser|int) -> DataBase:
         if not isinstance(user, int):
@@ -26,12 +32,22 @@ class DatabasePool(LiresBase):
 
         async with self.__getting_db_lock:
             if not user_id in self.__db_ins_cache:
-                database_dir = os.path.join(self._home, str(user_id))
-                db = await DataBase().init(database_dir)
-                self.__db_ins_cache[user_id] = db
+                self.__db_ins_cache[user_id] = await self.__open(user_id)
 
         return self.__db_ins_cache[user_id]
     
+    async def __open(self, user_id: int) -> DataBase:
+        database_dir = os.path.join(self._home, str(user_id))
+        conf = get_conf()
+        return await DataBase().init(
+            database_dir, 
+            n_readers = conf['db_reader_pool_size'],
+            durability = conf['db_durability'],
+            group_commit_ms = conf['db_group_commit_ms'],
+            blob_store = self.blob_store,
+            cache_size = conf['db_datapoint_cache_size'],
+            )
+    
     def __iter__(self):
         return iter(self.__db_ins_cache.values())
     
@@ -41,6 +57,38 @@ class DatabasePool(LiresBase):
     async def close(self):
         await asyncio.gather(*[db_ins.close() for db_ins in self.__db_ins_cache.values()])
     
+    async def optimize(self):
+        """ Update the query planner statistics of the databases """
+        await asyncio.gather(*[db_ins.conn.optimize() for db_ins in self.__db_ins_cache.values()])
+    
+    async def reconcile_disk_usage(self):
+        """ Correct the disk usage counters of the databases with the file system """
+        for db_ins in list(self.__db_ins_cache.values()):
+            await db_ins.reconcile_disk_usage()
+    
+    async def compact_journal(self):
+        """ Remove the old entries of the change journals of the databases """
+        await asyncio.gather(*[db_ins.conn.compact_journal() for db_ins in self.__db_ins_cache.values()])
+    
+    async def backup(self, users: list[LiresUser], backup_home: str = BACKUP_HOME) -> dict[int, BackupStatsT]:
+        """
+        Online backup of the databases of the users, to backup_home/<user id>, 
+        one database at a time, the repeated backups only copy the changed files, 
+        the databases not loaded are opened for the backup only, and closed afterwards
+        """
+        ret = {}
+        for user in users:
+            backup_dir = os.path.join(backup_home, str(user.id))
+            if (db := self.__db_ins_cache.get(user.id)) is not None:
+                ret[user.id] = await db.backup(backup_dir)
+                continue
+            db = await self.__open(user.id)
+            try:
+                ret[user.id] = await db.backup(backup_dir)
+            finally:
+                await db.close()
+        return ret
+    
     async def preload(self, user_pool: UserPool):
         """ Load all databases to cache"""
         users = await user_pool.all()
@@ -61,6 +109,48 @@ class DatabasePool(LiresBase):
         await db.close()
         del self.__db_ins_cache[user_id]
         shutil.rmtree(path_to_delete)
+        if self.blob_store is not None:
+            await asyncio.to_thread(self.blob_store.gc)
+    
+    async def dedupe_documents(self) -> DedupeStatsT:
+        """
+        Move the documents of all databases (loaded or not) into the blob store, 
+        the identical documents are replaced by links to a single copy
+        """
+        blob_store = self.blob_store
+        assert blob_store is not None, "Blob store is not enabled, see db_blob_store of the configuration"
+        def _dedupe(file_dir: str) -> DedupeStatsT:
+            return blob_store.dedupe(
+                p for p in iter_documents(file_dir) if os.path.splitext(p)[1].lower() in ACCEPTED_EXTENSIONS
+                )
+        stats: DedupeStatsT = {"n_files": 0, "n_linked": 0, "bytes_saved": 0}
+        for dname in self.__database_dirs():
+            _stats = await asyncio.to_thread(_dedupe, os.path.join(self._home, dname, "files"))
+            await self.logger.info("Deduplicated documents of database {}: {} of {} linked, {:.1f} MB saved".format(
+                dname, _stats["n_linked"], _stats["n_files"], _stats["bytes_saved"]/1048576
+                ))
+            for k in stats:
+                stats[k] += _stats[k]
+        return stats
+    
+    async def migrate_file_layout(self) -> MigrateStatsT:
+        """
+        Move the documents and misc directories of all databases (loaded or not) to the sharded layout, 
+        the databases can be in use, see core.fileLayout
+        """
+        stats: MigrateStatsT = {"n_moved": 0, "n_skipped": 0}
+        for dname in self.__database_dirs():
+            _stats = await asyncio.to_thread(migrate_layout, os.path.join(self._home, dname, "files"))
+            await self.logger.info("Migrated file layout of database {}: {} moved, {} skipped".format(
+                dname, _stats["n_moved"], _stats["n_skipped"]
+                ))
+            for k in stats:
+                stats[k] += _stats[k]
+        return stats
+    
+    def __database_dirs(self) -> list[str]:
+        """ names of the database directories (user ids) """
+        return sorted(d for d in os.listdir(self._home) if d.isdigit())
 
 async def init_resources(pre_load: bool = False):
     user_pool = await UserPool().init(USER_DIR)
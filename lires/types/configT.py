@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import TypedDict, TYPE_CHECKING
+from typing import TypedDict, Literal, TYPE_CHECKING
 
 class LiresConfT(TypedDict):
     """
@@ -24,6 +24,12 @@ class LiresConfT(TypedDict):
     
     changes in v1.8.5:
         - Add allow_public_query field
+    
+    changes in v1.9.0:
+        - Add db_reader_pool_size field
+        - Add db_durability, db_group_commit_ms fields
+        - Add db_blob_store field
+        - Add db_datapoint_cache_size field
     """
     ## Should contain no optional or ambiguous type fields!!
 
@@ -48,4 +54,24 @@ class LiresConfT(TypedDict):
     # i.e. get datapoint info without login via /share and /datainfo*
     allow_public_query: bool
 
+    # Number of read-only connections for each database,
+    # set to 0 to read from the writer connection
+    db_reader_pool_size: int
+
+    # When to commit the database modifications, 
+    # 'immediate': after every modification, 
+    # 'group': once within db_group_commit_ms after the first uncommitted modification, 
+    # 'periodic': only by the periodic flush of the server (every 5 seconds)
+    db_durability: Literal['immediate', 'group', 'periodic']
+    db_group_commit_ms: int
+
+    # Store the documents in a content-addressed store shared by all users, 
+    # the identical documents are stored once (as hard links), 
+    # use `lrs-utils dedupe-docs` to move the existing documents into the store
+    db_blob_store: bool
+
+    # Number of the recently used entries (DataPoint) kept in memory for each database, 
+    # set to 0 to disable the cache
+    db_datapoint_cache_size: int
+
 __all__ = ["LiresConfT"]
\ No newline at end of file
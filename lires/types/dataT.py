@@ -1,10 +1,12 @@
-from typing import Any, List, Optional, Literal, TypeAlias
-from dataclasses import dataclass
+from __future__ import annotations
+from typing import Any, List, Optional, Literal, TypeAlias, Iterator, Iterable
+from dataclasses import dataclass, fields
 
 # FileTypeT = Literal['.pdf', '.html']     # should be one of the accepted extensions at config.py
 FileTypeT: TypeAlias = Literal['', '.pdf', '.html']
 
-@dataclass
+# slots, as the summaries of the whole database may be held in memory
+@dataclass(slots=True)
 class DataPointSummary():
     doc_type: str
     has_file: bool
@@ -24,23 +26,45 @@ class DataPointSummary():
     note_linecount: int
     has_abstract: bool
 
+    def values(self) -> tuple:
+        """ the field values in the order of SUMMARY_JSON_FIELDS """
+        return tuple(getattr(self, f) for f in SUMMARY_JSON_FIELDS)
+
     def json(self):
-        return {
-            "doc_type": self.doc_type,
-            "has_file": self.has_file,
-            "file_type": self.file_type,
-            "year": self.year,
-            "title": self.title,
-            "author": self.author,
-            "authors": self.authors,
-            "publication": self.publication,
-            "tags": self.tags,
-            "uuid": self.uuid,
-            "url": self.url,
-            "time_added": self.time_added,
-            "time_modified": self.time_modified,
-            "bibtex": self.bibtex,
-            "doc_size": self.doc_size,
-            "note_linecount": self.note_linecount,
-            "has_abstract": self.has_abstract
-        }
\ No newline at end of file
+        return {f: getattr(self, f) for f in SUMMARY_JSON_FIELDS}
+
+SUMMARY_JSON_FIELDS: tuple[str, ...] = tuple(f.name for f in fields(DataPointSummary))
+
+class SummaryBatch:
+    """
+    The summaries of many entries, stored by columns (a list per field),
+    serialized as {field: [values]} without per-entry objects,
+    for the list responses of many entries
+    """
+    __slots__ = ("columns",)
+    def __init__(self, columns: Optional[dict[str, list]] = None):
+        self.columns: dict[str, list] = columns if columns is not None else {f: [] for f in SUMMARY_JSON_FIELDS}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> SummaryBatch:
+        """ rows are the field values in the order of SUMMARY_JSON_FIELDS """
+        cols = list(zip(*rows))
+        if not cols:
+            return cls()
+        return cls({f: list(col) for f, col in zip(SUMMARY_JSON_FIELDS, cols)})
+
+    @classmethod
+    def from_summaries(cls, summaries: Iterable[DataPointSummary]) -> SummaryBatch:
+        return cls.from_rows(s.values() for s in summaries)
+
+    def __len__(self) -> int:
+        return len(self.columns["uuid"])
+
+    def __getitem__(self, i: int) -> DataPointSummary:
+        return DataPointSummary(**{f: col[i] for f, col in self.columns.items()})
+
+    def __iter__(self) -> Iterator[DataPointSummary]:
+        return (self[i] for i in range(len(self)))
+
+    def json(self) -> dict[str, list]:
+        return self.columns
@@ -9,6 +9,8 @@ from .time import TimeUtils, timed_func, Timer
 from .fs import open_file, is_web_url
 from .random import random_alphanumeric
 from .network import get_local_ip
+from .lock import InstrumentedLock, LockStatsT
+from .lru import LRUCache, CacheStatsT
 
 
 __all__ = [
@@ -18,4 +20,6 @@ __all__ = [
     "open_file", "is_web_url", 
     "random_alphanumeric",
     "get_local_ip",
+    "InstrumentedLock", "LockStatsT",
+    "LRUCache", "CacheStatsT",
 ]
\ No newline at end of file
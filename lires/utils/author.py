@@ -20,3 +20,25 @@ def format_author_name(author: str) -> str:
             formatted_author = f"{family_name.strip()}, {given_name.strip()}"
 
     return formatted_author
+
+def get_authors_abbr(authors: list[str], max_len: int = 36) -> str:
+    """
+    Get authors abbreviation, i.e.:
+        when only have one author: return the only author's first name
+        otherwise return the first author's first name + et al.
+    Author name abbreviation has a maximum length of max_len
+    """
+    if len(authors) == 0:
+        return ""
+    if len(authors) == 1:
+        author = _get_first_name(authors[0]) + "."
+    else:
+        author = _get_first_name(authors[0]) + " et al."
+    if len(author) < max_len:
+        return author
+    else:
+        return author[:max_len-4] + "..."
+
+def _get_first_name(name: str) -> str:
+    x = name.split(", ")
+    return x[0]
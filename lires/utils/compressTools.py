@@ -1,6 +1,10 @@
 from __future__ import annotations
-import zipfile, os
-from typing import List
+import zipfile, os, io, asyncio
+from typing import List, Iterator, AsyncIterator
+
+# the formats already compressed, stored in the zip without deflating again
+STORED_EXTENSIONS = {".pdf", ".zip", ".gz", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp4"}
+ZIP_STREAM_CHUNK_SIZE = 1024*1024
 
 def get_all_file_paths(directory) -> List[str]:
     file_paths = []
@@ -46,4 +50,46 @@ def compress_selected(root_dir: str, selected: List[str], dst_path: str) -> str:
     with zipfile.ZipFile(dst_path, "w", zipfile.ZIP_DEFLATED) as zp:
         for f_ in all_files:
             zp.write(f_, arcname=f_.replace(root_dir, ""), compress_type=zipfile.ZIP_DEFLATED)
-    return dst_path
\ No newline at end of file
+    return dst_path
+
+
+class _ChunkSink(io.RawIOBase):
+    """ Unseekable output of the zip writer, the written data are taken out by pop """
+    def __init__(self):
+        self._chunks: list[bytes] = []
+    def writable(self) -> bool:
+        return True
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _iter_zip(files: list[tuple[str, str]], chunk_size: int) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w") as zp:
+        for f_, arcname in files:
+            zinfo = zipfile.ZipInfo.from_file(f_, arcname=arcname)
+            zinfo.compress_type = zipfile.ZIP_STORED \
+                if os.path.splitext(f_)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            with open(f_, "rb") as src, zp.open(zinfo, "w") as dst:
+                while chunk := src.read(chunk_size):
+                    dst.write(chunk)
+                    if data := sink.pop():
+                        yield data
+            if data := sink.pop():
+                yield data
+    # the central directory
+    yield sink.pop()
+
+async def stream_zip(files: list[tuple[str, str]], chunk_size: int = ZIP_STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Generate a zip archive chunk by chunk, without holding the archive in memory, 
+    the reading and compression are done in a thread
+    files: a list of (file path, name in the archive)
+    """
+    it = _iter_zip(files, chunk_size)
+    while (data := await asyncio.to_thread(next, it, None)) is not None:
+        yield data
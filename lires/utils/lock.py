@@ -0,0 +1,67 @@
+import asyncio, time
+from typing import TypedDict, Callable, Awaitable, Optional
+
+class LockStatsT(TypedDict):
+    name: str
+    n_acquire: int          # number of acquisitions
+    n_contended: int        # number of acquisitions that had to wait
+    wait_total: float       # total waiting time, in seconds
+    wait_max: float         # maximum waiting time, in seconds
+
+class InstrumentedLock:
+    """
+    An asyncio.Lock that records how long the acquirers waited,
+    for monitoring the lock contention.
+    - on_slow: called with (lock name, waiting time) if the waiting time exceeds slow_threshold (in seconds)
+    """
+    def __init__(
+        self, name: str = "",
+        slow_threshold: float = 1.0,
+        on_slow: Optional[Callable[[str, float], Awaitable[None]]] = None
+        ):
+        self.name = name
+        self.slow_threshold = slow_threshold
+        self.on_slow = on_slow
+        self._lock = asyncio.Lock()
+        self._n_acquire = 0
+        self._n_contended = 0
+        self._wait_total = 0.
+        self._wait_max = 0.
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    async def acquire(self):
+        if not self._lock.locked():
+            await self._lock.acquire()
+            self._n_acquire += 1
+            return True
+
+        t_start = time.perf_counter()
+        await self._lock.acquire()
+        wait = time.perf_counter() - t_start
+        self._n_acquire += 1
+        self._n_contended += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        if self.on_slow is not None and wait > self.slow_threshold:
+            await self.on_slow(self.name, wait)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def stats(self) -> LockStatsT:
+        return {
+            "name": self.name,
+            "n_acquire": self._n_acquire,
+            "n_contended": self._n_contended,
+            "wait_total": self._wait_total,
+            "wait_max": self._wait_max,
+        }
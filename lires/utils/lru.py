@@ -0,0 +1,71 @@
+from typing import TypedDict, Generic, TypeVar, Optional, Hashable, Iterable
+from collections import OrderedDict
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+class CacheStatsT(TypedDict):
+    size: int               # number of cached items
+    max_size: int
+    n_hit: int
+    n_miss: int
+    n_invalidate: int       # number of items dropped by invalidation
+
+class LRUCache(Generic[K, V]):
+    """
+    A bounded mapping that drops the least recently used items, with hit / miss counters.
+    The values loaded before an invalidation should not be put into the cache,
+    the epoch (changed on every invalidation) is recorded before loading for this purpose:
+        epoch = cache.epoch
+        value = await load(key)
+        cache.put(key, value, epoch)
+    """
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self._epoch = 0
+        self._n_hit = 0
+        self._n_miss = 0
+        self._n_invalidate = 0
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: K) -> Optional[V]:
+        if (value := self._items.get(key)) is None:
+            self._n_miss += 1
+            return None
+        self._items.move_to_end(key)
+        self._n_hit += 1
+        return value
+
+    def put(self, key: K, value: V, epoch: Optional[int] = None) -> bool:
+        """ return False if not cached, as invalidated since the epoch """
+        if epoch is not None and epoch != self._epoch:
+            return False
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return True
+
+    def invalidate(self, keys: Iterable[K]):
+        self._epoch += 1
+        for key in keys:
+            if self._items.pop(key, None) is not None:
+                self._n_invalidate += 1
+
+    def clear(self):
+        self._epoch += 1
+        self._n_invalidate += len(self._items)
+        self._items.clear()
+
+    def stats(self) -> CacheStatsT:
+        return {
+            "size": len(self._items), "max_size": self.max_size,
+            "n_hit": self._n_hit, "n_miss": self._n_miss, "n_invalidate": self._n_invalidate,
+        }
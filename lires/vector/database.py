@@ -3,8 +3,7 @@ from lires.core.base import LiresBase
 import aiosqlite, asyncio
 from typing import TypedDict, Literal, TypeVar, Generic
 from .wrap import FixSizeAlg
-
-DB_MOD_LOCK = asyncio.Lock()
+from ..utils import InstrumentedLock, LockStatsT
 
 class CollectionConfig(TypedDict):
     name: str
@@ -30,6 +29,8 @@ class VectorCollection(LiresBase, Generic[ContentT]):
         self._parent = parent
         self.config = config
         self.alg = FixSizeAlg(config["dimension"])
+        # modifications of different collections do not block each other
+        self.lock = InstrumentedLock(f"vector:{parent.path}:{config['name']}", on_slow=self._parent._on_slow_lock)
     
     @property
     def conn(self):
@@ -44,7 +45,7 @@ class VectorCollection(LiresBase, Generic[ContentT]):
         return self.config["dimension"]
 
     async def init(self):
-        async with DB_MOD_LOCK:
+        async with self._parent.lock:
             # mata data
             res = await self.conn.execute(
                 f"SELECT * FROM metadata WHERE name = ?", (self.name,)
@@ -70,7 +71,7 @@ class VectorCollection(LiresBase, Generic[ContentT]):
     
     async def insert(self, entry: VectorEntry):
         vec_enc = self.alg.encode(entry["vector"])
-        async with DB_MOD_LOCK:
+        async with self.lock:
             await self.conn.execute(
                 f"INSERT INTO {self.config['name']} (uid, vector, group_name, content) VALUES (?, ?, ?, ?)",
                 (entry["uid"], vec_enc, entry["group"], entry["content"])
@@ -78,14 +79,14 @@ class VectorCollection(LiresBase, Generic[ContentT]):
     
     async def update(self, entry: VectorEntry):
         vec_enc = self.alg.encode(entry["vector"])
-        async with DB_MOD_LOCK:
+        async with self.lock:
             await self.conn.execute(
                 f"UPDATE {self.config['name']} SET vector = ?, group_name = ?, content = ? WHERE uid = ?",
                 (vec_enc, entry["group"], entry["content"], entry["uid"])
             )
     
     async def delete_group(self, group: str):
-        async with DB_MOD_LOCK:
+        async with self.lock:
             await self.conn.execute( f"DELETE FROM {self.config['name']} WHERE group_name = ?", (group,))
     
     async def get_group(self, group: str) -> list[VectorEntry]:
@@ -165,14 +166,14 @@ class VectorCollection(LiresBase, Generic[ContentT]):
         return [ids[i] for i in top_k_indices], [scores[i] for i in top_k_indices]
     
     async def delete(self, uid: str):
-        async with DB_MOD_LOCK:
+        async with self.lock:
             await self.conn.execute(
                 f"DELETE FROM {self.config['name']} WHERE uid = ?", (uid,)
             )
     
     async def clear_all(self):
         """ Clear all data in the collection. """
-        async with DB_MOD_LOCK:
+        async with self.lock:
             await self.conn.execute( f"DELETE FROM {self.config['name']}")
             await self.conn.execute( f"VACUUM")
     
@@ -187,10 +188,19 @@ class VectorDatabase(LiresBase):
         super().__init__()
         self.path = db_path
         self.configs = configs
+        # for the database-wise modifications (metadata and collection tables)
+        self.lock = InstrumentedLock(f"vector:{db_path}", on_slow=self._on_slow_lock)
+    
+    async def _on_slow_lock(self, name: str, wait: float):
+        await self.logger.warning("Waited {:.2f}s for the lock of {}".format(wait, name))
+    
+    async def lock_stats(self) -> list[LockStatsT]:
+        return [self.lock.stats()] + [c.lock.stats() for c in self.collections.values()]
     
     async def init(self):
-        async with DB_MOD_LOCK:
+        async with self.lock:
             self.conn = await aiosqlite.connect(self.path)
+            await self.conn.execute("PRAGMA journal_mode=WAL")
             await self.conn.execute(
                 "CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, dim INTEGER)"
             )
@@ -209,7 +219,7 @@ class VectorDatabase(LiresBase):
         return self.collections[name]
     
     async def delete_collection(self, name: str):
-        async with DB_MOD_LOCK:
+        async with self.lock:
             await self.conn.execute( f"DROP TABLE IF EXISTS {name}")
             await self.conn.execute( f"DELETE FROM metadata WHERE name = ?", (name,))
             await self.commit()
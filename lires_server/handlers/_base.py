@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Callable, Optional, List, Generator, AsyncGenerator, TypeVar, Any, TYPE_CHECKING
+from typing import Callable, Optional, List, Generator, AsyncGenerator, AsyncIterator, TypeVar, Any, TYPE_CHECKING
 import tornado.web, tornado.websocket
 import asyncio
 import json
@@ -8,7 +8,7 @@ import http.cookies
 from ._global_data import GlobalStorage
 from lires.user import UserInfo
 from lires.core.base import LiresBase
-from lires.core.dataTags import DataTags
+from lires.core.dataTags import DataTags, TagRule
 from lires.core.vecutils import update_feature, delete_feature
 from lires.utils import BCOLORS
 
@@ -18,6 +18,7 @@ from ..types import Event
 if TYPE_CHECKING:
     from .websocket import WebsocketHandler
     from lires.core.dataClass import DataBase, DataPoint
+    from lires.core.dbConn import PageCursorT
     from lires.vector.database import VectorDatabase
 
 T = TypeVar("T")
@@ -59,6 +60,8 @@ _ws_connections: list[WebsocketHandler] = []
 
 class RequestHandlerMixin(LiresBase):
     get_argument: Callable
+    write: Callable
+    flush: Callable
     request: tornado.httputil.HTTPServerRequest
     get_cookie: Callable[[str, Optional[str]], Optional[str]]
     set_header: Callable
@@ -88,6 +91,37 @@ class RequestHandlerMixin(LiresBase):
             await asyncio.sleep(0)  # make the control back to the event loop, tricky
             yield item
     
+    def get_page_arguments(self) -> tuple[Optional[PageCursorT], Optional[int]]:
+        """
+        Get the keyset pagination arguments, 
+        - cursor: the next_cursor of the previous page, omit for the first page
+        - limit: the page size
+        """
+        cursor = self.get_argument("cursor", None)
+        limit = self.get_argument("limit", None)
+        try:
+            after = None
+            if cursor:
+                value, uuid = json.loads(cursor)
+                after = (value, uuid)
+            return after, (int(limit) if limit is not None else None)
+        except (ValueError, TypeError):
+            raise tornado.web.HTTPError(400, "Invalid pagination arguments")
+    
+    async def next_page_cursor(self, page: list[str], limit: Optional[int]) -> Optional[str]:
+        """ The cursor for the page after the given one (sorted by time_import), None if it is the last page """
+        if limit is None or len(page) < limit:
+            return None
+        cursor = await (await self.db()).conn.page_cursor(page[-1])
+        return json.dumps(cursor) if cursor is not None else None
+    
+    async def write_ndjson(self, batches: AsyncIterator[list[Any]]):
+        """ Stream the items as newline-delimited json, flush after each batch """
+        self.set_header("Content-Type", "application/x-ndjson")
+        async for batch in batches:
+            self.write("".join(json.dumps(item) + "\n" for item in batch))
+            await self.flush()
+    
     async def infer_userid(self) -> int:
         """
         Try to identify user id from different sources
@@ -206,6 +240,18 @@ class RequestHandlerMixin(LiresBase):
         asyncio.ensure_future(update_feature(vec_db, self.iconn, dp))
         await self.logger.debug(f"Feature update for {dp.uuid}")
     
+    async def ensure_features_update(self, dps: list[DataPoint]):
+        """
+        Ensure the features of many entries are updated, 
+        one after another in a single background task
+        """
+        vec_db = await self.vec_db()
+        async def _update():
+            for dp in dps:
+                await update_feature(vec_db, self.iconn, dp)
+        asyncio.ensure_future(_update())
+        await self.logger.debug(f"Feature update for {len(dps)} entries")
+    
     async def delete_feature(self, dp: DataPoint):
         """
         Delete the feature
@@ -222,7 +268,8 @@ class RequestHandlerMixin(LiresBase):
         tags = DataTags(_tags)
         mandatory_tags = DataTags(_mandatory_tags)
         await RequestHandlerMixin.logger.debug(f"check tag permission: {tags} vs {mandatory_tags}")
-        if not mandatory_tags.issubset(tags.with_parents()):
+        # every mandatory tag should be one of the tags or their parents
+        if not all(t in tags or any(s.startswith(t + TagRule.SEP) for s in tags) for t in mandatory_tags):
             await RequestHandlerMixin.logger.debug("Tag permission denied")
             if raise_error:
                 raise tornado.web.HTTPError(403)
@@ -23,14 +23,43 @@ class DataInfoHandler(RequestHandlerBase):
         return
 
 class DataInfoListHandler(RequestHandlerBase):
-    """ Query information about a list of files """
+    """
+    Query information about a list of files, 
+    if uids is not given, query the whole database (newest first): 
+    - limit, cursor: return a page as {data, next_cursor}, see get_page_arguments
+    - stream: if true, stream all summaries as newline-delimited json
+    - columns: if true, the summaries (not streamed) are given by columns as {field: [values]}, 
+        see lires.types.dataT.SummaryBatch
+    """
     @authenticate(enabled = not get_conf()['allow_public_query'])
     async def post(self):
-        self.set_header("Content-Type", "application/json")
-        uids: list[str] = json.loads(self.get_argument("uids"))
         db = await self.db()
+        columns = self.get_argument("columns", "false").lower() == "true"
+        async def _summaries_json(uids: list[str]):
+            if columns:
+                return (await db.gets_batch(uids)).json()
+            return [dp.summary.json() for dp in await db.gets(uids)]
+
+        if (_uids := self.get_argument("uids", None)) is None:
+            if self.get_argument("stream", "false").lower() == "true":
+                async def _summaries():
+                    async for page in db.conn.iter_keys(page_size=256):
+                        yield [dp.summary.json() for dp in await db.gets(page)]
+                return await self.write_ndjson(_summaries())
+
+            after, limit = self.get_page_arguments()
+            uids = await db.conn.keys(sortby="time_import", reverse=True, after=after, limit=limit)
+            self.set_header("Content-Type", "application/json")
+            self.write(json.dumps({
+                "data": await _summaries_json(uids),
+                "next_cursor": await self.next_page_cursor(uids, limit)
+            }))
+            return
+
+        self.set_header("Content-Type", "application/json")
+        uids: list[str] = json.loads(_uids)
         try:
-            all_dp = await db.gets(uids)
+            data = await _summaries_json(uids)
         except self.Error.LiresEntryNotFoundError:
             await self.logger.error("Some data points are not found: {}".format(
                 non_exist_uids := await db.conn.check_nonexist(uids)
@@ -39,6 +68,6 @@ class DataInfoListHandler(RequestHandlerBase):
             self.write("Some data points are not found: {}".format(non_exist_uids))
             return
 
-        await self.logger.debug("emit data info list of size: {}".format(len(all_dp)))
-        self.write(json.dumps([dp.summary.json() for dp in all_dp]))
+        await self.logger.debug("emit data info list of size: {}".format(len(uids)))
+        self.write(json.dumps(data))
         return
\ No newline at end of file
@@ -8,7 +8,7 @@ Provides handers for adding, deleting, and modifying files/tags
 from ._base import *
 import json
 from lires.core.bibReader import check_bibtex_validity, BibConverter
-from lires.core.fileTools import add_document
+from lires.core.fileTools import add_document, add_documents
 from lires.core.dataTags import DataTags
 
 class DataDeleteHandler(RequestHandlerBase):
@@ -159,6 +159,53 @@ class DataUpdateHandler(RequestHandlerBase):
 
         return 
 
+class DataBulkImportHandler(RequestHandlerBase):
+
+    @authenticate()
+    async def post(self):
+        """
+        Create many data entries at once
+        arguments:
+            citations: list[str], bibtex strings, one entry each
+            tags: list[str], tags applied to all the new entries
+        return:
+            a list of {uuid, error} for each citation, in the same order
+        """
+        self.set_header("Content-Type", "application/json")
+        permission = await self.user_info()
+        db = await self.db()
+
+        citations = json.loads(self.get_argument("citations"))
+        tags = json.loads(self.get_argument("tags", '[]'))
+        assert isinstance(citations, list) and isinstance(tags, list)
+
+        if not permission["is_admin"]:
+            await self.check_tag_permission(tags, permission["mandatory_tags"])
+
+        # check disk usage, the citations are all the data stored
+        if await db.disk_usage() + sum(len(c.encode()) for c in citations) > permission["max_storage"]:
+            raise tornado.web.HTTPError(413, reason="File too large")
+
+        results = await add_documents(
+            db.conn, citations, 
+            tags = DataTags(tags).to_ordered_list(),
+            check_duplicate = True
+            )
+        await db.commit()
+
+        # a single event and feature update task for all the new entries
+        if (uids := [res["uuid"] for res in results if res["uuid"] is not None]):
+            await self.broadcast_event({
+                'type': 'add_entries',
+                'uuids': uids,
+            })
+            await self.ensure_features_update(await db.gets(uids))
+
+        await self.logger.info("Bulk import: {} of {} entries created".format(
+            sum(1 for res in results if res["uuid"] is not None), len(results)
+            ))
+        self.write(json.dumps(results))
+
 class TagRenameHandler(RequestHandlerBase):
     @authenticate()
     async def post(self):
@@ -168,7 +215,9 @@ class TagRenameHandler(RequestHandlerBase):
         db = await self.db()
         old_tag = self.get_argument("oldTag")
         new_tag = self.get_argument("newTag")
-        await db.rename_tag(old_tag, new_tag)
+        async def _progress(n: int, total: int):
+            await self.logger.debug(f"Renaming tag [{old_tag}]: {n}/{total}")
+        await db.rename_tag(old_tag, new_tag, progress=_progress)
         await self.logger.info(f"Tag [{old_tag}] renamed to [{new_tag}] by [{(await self.user_info())['name']}]")
         await self.broadcast_event({
             'type': 'update_tag',
@@ -185,7 +234,9 @@ class TagDeleteHandler(RequestHandlerBase):
         """
         db = await self.db()
         tag = self.get_argument("tag")
-        await db.delete_tag(tag)
+        async def _progress(n: int, total: int):
+            await self.logger.debug(f"Deleting tag [{tag}]: {n}/{total}")
+        await db.delete_tag(tag, progress=_progress)
         await self.logger.info(f"Tag [{tag}] deleted by [{(await self.user_info())['name']}]")
         await self.broadcast_event({
             'type': 'delete_tag',
@@ -2,12 +2,47 @@ from ._base import *
 import json
 
 class DatabaseKeysHandler(RequestHandlerBase):
-    """ Get summary of the database """
+    """
+    Get uuids of the database, newest first, 
+    - limit, cursor: return a page as {uids, next_cursor}, see get_page_arguments
+    - stream: if true, stream all uuids as newline-delimited json
+    """
+    @authenticate()
+    async def get(self):
+        db = await self.db()
+        if self.get_argument("stream", "false").lower() == "true":
+            return await self.write_ndjson(db.conn.iter_keys())
+
+        self.set_header("Content-Type", "application/json")
+        after, limit = self.get_page_arguments()
+        if after is None and limit is None:
+            self.write(json.dumps(await db.keys()))
+            return
+        uids = await db.conn.keys(sortby="time_import", reverse=True, after=after, limit=limit)
+        self.write(json.dumps({
+            "uids": uids,
+            "next_cursor": await self.next_page_cursor(uids, limit)
+        }))
+        return
+class DatabaseChangesHandler(RequestHandlerBase):
+    """
+    Get the changes of the database after a sequence number, for incremental sync, 
+    - since: the 'latest' of the previous response, 0 for the first time
+    - limit: maximum number of changes to return
+    return {changes, latest, resync}, see JournalPageT, 
+    the client should fetch everything again if resync is true
+    """
     @authenticate()
     async def get(self):
         self.set_header("Content-Type", "application/json")
+        try:
+            since = int(self.get_argument("since", "0"))
+            limit = self.get_argument("limit", None)
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Invalid since or limit")
         db = await self.db()
-        self.write(json.dumps(await db.keys()))
+        self.write(json.dumps(await db.conn.changes(since, limit)))
         return
 class DatabaseTagsHandler(RequestHandlerBase):
     """ Get summary of the database """
@@ -23,6 +23,10 @@ class StatusHandler(RequestHandlerBase):
             "n_data": await db.count(),
             "n_connections": len(self.connections_by_userid(user_info["id"])),
             "n_connections_all": len(self.connection_pool),
+            "db_lock": await db.conn.lock_stats(),
+            "db_reader_pool_size": len(db.conn.readers),
+            "db_commit": await db.conn.commit_stats(),
+            "db_cache": db.cache_stats(),
         }
         self.write(json.dumps(status))
 
@@ -135,4 +139,28 @@ class DatabaseDownloadHandler(RequestHandlerBase):
             await self.logger.info(f"User {user_info['username']} is downloading the database (data included)")
             self.set_header("Content-Type", "application/zip")
             self.set_header("Content-Disposition", f"attachment; filename=\"{user_info['username']}.lires.zip\"")
-            self.write(await db.dump(include_files=True))
\ No newline at end of file
+            # stream the archive, the next chunk is generated after the previous one is sent
+            async for chunk in db.dump_stream():
+                self.write(chunk)
+                await self.flush()
+
+class DatabaseBackupHandler(RequestHandlerBase):
+    """
+    Online backup of the databases to the backup directory of the server (see lrs-backup), admin only, 
+    - usernames: json list of user names, backup all users if not given
+    return {user id: BackupStatsT}
+    """
+    @authenticate(admin_required=True)
+    async def post(self):
+        usernames = self.get_argument("usernames", None)
+        if usernames is None:
+            users = await self.user_pool.all()
+        else:
+            users = []
+            for username in json.loads(usernames):
+                if (user := await self.user_pool.get_user_by_username(username)) is None:
+                    raise tornado.web.HTTPError(404, f"User {username} not found")
+                users.append(user)
+        await self.logger.info("Backing up the databases of {} users".format(len(users)))
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(await self.db_pool.backup(users)))
@@ -97,6 +97,7 @@ class MiscFileHandler(RequestHandlerBase):
         fpath = os.path.join(dp.fm.get_misc_dir(create=True), filename)
         async with aiofiles.open(fpath, "wb") as f:
             await f.write(file_data)
+        await db.conn.add_files_usage(file_size)
         await self.logger.info(f"Saved misc file to {fpath}")
         
         self.write({
@@ -136,7 +137,9 @@ class MiscFileHandler(RequestHandlerBase):
         fname = self.get_argument("fname")
         fpath = os.path.join(dp.fm.get_misc_dir(), fname)
         if os.path.exists(fpath):
+            file_size = os.path.getsize(fpath)
             os.remove(fpath)
+            await db.conn.add_files_usage(-file_size)
             if not os.listdir(dp.fm.get_misc_dir()):
                 os.rmdir(dp.fm.get_misc_dir())
             await self.logger.info(f"Deleted misc file {fpath}")
@@ -1,6 +1,8 @@
 from ._base import *
 from typing import TypedDict
 from lires.core.vecutils import query_feature_index
+from lires.core.dbQuery import QueryNode, QAnd, QTerm, parse_query
+from lires.core.dataTags import DataTags
 import json
 
 
@@ -12,7 +14,8 @@ class BasicFilterT(TypedDict):
     top_k: int
 
 class BasicFilterHandler(RequestHandlerBase):
-    # Get data by a single tag and search filter
+    # Get data by a single tag and search filter, 
+    # the results (if not scored) can be paginated by limit and cursor, see get_page_arguments
 
     @authenticate()
     async def post(self):
@@ -25,30 +28,20 @@ class BasicFilterHandler(RequestHandlerBase):
         search_by = self.get_argument("search_by")
         search_content = self.get_argument("search_content")
         top_k = int(self.get_argument("top_k"))
+        after, limit = self.get_page_arguments()
 
         await self.logger.debug(f"tags: {tags}, search_by: {search_by}, search_content: {search_content}, top_k: {top_k}")
 
-        # Get the data
-        if (not search_content) and (not tags):
-            return self.write(json.dumps({
-                'uids': await db.keys(),
-                'scores': None
-            }))
-
-        if tags:
-            cadidate_ids = await db.ids_from_tags(tags)
-            res = cadidate_ids
-        else:
-            cadidate_ids = None
-            res = await db.keys()
-        scores = None
-
+        # The tags and the search filter are combined into a single database query,
+        # except for the feature search, which is served by the vector database
+        tags = DataTags(tags)
+        conds: list[QueryNode] = [db.tags_query(tags)] if tags else []
         if not search_content:
             pass
 
-        elif search_by == 'title':
-            res = await db.conn.filter(strict=False, ignore_case=True, from_uids=cadidate_ids, title=search_content)
-        
+        elif search_by in ['title', 'publication', 'note', 'author', 'uuid']:
+            conds.append(QTerm(search_by, search_content))
+
         elif search_by == 'year':
             q = None
             if search_content.isnumeric():
@@ -61,21 +54,16 @@ class BasicFilterHandler(RequestHandlerBase):
                         break
             if q is None:
                 raise tornado.web.HTTPError(400, "Invalid search year value")
-            res = await db.conn.filter(strict=False, ignore_case=True, from_uids=cadidate_ids, year=q)
-        
-        elif search_by == 'publication':
-            res = await db.conn.filter(strict=False, ignore_case=True, from_uids=cadidate_ids, publication=search_content)
-        
-        elif search_by == 'note':
-            res = await db.conn.filter(strict=False, ignore_case=True, from_uids=cadidate_ids, note=search_content)
-        
-        elif search_by == 'uuid':
-            res = []
-            for uid in await db.keys():
-                if uid.startswith(search_content):
-                    res.append(uid)
-        
+            conds.append(QTerm("year", range=(q, q+1) if isinstance(q, int) else q))
+
+        elif search_by == 'query':
+            try:
+                conds.append(parse_query(search_content))
+            except self.Error.LiresQuerySyntaxError as e:
+                raise tornado.web.HTTPError(400, "Invalid query: {}".format(e))
+
         elif search_by == 'feature':
+            cadidate_ids = await db.ids_from_tags(tags, sort=False) if tags else None
             q_res = await query_feature_index(
                 iconn=self.iconn,
                 query=search_content,
@@ -95,22 +83,25 @@ class BasicFilterHandler(RequestHandlerBase):
             else:
                 res = res_
                 scores = scores_
-        
-        elif search_by == 'author':
-            # TODO: Optimize this to unify the author name
-            res = await db.conn.filter(strict=False, ignore_case=True, from_uids=cadidate_ids, authors=[search_content])
-        
+            await self.logger.debug(f"returning {len(res)} results.")
+            return self.write(json.dumps({
+                'uids': res,
+                'scores': scores
+            }))
+
         else:
             raise tornado.web.HTTPError(400, "Invalid search_by value")
-        
-        await self.logger.debug(f"returning {len(res)} results.")
 
-        # Sort the result if no scores are provided
-        if scores is None:
-            res = await db.conn.sort_keys(res)
+        # Ranked by relevance if the query has full-text search terms and is not paginated, 
+        # otherwise sorted by import time, newest first
+        res = await db.conn.query(QAnd(tuple(conds)), sort_by=None, reverse=True, after=after, limit=limit)
+        await self.logger.debug(f"returning {len(res)} results.")
 
-        self.write(json.dumps({
+        ret = {
             'uids': res,
-            'scores': scores
-        }))
+            'scores': None
+        }
+        if after is not None or limit is not None:
+            ret['next_cursor'] = await self.next_page_cursor(res, limit)
+        self.write(json.dumps(ret))
         return
@@ -101,9 +101,11 @@ class SummaryHandler(RequestHandlerBase):
                 await self.logger.warning(f"Summary too long, stopping ...")
                 break
 
+        old_size = os.path.getsize(summary_txt_path) if os.path.exists(summary_txt_path) else 0
         with open(summary_txt_path, "w", encoding='utf-8') as fp:
             await self.logger.info(f"Saving summary to {summary_txt_path} ...")
             fp.write(summary_txt)
+        await db.conn.add_files_usage(os.path.getsize(summary_txt_path) - old_size)
         
         self.finish()  # Signal the end of the response
         return
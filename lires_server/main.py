@@ -97,11 +97,13 @@ class Application(tornado.web.Application):
             (r"/api/filter/basic", BasicFilterHandler),
 
             (r"/api/database/keys", DatabaseKeysHandler),
+            (r"/api/database/changes", DatabaseChangesHandler),
             (r"/api/database/tags", DatabaseTagsHandler),
             (r"/api/database/usage", DatabaseUsageHandler),
             (r"/api/database/tag-rename", TagRenameHandler),
             (r"/api/database/tag-delete", TagDeleteHandler),
             (r"/api/database/download", DatabaseDownloadHandler),
+            (r"/api/database/backup", DatabaseBackupHandler),
 
             (r"/api/datainfo-list", DataInfoListHandler),
             (r"/api/datainfo/(.*)", DataInfoHandler),
@@ -120,6 +122,7 @@ class Application(tornado.web.Application):
             # data management
             (r"/api/dataman/delete", DataDeleteHandler),
             (r"/api/dataman/update", DataUpdateHandler),
+            (r"/api/dataman/bulk-import", DataBulkImportHandler),
 
             # user
             (r"/api/user/list", UserListHandler),
@@ -188,7 +191,10 @@ async def __start_server(
             )
     
     tornado.ioloop.PeriodicCallback(buildIndex, 6*60*60*1000).start()   # in milliseconds
-    tornado.ioloop.PeriodicCallback(g_storage.flush, 5*1000).start()    # periodically flush the database
+    tornado.ioloop.PeriodicCallback(g_storage.database_pool.optimize, 6*60*60*1000).start()
+    tornado.ioloop.PeriodicCallback(g_storage.database_pool.compact_journal, 24*60*60*1000).start()
+    tornado.ioloop.PeriodicCallback(g_storage.database_pool.reconcile_disk_usage, 6*60*60*1000).start()
+    tornado.ioloop.PeriodicCallback(g_storage.flush, 5*1000).start()    # periodically flush the database, see also db_durability in the configuration
 
     # exit hooks
     import signal
@@ -1,6 +1,8 @@
 
 from typing import TypedDict, Literal, Optional
 from lires.user import UserInfo
+from lires.utils import LockStatsT, CacheStatsT
+from lires.core.dbConn import CommitStatsT
 
 class EventBase(TypedDict, total=False):
     session_id: str
@@ -10,6 +12,11 @@ class Event_Data(EventBase):
     uuid: str
     datapoint_summary: Optional[dict]
 
+class Event_DataBatch(EventBase):
+    # the summaries are not included, the clients should fetch them if needed
+    type: Literal['add_entries']
+    uuids: list[str]
+
 class Event_DataNote(Event_Data):
     type: Literal['update_note']
     note: str
@@ -24,7 +31,7 @@ class Event_User(EventBase):
     username: str
     user_info: Optional[UserInfo]
 
-Event = Event_Data | Event_DataNote | Event_Tag | Event_User
+Event = Event_Data | Event_DataBatch | Event_DataNote | Event_Tag | Event_User
 
 
 class ServerStatus(TypedDict):
@@ -33,4 +40,8 @@ class ServerStatus(TypedDict):
     uptime: float
     n_data: int
     n_connections: int
-    n_connections_all: int
\ No newline at end of file
+    n_connections_all: int
+    db_lock: LockStatsT     # lock contention of the user's database
+    db_reader_pool_size: int
+    db_commit: CommitStatsT     # commit latency of the user's database
+    db_cache: CacheStatsT       # datapoint cache of the user's database
\ No newline at end of file
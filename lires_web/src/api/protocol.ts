@@ -6,6 +6,31 @@ export interface ServerStatus {
     n_data: number;
     n_connections: number;
     n_connections_all: number;
+    db_lock: LockStats;     // lock contention of the user's database
+    db_reader_pool_size: number;
+    db_commit: CommitStats;     // commit latency of the user's database
+    db_cache: CacheStats;       // datapoint cache of the user's database
+}
+export interface LockStats {
+    name: string;
+    n_acquire: number;
+    n_contended: number;
+    wait_total: number;     // in seconds
+    wait_max: number;       // in seconds
+}
+export interface CommitStats {
+    durability: 'immediate' | 'group' | 'periodic';
+    n_commit: number;
+    latency_total: number;  // in seconds
+    latency_max: number;    // in seconds
+    latency_last: number;   // in seconds
+}
+export interface CacheStats {
+    size: number;
+    max_size: number;
+    n_hit: number;
+    n_miss: number;
+    n_invalidate: number;
 }
 export interface DatabaseUsage {
     n_entries: number;
@@ -61,10 +86,33 @@ export interface SearchResultant {
 
 export type Changelog = [string, string[] | Record<string, string[]>][];
 
-export type SearchType = 'title' | 'author' | 'year' | 'note' | 'publication' | 'feature' | 'uuid';
+export type SearchType = 'title' | 'author' | 'year' | 'note' | 'publication' | 'feature' | 'uuid' | 'query';
 export interface SearchResult {
     uids: string[];
     scores: number[] | null;
+    next_cursor?: string | null;    // only if paginated
+}
+export interface KeysPage {
+    uids: string[];
+    next_cursor: string | null;     // null if it is the last page
+}
+// the summaries by columns, each field is an array of the values of the entries
+export type DataInfoColumnsT = { [K in keyof DataInfoT]: DataInfoT[K][] };
+export interface DataInfoPage {
+    data: DataInfoT[];
+    next_cursor: string | null;     // null if it is the last page
+}
+export interface JournalEntry {
+    seq: number;
+    uuid: string;
+    op: 'add' | 'update' | 'delete';
+    fields: string[];               // modified fields of 'update'
+    time: number;
+}
+export interface JournalPage {
+    changes: JournalEntry[];
+    latest: number;                 // pass as 'since' to get the following changes
+    resync: boolean;                // the changes are incomplete, should fetch all data again
 }
 
 
@@ -72,7 +120,7 @@ export interface SearchResult {
 // Event for websocket to broadcast
 interface EventBase{
     type: 
-    'delete_entry' | 'add_entry' | 'update_entry' | 'update_note' |
+    'delete_entry' | 'add_entry' | 'add_entries' | 'update_entry' | 'update_note' |
     'delete_tag' | 'update_tag' |
     'delete_user' | 'add_user' | 'update_user' |
     'login' | 'logout';
@@ -86,6 +134,12 @@ export interface Event_Data extends EventBase{
     datapoint_summary: DataInfoT | null;
 }
 
+// the summaries are not included, should be fetched if needed
+export interface Event_DataBatch extends EventBase{
+    type: 'add_entries'
+    uuids: string[];
+}
+
 export interface Event_DataNote extends EventBase{
     type: 'update_note'
     note: string;
@@ -103,4 +157,4 @@ export interface Event_User extends EventBase{
     user_info: UserInfo | null
 }
 
-export type Event = Event_Data | Event_Tag | Event_User | Event_DataNote;
\ No newline at end of file
+export type Event = Event_Data | Event_DataBatch | Event_Tag | Event_User | Event_DataNote;
\ No newline at end of file
@@ -1,7 +1,7 @@
 
 // Server connection
 
-import type { DataInfoT, FeedDataInfoT, UserInfo, SearchType, SearchResult, Changelog, ServerStatus, DatabaseFeature, DatabaseUsage} from "./protocol.js";
+import type { DataInfoT, FeedDataInfoT, UserInfo, SearchType, SearchResult, Changelog, ServerStatus, DatabaseFeature, DatabaseUsage, KeysPage, DataInfoPage, DataInfoColumnsT, JournalPage} from "./protocol.js";
 import { sha256 } from "../utils/sha256lib";
 import Fetcher from "./fetcher";
 
@@ -75,6 +75,16 @@ export class ServerConn {
     async getAllKeys(): Promise<string[]>{
         return await this.fetcher.get(`/api/database/keys`).then(res=>res.json());
     };
+    async getKeysPage(limit = 1000, cursor: string | null = null): Promise<KeysPage>{
+        const params: Record<string, string> = { limit: limit.toString() };
+        if (cursor !== null){ params.cursor = cursor; }
+        return await this.fetcher.get(`/api/database/keys`, params).then(res=>res.json());
+    };
+    async getChanges(since = 0, limit: number | null = null): Promise<JournalPage>{
+        const params: Record<string, string> = { since: since.toString() };
+        if (limit !== null){ params.limit = limit.toString(); }
+        return await this.fetcher.get(`/api/database/changes`, params).then(res=>res.json());
+    };
     async getAllTags(): Promise<string[]>{
         return await this.fetcher.get(`/api/database/tags`).then(res=>res.json());
     };
@@ -99,6 +109,19 @@ export class ServerConn {
         }).then(res=>res.json());
     }
 
+    async getDatapointSummaryColumns( uids: string[] ): Promise<DataInfoColumnsT>{
+        return await this.fetcher.post(`/api/datainfo-list`, {
+            uids: JSON.stringify(uids),
+            columns: 'true',
+        }).then(res=>res.json());
+    }
+
+    async getDatapointSummariesPage(limit = 1000, cursor: string | null = null): Promise<DataInfoPage>{
+        const params: Record<string, string> = { limit: limit.toString() };
+        if (cursor !== null){ params.cursor = cursor; }
+        return await this.fetcher.post(`/api/datainfo-list`, params).then(res=>res.json());
+    }
+
     async deleteDatapoint(uid: string): Promise<boolean>{
         return await this.fetcher.post(`/api/dataman/delete`, {
             uuid: uid,
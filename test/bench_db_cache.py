@@ -0,0 +1,126 @@
+"""
+Benchmark the author / tag reverse index (DBConnectionCache),
+compared with the legacy implementation, which stores the uuid lists as json strings in an in-memory sqlite database.
+
+Usage: python bench_db_cache.py [n_entries]
+"""
+import sys, json, random, uuid, asyncio, functools
+import aiosqlite
+from lires.core.dbConn import DBConnectionCache, DBFileInfo
+from lires.utils import Timer
+from lires.utils.author import format_author_name
+
+class LegacyDBConnectionCache:
+    """ The cache implementation before v1.9.0, only kept for comparison """
+    async def init(self):
+        self.conn = await aiosqlite.connect(":memory:")
+        await self.conn.execute("CREATE TABLE authors (author TEXT PRIMARY KEY, entries TEXT NOT NULL)")
+        await self.conn.execute("CREATE TABLE tags (tag TEXT PRIMARY KEY, entries TEXT NOT NULL)")
+        return self
+
+    async def build_init_cache(self, all_items: list[DBFileInfo]):
+        authors_cache: dict[str, list[str]] = {}
+        tags_cache: dict[str, list[str]] = {}
+        for item in all_items:
+            for author in item["authors"]:
+                authors_cache.setdefault(format_author_name(author), []).append(item["uuid"])
+            for tag in item["tags"]:
+                tags_cache.setdefault(tag, []).append(item["uuid"])
+        for author, entries in authors_cache.items():
+            await self.conn.execute("INSERT INTO authors (author, entries) VALUES (?, ?)", (author, json.dumps(entries)))
+        for tag, entries in tags_cache.items():
+            await self.conn.execute("INSERT INTO tags (tag, entries) VALUES (?, ?)", (tag, json.dumps(entries)))
+
+    async def _query_by(self, table: str, col: str, q: list[str], strict: bool, ignore_case: bool) -> set[str]:
+        res_list: list[set[str]] = []
+        for item in q:
+            if strict and not ignore_case:
+                q_cond = "{}=?".format(col)
+            elif strict and ignore_case:
+                q_cond = "{}=? COLLATE NOCASE".format(col)
+            elif not strict and not ignore_case:
+                q_cond = "{} LIKE ?".format(col)
+            else:
+                q_cond = "{} LIKE ? COLLATE NOCASE".format(col)
+            q_item = item if strict else f"%{item}%"
+            found_uids = []
+            async with self.conn.execute("SELECT entries FROM {} WHERE ".format(table) + q_cond, (q_item,)) as cursor:
+                for row in await cursor.fetchall():
+                    found_uids.append(json.loads(row[0]))
+            if not found_uids: continue
+            res_list.append(set(functools.reduce(lambda x, y: x+y, found_uids)))
+        if not res_list: return set()
+        return functools.reduce(lambda x, y: x.intersection(y), res_list)
+
+    async def query_authors(self, q: list[str], strict: bool = False, ignore_case: bool = True) -> set[str]:
+        return await self._query_by("authors", "author", [format_author_name(x) for x in q], strict, ignore_case)
+    async def query_tags(self, q: list[str], strict: bool = False, ignore_case: bool = True) -> set[str]:
+        return await self._query_by("tags", "tag", q, strict, ignore_case)
+
+    async def remove_tag_cache(self, uuid: str, tags: list[str]):
+        for tag in tags:
+            async with self.conn.execute("SELECT entries FROM tags WHERE tag=?", (tag,)) as cursor:
+                ret = await cursor.fetchone()
+            if ret is None: continue
+            entries: list[str] = json.loads(ret[0])
+            entries.remove(uuid)
+            if not entries:
+                await self.conn.execute("DELETE FROM tags WHERE tag=?", (tag,))
+            await self.conn.execute("UPDATE tags SET entries=? WHERE tag=?", (json.dumps(entries), tag))
+
+    async def add_tag_cache(self, uuid: str, tags: list[str]):
+        for tag in tags:
+            async with self.conn.execute("SELECT entries FROM tags WHERE tag=?", (tag,)) as cursor:
+                ret = await cursor.fetchone()
+            if ret is None:
+                await self.conn.execute("INSERT INTO tags (tag, entries) VALUES (?, ?)", (tag, json.dumps([uuid])))
+            else:
+                entries: list[str] = json.loads(ret[0])
+                entries.append(uuid)
+                await self.conn.execute("UPDATE tags SET entries=? WHERE tag=?", (json.dumps(entries), tag))
+
+def make_items(n: int) -> list[DBFileInfo]:
+    random.seed(0)
+    authors = [f"Family{i}, Given{i}" for i in range(max(n//3, 1))]
+    tags = [f"topic{i}->sub{j}" for i in range(50) for j in range(10)] + ["popular"]
+    items = []
+    for _ in range(n):
+        items.append({
+            "uuid": str(uuid.uuid4()),
+            "authors": random.sample(authors, min(3, len(authors))),
+            "tags": random.sample(tags, 2) + (["popular"] if random.random() < 0.5 else []),
+        })    # type: ignore
+    return items
+
+async def bench(name: str, cache, items: list[DBFileInfo]):
+    print(f"--- {name} ---")
+    with Timer("build"):
+        await cache.build_init_cache(items)
+
+    results = []
+    with Timer("200 strict tag queries"):
+        for i in range(200):
+            results.append(await cache.query_tags([f"topic{i%50}->sub{i%10}", "popular"], strict=True, ignore_case=False))
+    with Timer("200 substring author queries"):
+        for i in range(200):
+            results.append(await cache.query_authors([f"family{i*7}"], strict=False, ignore_case=True))
+    with Timer("1000 edits on a popular tag"):
+        for item in [item for item in items if "popular" in item["tags"]][:500]:
+            await cache.remove_tag_cache(item["uuid"], ["popular"])
+            await cache.add_tag_cache(item["uuid"], ["popular"])
+    return results
+
+async def main(n: int):
+    items = make_items(n)
+    print(f"Benchmark with {n} entries")
+    new_res = await bench("DBConnectionCache", await DBConnectionCache().init(), items)
+    legacy = await LegacyDBConnectionCache().init()
+    try:
+        legacy_res = await bench("Legacy (json in sqlite)", legacy, items)
+    finally:
+        await legacy.conn.close()
+    assert new_res == legacy_res, "Results mismatch"
+    print("Results match")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,64 @@
+"""
+Benchmark the memory and serialization of the summaries of many entries,
+the legacy (dict-based) DataPointSummary, the slotted DataPointSummary, and the columnar SummaryBatch.
+
+Usage: python bench_summary_batch.py [n_entries]
+"""
+import sys, json, random, uuid, tracemalloc, dataclasses
+from lires.core.dataClass import summary_values
+from lires.types.dataT import DataPointSummary, SummaryBatch
+from lires.utils import Timer
+
+# The summary before v1.9.0 (without slots), only kept for comparison
+LegacyDataPointSummary = dataclasses.make_dataclass(
+    "LegacyDataPointSummary", [f.name for f in dataclasses.fields(DataPointSummary)]
+)
+
+def make_raw_infos(n: int) -> list[dict]:
+    random.seed(0)
+    tags = [f"topic{i}->sub{j}" for i in range(50) for j in range(10)]
+    infos = []
+    for i in range(n):
+        authors = [f"Family{random.randrange(n)}, Given" for _ in range(3)]
+        infos.append({
+            "uuid": str(uuid.uuid4()), "type": "article", "doc_size": random.randrange(1<<22), "doc_ext": ".pdf",
+            "year": str(1990 + i % 35), "title": f"Title of the paper {i}", "authors": authors,
+            "author_abbr": authors[0] + " et al.", "publication": f"Journal {i % 100}", "tags": random.sample(tags, 3),
+            "url": f"https://example.com/{i}", "time_import": 1.7e9 + i, "time_modify": 1.7e9 + i,
+            "bibtex": f"@article{{key{i},\n  title = {{Title of the paper {i}}},\n}}",
+            "note_linecount": i % 20, "has_abstract": bool(i % 2),
+        })
+    return infos
+
+def measure(name: str, build):
+    tracemalloc.start()
+    with Timer(f"{name}: build"):
+        obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name}: {size/1048576:.1f} MB")
+    return obj
+
+def main(n: int):
+    print(f"Benchmark with {n} entries")
+    # the field values are shared by all variants, only the containers are measured
+    rows = [summary_values(info) for info in make_raw_infos(n)]   # type: ignore
+
+    legacy = measure("legacy summaries", lambda: [LegacyDataPointSummary(*r) for r in rows])
+    slotted = measure("slotted summaries", lambda: [DataPointSummary(*r) for r in rows])
+    batch = measure("summary batch", lambda: SummaryBatch.from_rows(rows))
+
+    with Timer("legacy summaries: json"):
+        legacy_s = json.dumps([s.__dict__ for s in legacy])
+    with Timer("slotted summaries: json"):
+        slotted_s = json.dumps([s.json() for s in slotted])
+    with Timer("summary batch: json"):
+        batch_s = json.dumps(batch.json())
+    print(f"json size (rows / columns): {len(slotted_s)/1048576:.1f} MB / {len(batch_s)/1048576:.1f} MB")
+
+    assert json.loads(legacy_s) == json.loads(slotted_s), "Results mismatch"
+    assert [s.json() for s in SummaryBatch(json.loads(batch_s))] == json.loads(slotted_s), "Results mismatch"
+    print("Results match")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,66 @@
+"""
+Benchmark the queries with long uuid lists (DBConnection.get_many, sort_keys, check_nonexist, filter with from_uids),
+the lists longer than SQL_INLINE_LIST_MAX are passed as a single json array,
+compared with the legacy implementation, which uses one placeholder per uuid.
+
+Usage: python bench_uuid_list.py [n_entries]
+"""
+import sys, asyncio, tempfile, shutil, sqlite3
+import lires.core.dbConn as dbConn
+from lires.core.dbConn import DBConnection
+from lires.utils import Timer
+
+async def populate(db: DBConnection, n: int):
+    entries: list[dbConn.DBEntryT] = [{
+        "bibtex": "", "dtype": "article", "title": f"Title {i}", "year": 2000 + i % 20, "publication": f"J{i % 50}",
+        "authors": [f"Family{i % 1000}, Given"], "tags": [f"topic{i % 30}"], "url": "", "abstract": "", "comments": "",
+        "doc_ext": "", "doc_size": 0, "doc_info": None,
+    } for i in range(n)]
+    for i in range(0, n, 10000):
+        await db.add_entries(entries[i:i+10000])
+    await db.commit()
+
+async def bench(name: str, db: DBConnection, uids: list[str]):
+    print(f"--- {name} ---")
+    results = []
+    for n in (1_000, 10_000, 100_000):
+        if n > len(uids): break
+        ids = uids[:n]
+        try:
+            with Timer(f"get_many {n}"):
+                results.append([x["uuid"] for x in await db.get_many(ids, fields=["uuid"])])
+            with Timer(f"sort_keys {n}"):
+                results.append(await db.sort_keys(ids, "year"))
+            with Timer(f"check_nonexist {n}"):
+                results.append(await db.check_nonexist(ids + ["not-exist"]))
+            with Timer(f"filter from_uids {n}"):
+                results.append(await db.filter(from_uids=ids, year=(2005, 2010)))
+        except sqlite3.OperationalError as e:
+            print(f"{n} ids failed: {e}")
+            results.append(None)
+    return results
+
+async def main(n: int):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db = await DBConnection(tmp_dir).init()
+        print(f"Benchmark with {n} entries")
+        # the legacy implementation fails if the list is longer than this limit (32766 by default)
+        print("Maximum number of host parameters: {}".format(
+            sqlite3.connect(":memory:").getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+            ))
+        await populate(db, n)
+        uids = await db.keys()
+
+        new_res = await bench("json array for long lists", db, uids)
+        # legacy: one placeholder per uuid
+        dbConn.SQL_INLINE_LIST_MAX = sys.maxsize
+        legacy_res = await bench("Legacy (placeholders)", db, uids)
+        assert all(b is None or a == b for a, b in zip(new_res, legacy_res)), "Results mismatch"
+        print("Results match")
+        await db.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
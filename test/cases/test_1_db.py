@@ -1,8 +1,17 @@
 
-from lires.core.dbConn import DBConnection
+from lires.core import dbConn
+from lires.core.dbConn import DBConnection, dump_list
 from lires.core.dataClass import DataBase
+from lires.core import fileTools
+from lires.core.fileTools import add_documents
+from lires.core.blobStore import BlobStore
+from lires.core.tagTree import TagTree
+from lires.core.dataTags import DataTags, TagRule
+from lires.core.fileLayout import shard_dir, iter_documents, migrate_layout
+from lires.types.dataT import SummaryBatch
+from lires.loader import DatabasePool
 from lires.config import LRS_HOME
-import pytest, os, asyncio
+import pytest, os, io, json, stat, types, shutil, asyncio, zipfile
 
 db_dir = os.path.join(LRS_HOME, "db_tmp")
 @pytest.fixture(scope="module")
@@ -30,6 +39,9 @@ class TestDB:
             assert uid0
             assert (raw := await conn.get(uid0))
             assert raw["title"] == "test title0"
+            assert (await conn.get(uid0, fields=["uuid", "tags"])) == {"uuid": uid0, "tags": ["tag0", "tag1->tag2", 'tag3->tag4']}
+            with pytest.raises(ValueError):
+                await conn.get(uid0, fields=["uuid; DROP TABLE files"])
 
             uid1 = await conn.add_entry(
                 bibtex="",
@@ -68,13 +80,100 @@ class TestDB:
 
             assert (await conn.filter( tags = ["tag0"], from_uids=[uid0])) == [uid0]
 
+            assert (await conn.find_duplicates("Test  Title1.", "2021")) == [uid1]
+            assert (await conn.find_duplicates("test title1", 2020)) == []
+
             assert set(await conn.tags()) == set(("tag0", "tag1", "tag1->tag2", "tag3->tag4", "tag3->tag5"))
             assert set(await conn.authors()) == set(("author0", "author1", "fam2, author2", "fam3, author3"))
+            assert (await conn.cache.tags_with_prefix("tag3->")) == ["tag3->tag4", "tag3->tag5"]
+            assert (await conn.cache.query_authors(["Author2 Fam2"], strict=True, ignore_case=True)) == {uid1}
 
             await conn.commit()
         
         asyncio.run(_test())
-    
+
+    def test_db_fulltext(self, conn: DBConnection):
+        async def _test():
+            uid0 = (await conn.filter(title="test title0"))[0]
+            await conn.update_comments(uid0, "Full-text indexed NOTE")
+            assert (await conn.get(uid0, fields=["note_linecount", "has_abstract", "author_abbr", "doc_size"])) == {
+                "note_linecount": 1, "has_abstract": True, "author_abbr": "author0 et al.", "doc_size": 0
+                }
+            assert (await conn.filter(note="text index", strict=False)) == [uid0]
+            assert (await conn.filter(note="second", strict=False)) != [uid0]
+
+            # short queries fall back to LIKE
+            assert len(await conn.filter(title="e0", strict=False)) == 1
+
+            await conn.update_bibtex(uid0, "", "article", "new title0", "2021", "new publication0", ["author0", "author1"])
+            assert (await conn.filter(title="new title", strict=False)) == [uid0]
+            assert (await conn.filter(title="test title0", strict=False)) == []
+
+            # the index can be rebuilt from the main table
+            await conn.rebuild_fts()
+            assert (await conn.filter(title="new title", publication="publication0", strict=False)) == [uid0]
+
+            # the index follows the changes by other tools, and survives VACUUM
+            await conn.conn.execute("UPDATE files SET title='other title0' WHERE uuid=?", (uid0,))
+            assert (await conn.filter(title="other title", strict=False)) == [uid0]
+            await conn.conn.execute("UPDATE files SET title='new title0' WHERE uuid=?", (uid0,))
+            await conn.commit()
+            await conn.conn.execute("VACUUM")
+            assert (await conn.filter(title="new title", strict=False)) == [uid0]
+            assert (await conn.query("title:title0")) == [uid0]
+            await conn.commit()
+        asyncio.run(_test())
+
+    def test_db_fulltext_fallback(self, monkeypatch: pytest.MonkeyPatch):
+        # without the trigram tokenizer, the text queries use LIKE
+        monkeypatch.setattr(dbConn, "FTS_MIN_SQLITE_VERSION", (99, 0, 0))
+        async def _test():
+            async with DBConnection(_db_dir := os.path.join(LRS_HOME, "db_tmp_nofts")) as _conn:
+                await _conn.init()
+                assert not _conn.fts_enabled
+                uid = await _conn.add_entry("", "article", "fallback title", 2020, "pub", ["author0"], comments="some note")
+                assert (await _conn.filter(title="back tit", strict=False)) == [uid]
+                assert (await _conn.query("note:some")) == [uid] and (await _conn.query("missing")) == []
+            shutil.rmtree(_db_dir)
+        asyncio.run(_test())
+
+    def test_db_query(self, conn: DBConnection):
+        async def _test():
+            uid0 = (await conn.filter(title="new title0"))[0]
+            uid1 = (await conn.filter(title="test title1"))[0]
+            assert set(await conn.query("tag:tag0")) == {uid0, uid1}
+            assert (await conn.query("tag:tag1")) == [uid1]
+            assert set(await conn.query("tag:tag1->*")) == {uid0, uid1}
+            assert set(await conn.query("tag:tag3->*")) == {uid0, uid1}
+            assert (await conn.query('tag:tag3->* -tag:"tag3->tag5"')) == [uid0]
+            assert (await conn.query("author:fam2")) == [uid1]
+            assert (await conn.query('author:"Author2 Fam2"')) == [uid1]
+            assert set(await conn.query("author:fam2 OR note:indexed")) == {uid0, uid1}
+            assert (await conn.query("(title:title1 OR title:title0) AND NOT tag:tag1")) == [uid0]
+            assert (await conn.query("year:2021 type:ARTICLE")) == [uid0]
+            assert len(await conn.query("year:2020..2021")) == len(await conn.query("year:>=2021")) == 2
+            assert (await conn.query("year:<2021")) == []
+            assert (await conn.query("uuid:{}".format(uid1[:8]))) == [uid1]
+            assert set(await conn.query("has:abstract has:note")) == {uid0, uid1}
+            assert (await conn.query("-has:note")) == []
+
+            # free text terms are ranked by relevance
+            assert (await conn.query("second OR indexed"))[0] in {uid0, uid1}
+            assert (await conn.query("title OR second"))[0] == uid1
+
+            for q in ["(tag:tag0", "year:abc", "has:nothing", "tag:tag0 OR", "title:"]:
+                with pytest.raises(ValueError):
+                    await conn.query(q)
+
+            # the index tables follow the updates
+            await conn.update_tags(uid0, ["tag0", "tag6->tag7"])
+            assert (await conn.query("tag:tag6->*")) == [uid0]
+            await conn.update_tags(uid0, ["tag0", "tag1->tag2", "tag3->tag4"])
+            await conn.rebuild_entry_index()
+            assert set(await conn.query("tag:tag1->*")) == {uid0, uid1}
+            await conn.commit()
+        asyncio.run(_test())
+
     def test_database_search(self):
         async def _test():
             database = await DataBase().init(db_dir)
@@ -84,9 +183,493 @@ class TestDB:
             assert len(await database.data_from_tags(['tag1->tag2'])) == 1
             assert len(await database.data_from_tags(['tag3'])) == 2
             assert len(await database.data_from_tags(['tag3', 'tag1'])) == 2
+            for tags in [['tag1'], ['tag1->tag2'], ['tag3', 'tag1'], ['tag0', 'tag5'], ['tag']]:
+                assert await database.ids_from_tags(tags) == await database.conn.query(database.tags_query(tags))
+            # the tags are normalized, no tags matches all entries
+            assert await database.ids_from_tags([" tag1 -> tag2"]) == await database.ids_from_tags(["tag1->tag2"])
+            assert await database.conn.query(database.tags_query([" tag1 -> tag2", "tag1->tag2"])) == await database.ids_from_tags(["tag1->tag2"])
+            assert await database.ids_from_tags([]) == await database.conn.keys(sortby="time_import", reverse=True)
+            assert set(await database.ids_from_tags([], sort=False)) == set(await database.keys())
             await database.close()
         asyncio.run(_test())
-    
+
+    def test_database_tag_bulk(self):
+        async def _test():
+            database = await DataBase().init(db_dir)
+            uids = (await database.keys())[:3]
+            for uid in uids:
+                await database.conn.update_tags(uid, ["bulk->a", "bulk->a->b", "other"])
+            latest = (await database.conn.changes())["latest"]
+            reported = []
+            async def _progress(n: int, total: int):
+                reported.append((n, total))
+
+            await database.rename_tag("bulk->a", "renamed", progress=_progress)
+            assert reported == [(len(uids), len(uids))]
+            for uid in uids:
+                assert (await database.get(uid)).summary.tags == ["other", "renamed", "renamed->b"]
+            assert await database.ids_from_tags(["renamed"], sort=False) and not await database.ids_from_tags(["bulk->a"])
+            assert len((await database.conn.changes(latest))["changes"]) == len(uids)
+
+            await database.delete_tag("renamed")
+            for uid in uids:
+                assert (await database.get(uid)).summary.tags == ["other"]
+            assert "renamed->b" not in await database.conn.tags()
+            async with database.conn.conn.execute("SELECT count(*) FROM entry_tags WHERE tag LIKE 'renamed%'") as cursor:
+                assert (await cursor.fetchone())[0] == 0
+            await database.close()
+        asyncio.run(_test())
+
+    def test_tag_tree(self):
+        tree = TagTree()
+        tree.add("a->b", "u1"); tree.add("a->b->c", "u1"); tree.add("a->d", "u2"); tree.add("ab", "u3")
+        assert set(tree.subtree_uuids("a")) == {"u1", "u2"}
+        assert set(tree.subtree_uuids("a->b")) == {"u1"} and not tree.has("a")
+        assert sorted(tree.subtree_tags("a")) == ["a->b", "a->b->c", "a->d"]
+        tree.remove("a->b", "u1")
+        assert set(tree.subtree_uuids("a->b")) == {"u1"}
+        tree.remove("a->b->c", "u1")
+        assert "b" not in tree.root.children["a"].children
+        assert sorted(tree.tags()) == ["a->d", "ab"]
+
+        # tag pools
+        tags = DataTags(["a->b->c", "x"])
+        assert tags.with_parents() == {"a", "a->b", "a->b->c", "x"}
+        assert tags.with_childs_from(DataTags(["a->b->c->d", "a->b->cd", "x->y", "xy"])) == {"a->b->c", "a->b->c->d", "x", "x->y"}
+        assert TagRule.all_childs("a->b", ["a", "a->b", "a->b->c", "a->bc"]) == {"a->b->c"}
+        assert TagRule.all_childs("a", ["a", "a->b", "ab", "a->b->c"]) == {"a->b", "a->b->c"}
+        assert TagRule.delete_tag(DataTags(["a->b", "a->b->c", "b->c"]), "a->b") == {"b->c"}
+
+    def test_db_bulk_import(self, conn: DBConnection):
+        async def _test():
+            def _bib(i: int, title: str):
+                return "@article{bulk%d,\n title={%s},\n author={Doe, John and author%d},\n year={2022},\n journal={J%d}\n}" % (i, title, i, i)
+            citations = [_bib(i, f"bulk title{i}") for i in range(3)] + ["@article{invalid,", _bib(3, "Bulk Title0")]
+            results = await add_documents(conn, citations, tags=["bulk"])
+            assert [r["uuid"] is not None for r in results] == [True, True, True, False, False]
+            assert results[3]["error"] and results[4]["error"]
+
+            assert len(await conn.filter(tags=["bulk"])) == 3
+            assert len(await conn.filter(authors=["Doe, John"])) == 3
+            assert (await conn.filter(title="bulk title2", strict=False)) == [results[2]["uuid"]]
+
+            # duplicates of existing entries are rejected
+            assert (await add_documents(conn, [_bib(4, "bulk title1")]))[0]["uuid"] is None
+
+            # large batches are parsed in the shared process pool
+            n_large = fileTools.BULK_PARSE_MIN_PARALLEL + 6
+            large = await add_documents(conn, [_bib(i, f"large title{i}") for i in range(n_large)], tags=["bulk"])
+            executor = fileTools._get_parse_executor()
+            large += await add_documents(conn, [_bib(i, f"large title{i}") for i in range(n_large, 2*n_large)], tags=["bulk"])
+            assert all(r["uuid"] is not None for r in large) and fileTools._get_parse_executor() is executor
+            results += large
+
+            for r in results[:3] + results[5:]:
+                await conn.remove_entry(r["uuid"])
+            assert await conn.filter(tags=["bulk"]) == []
+            await conn.commit()
+        asyncio.run(_test())
+
+    def test_db_pagination(self, conn: DBConnection):
+        async def _test():
+            citations = ["@article{page%d,\n title={page title%d},\n author={Roe, Ann},\n year={%d},\n journal={J}\n}" % (i, i, 2000 + i%3) for i in range(7)]
+            uids = [r["uuid"] for r in await add_documents(conn, citations, tags=["page"])]
+            all_keys = await conn.keys(sortby="year", reverse=False)
+
+            # keyset pages are disjoint and cover all keys in order, even with ties of the sort field
+            pages, after = [], None
+            while (page := await conn.keys(sortby="year", reverse=False, after=after, limit=3)):
+                pages.extend(page)
+                after = await conn.page_cursor(page[-1], "year")
+            assert len(pages) == len(all_keys) and set(pages) == set(all_keys)
+            assert [p for page in [p async for p in conn.iter_keys("year", False, page_size=2)] for p in page] == pages
+
+            sorted_uids = await conn.sort_keys(uids, "year", reverse=True)
+            first = await conn.filter(tags=["page"], sort_by="year", limit=4)
+            rest = await conn.filter(tags=["page"], sort_by="year", after=await conn.page_cursor(first[-1], "year"))
+            assert first + rest == sorted_uids
+            first = await conn.filter(title="page title", strict=False, sort_by="year", limit=4)
+            assert first == sorted_uids[:4]
+            assert (await conn.sort_keys(uids, "year", after=await conn.page_cursor(first[-1], "year"))) == sorted_uids[4:]
+
+            for uid in uids:
+                await conn.remove_entry(uid)
+            await conn.commit()
+        asyncio.run(_test())
+
+    def test_db_long_lists(self, conn: DBConnection):
+        async def _test():
+            # long lists are passed as a json array instead of placeholders
+            uid0 = (await conn.filter(title="new title0"))[0]
+            fake = ["not-exist-{}".format(i) for i in range(1000)]
+            assert set(await conn.check_nonexist(fake + [uid0])) == set(fake)
+            assert (await conn.filter(from_uids=fake + [uid0], year=2021)) == [uid0]
+            assert (await conn.sort_keys(fake + [uid0])) == [uid0]
+        asyncio.run(_test())
+
+    def test_db_query_plan(self, conn: DBConnection):
+        async def _test():
+            statements: list[str] = []
+            async def plans(coro) -> list[str]:
+                # the query plans of the statements executed by the coroutine
+                statements.clear()
+                await conn.conn.set_trace_callback(statements.append)
+                await coro
+                await conn.conn.set_trace_callback(None)
+                ret = []
+                for sql in statements:
+                    async with conn.conn.execute("EXPLAIN QUERY PLAN " + sql) as cursor:
+                        ret.extend(row[3] for row in await cursor.fetchall())
+                assert ret and "SCAN files" not in ret      # no full table scan
+                return ret
+
+            for p in [
+                await plans(conn.keys(sortby="time_import", reverse=True, limit=10)),
+                await plans(conn.keys(sortby="time_import", reverse=True)),
+            ]:
+                assert "SCAN files USING COVERING INDEX idx_files_time_import" in p
+                assert "USE TEMP B-TREE FOR ORDER BY" not in p
+            assert any("COVERING INDEX idx_files_year" in x for x in await plans(conn.filter(year=(2020, 2022))))
+            assert any("INDEX idx_files_year" in x for x in await plans(conn.query("year:2020..2021")))
+            # the index tables are always read by an index, which one depends on the statistics
+            assert all("entry_tags USING" in x for x in await plans(conn.query("tag:tag1->*")) if "entry_tags" in x)
+            await plans(conn.query("has:doc"))
+            await plans(conn.sort_keys(await conn.keys(), "time_modify"))
+            await conn.optimize(analyze=True)
+        asyncio.run(_test())
+
+    def test_db_lock(self, conn: DBConnection):
+        async def _test():
+            async with conn.conn.execute("PRAGMA journal_mode") as cursor:
+                assert (await cursor.fetchone())[0] == "wal"     # type: ignore
+
+            uid0 = (await conn.filter(title="new title0"))[0]
+            n_contended = (await conn.lock_stats())["n_contended"]
+            await asyncio.gather(*[conn.update_url(uid0, f"https://example.com/{i}") for i in range(5)])
+            assert (await conn.lock_stats())["n_contended"] > n_contended
+
+            # other databases are not blocked
+            other = await DBConnection(os.path.join(LRS_HOME, "db_tmp_other")).init()
+            async with conn.lock:
+                await asyncio.wait_for(other.update_url("not-exist", ""), timeout=1)
+            await other.close()
+            await conn.commit()
+        asyncio.run(_test())
+
+    def test_db_readers(self):
+        async def _test():
+            db = await DBConnection(db_dir, n_readers=2).init()
+            assert len(db.readers) == 2
+            uid0 = (await db.filter(title="new title0"))[0]
+            assert db._reader() is not db.conn
+
+            # uncommitted changes are visible, reads go to the writer
+            await db.update_url(uid0, "https://example.com/readers")
+            assert db._reader() is db.conn
+            assert (await db.get(uid0, fields=["url"])) == {"url": "https://example.com/readers"}
+
+            await db.commit()
+            assert db._reader() is not db.conn
+            assert (await db.get(uid0, fields=["url"])) == {"url": "https://example.com/readers"}
+            await db.close()
+        asyncio.run(_test())
+
+    def test_db_durability(self):
+        async def _test():
+            db = await DBConnection(db_dir, n_readers=1, durability="group", group_commit_ms=50).init()
+            uid0 = (await db.filter(title="new title0"))[0]
+            # concurrent modifications are committed in one transaction
+            await asyncio.gather(*[db.update_comments(uid0, f"group commit {i}") for i in range(5)])
+            assert (await db.commit_stats())["n_commit"] == 0
+            await asyncio.sleep(0.2)
+            assert (await db.commit_stats())["n_commit"] == 1
+            assert not db.conn.in_transaction
+
+            db.durability = "immediate"
+            await db.update_url(uid0, "https://example.com/immediate")
+            assert (stats := await db.commit_stats())["n_commit"] == 2
+            assert stats["latency_max"] >= stats["latency_last"] > 0
+            assert not db.conn.in_transaction
+            await db.close()
+        asyncio.run(_test())
+
+    def test_db_entry_index(self):
+        async def _test():
+            db = await DBConnection(db_dir).init()
+            uid0 = (await db.filter(title="new title0"))[0]
+            # the cache is loaded from the index tables on the first query
+            assert not db.cache._loaded
+            assert set(await db.tags()) == set(("tag0", "tag1", "tag1->tag2", "tag3->tag4", "tag3->tag5"))
+            assert db.cache._loaded
+
+            # modifications without updating the index tables are re-indexed on the next init
+            await db.conn.execute("UPDATE files SET tags=? WHERE uuid=?", (dump_list(["tag0", "tag8"]), uid0))
+            await db.conn.commit()
+            await db.close()
+            db = await DBConnection(db_dir).init()
+            assert (await db.query("tag:tag8")) == [uid0]
+            assert (await db.filter(tags=["tag8"])) == [uid0]
+            assert (await db.sync_entry_index()) == 0
+
+            await db.update_tags(uid0, ["tag0", "tag1->tag2", "tag3->tag4"])
+            assert "tag8" not in await db.tags()
+            await db.close()
+        asyncio.run(_test())
+
+    def test_db_journal(self):
+        async def _test():
+            db = await DBConnection(db_dir).init()
+            uid0 = (await db.filter(title="new title0"))[0]
+            latest = (await db.changes())["latest"]
+            assert latest > 0 and (await db.changes(latest)) == {"changes": [], "latest": latest, "resync": False}
+
+            await db.update_url(uid0, "https://example.com/journal")
+            uid2 = await db.add_entry("", "article", "journal title", 2022, "", ["author0"])
+            assert uid2
+            await db.remove_entry(uid2)
+            page = await db.changes(latest)
+            assert [(x["uuid"], x["op"], x["fields"]) for x in page["changes"]] == [
+                (uid0, "update", ["url"]), (uid2, "add", []), (uid2, "delete", [])
+                ]
+            assert page["latest"] == page["changes"][-1]["seq"]
+            assert (await db.changes(latest, limit=1))["latest"] == page["changes"][0]["seq"]
+            # a client with an unknown position should fetch everything
+            assert (await db.changes(page["latest"] + 1))["resync"]
+
+            # the clients behind the compacted entries should resync
+            assert (await db.compact_journal(max_size=1)) > 0
+            assert (await db.changes(latest))["resync"]
+            assert not (await db.changes(page["latest"] - 1))["resync"]
+            await db.commit()
+            await db.close()
+        asyncio.run(_test())
+
+    def test_database_backup(self):
+        async def _test():
+            backup_dir = os.path.join(LRS_HOME, "db_tmp_backup")
+            database = await DataBase().init(db_dir)
+            doc = os.path.join(database.path.file_dir, "backup-test.pdf")
+            with open(doc, "wb") as f:
+                f.write(b"pdf content")
+
+            stats = await database.backup(backup_dir)
+            assert stats["n_copied"] == stats["n_files"] >= 1 and stats["n_removed"] == 0
+            async with DBConnection(backup_dir) as backup:
+                await backup.init()
+                assert (await backup.size()) == (await database.count())
+
+            # only the changed files are copied
+            assert (await database.backup(backup_dir))["n_copied"] == 0
+            with open(doc, "wb") as f:
+                f.write(b"new pdf content")
+            assert (await database.backup(backup_dir))["n_copied"] == 1
+            with open(os.path.join(backup_dir, "files", "backup-test.pdf"), "rb") as f:
+                assert f.read() == b"new pdf content"
+            os.remove(doc)
+            assert (await database.backup(backup_dir))["n_removed"] == 1
+            assert not os.path.exists(os.path.join(backup_dir, "files", "backup-test.pdf"))
+
+            with pytest.raises(ValueError):
+                await database.backup(os.path.join(db_dir, "backup"))
+            await database.close()
+
+            # the databases not loaded in the pool are not kept after the backup
+            os.makedirs(pool_home := os.path.join(LRS_HOME, "pool_tmp"), exist_ok=True)
+            pool = DatabasePool(pool_home)
+            await pool.backup([types.SimpleNamespace(id=1)], os.path.join(pool_home, "backup"))      # type: ignore
+            assert os.path.exists(os.path.join(pool_home, "backup", "1", "lrs.db")) and list(pool) == []
+            shutil.rmtree(pool_home)
+        asyncio.run(_test())
+
+    def test_database_dump(self):
+        async def _test():
+            database = await DataBase().init(db_dir)
+            for fname in ["dump-test.pdf", "dump-test.txt"]:
+                with open(os.path.join(database.path.file_dir, fname), "wb") as f:
+                    f.write(b"dump content " * 1000)
+            chunks = [chunk async for chunk in database.dump_stream()]
+            with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+                assert zf.testzip() is None
+                assert zf.getinfo("files/dump-test.pdf").compress_type == zipfile.ZIP_STORED
+                assert zf.getinfo("files/dump-test.txt").compress_type == zipfile.ZIP_DEFLATED
+                assert zf.read("files/dump-test.pdf") == b"dump content " * 1000
+                with open(os.path.join(LRS_HOME, "dump-test.db"), "wb") as f:
+                    f.write(zf.read("lrs.db"))
+            async with DBConnection(LRS_HOME, "dump-test.db") as dumped:
+                await dumped.init()
+                assert (await dumped.size()) == (await database.count())
+            os.remove(os.path.join(LRS_HOME, "dump-test.db"))
+            for fname in ["dump-test.pdf", "dump-test.txt"]:
+                os.remove(os.path.join(database.path.file_dir, fname))
+            await database.close()
+        asyncio.run(_test())
+
+    def test_file_layout(self):
+        async def _test():
+            database = await DataBase().init(db_dir)
+            uid = (await database.keys())[0]
+            dp = await database.get(uid)
+            file_dir = database.path.file_dir
+
+            # the entries in the flat layout are found, and moved to the sharded layout
+            with open(os.path.join(file_dir, uid + ".pdf"), "wb") as f:
+                f.write(b"layout test")
+            await database.conn.set_doc_ext(uid, ".pdf")
+            os.mkdir(os.path.join(file_dir, uid))
+            with open(os.path.join(file_dir, uid, "note.txt"), "w") as f:
+                f.write("note")
+            assert await dp.fm.filePath() == os.path.join(file_dir, uid + ".pdf")
+            assert dp.fm.list_misc_files() == ["note.txt"]
+            assert os.path.join(file_dir, uid + ".pdf") in list(iter_documents(file_dir))
+
+            assert migrate_layout(file_dir)["n_moved"] == 2
+            assert await dp.fm.filePath() == os.path.join(shard_dir(file_dir, uid), uid + ".pdf")
+            assert dp.fm.list_misc_files() == ["note.txt"]
+            assert (await dp.fm.gather_files())["fname"] == [
+                os.path.relpath(os.path.join(shard_dir(file_dir, uid), n), file_dir) for n in [uid + ".pdf", uid]
+                ]
+            assert list(iter_documents(file_dir)) == [os.path.join(shard_dir(file_dir, uid), uid + ".pdf")]
+
+            # removed with the entry
+            await dp.fm.delete_entry(create_backup=False)
+            assert not os.path.exists(os.path.join(shard_dir(file_dir, uid), uid))
+            assert list(iter_documents(file_dir)) == []
+            await database.close()
+        asyncio.run(_test())
+
+    def test_disk_usage(self):
+        async def _test():
+            database = await DataBase().init(db_dir)
+            usage = await database.disk_usage()
+            files_usage = database.conn.files_usage
+            assert files_usage is not None and usage > files_usage
+
+            # the counter follows the document changes
+            dp = await database.get((await database.keys())[0])
+            if await dp.fm.has_file():
+                await dp.fm.delete_document()
+            files_usage = database.conn.files_usage; assert files_usage is not None
+            await dp.fm.add_file_blob(b"usage test" * 100, ".pdf")
+            assert database.conn.files_usage == files_usage + 1000
+            assert await database.reconcile_disk_usage() == files_usage + 1000
+            await dp.fm.delete_document()
+            assert database.conn.files_usage == files_usage
+
+            # bulk imported documents are counted, in the sharded layout
+            src = os.path.join(LRS_HOME, "bulk_doc.pdf")
+            with open(src, "wb") as f:
+                f.write(b"bulk doc" * 100)
+            bib = "@article{usage,\n title={bulk usage test},\n author={Doe, John},\n year={2023},\n journal={J}\n}"
+            uid = (await add_documents(database.conn, [bib], doc_srcs=[src]))[0]["uuid"]
+            assert uid is not None and database.conn.files_usage == files_usage + 800
+            assert os.path.isfile(os.path.join(shard_dir(database.path.file_dir, uid), uid + ".pdf"))
+            await database.delete(uid)
+            os.remove(src)
+            assert database.conn.files_usage == files_usage
+
+            # the entries moved to the trash are counted, with the trash database
+            uid = (await add_documents(database.conn, [bib]))[0]["uuid"]; assert uid
+            await (await database.get(uid)).fm.add_file_blob(b"trash doc" * 100, ".pdf")
+            await (await database.get(uid)).fm.delete_entry(create_backup=True)
+            assert database.conn.files_usage == await database.reconcile_disk_usage() > files_usage
+            shutil.rmtree(os.path.join(database.path.main_dir, ".trash"))
+            assert await database.reconcile_disk_usage() == files_usage
+
+            # the drift is corrected by the reconciliation
+            with open(os.path.join(database.path.main_dir, "stray.txt"), "wb") as f:
+                f.write(b"stray" * 10)
+            assert database.conn.files_usage == files_usage
+            assert await database.reconcile_disk_usage() == files_usage + 50
+            os.remove(os.path.join(database.path.main_dir, "stray.txt"))
+            assert await database.reconcile_disk_usage() == database.conn.files_usage == files_usage
+            await database.close()
+        asyncio.run(_test())
+
+    def test_datapoint_cache(self):
+        async def _test():
+            database = await DataBase().init(db_dir, cache_size=2)
+            uids = (await database.keys())[:3]
+            dp = await database.get(uids[0])
+            assert await database.get(uids[0]) is dp
+            assert database.cache_stats()["n_hit"] == 1
+
+            # invalidated by the modifications
+            await dp.fm.set_comments("line1\nline2")
+            dp_new = await database.get(uids[0])
+            assert dp_new is not dp and dp_new.summary.note_linecount == 2
+            await dp.fm.set_tags(["cache-test"])
+            assert (await database.get(uids[0])).tags == {"cache-test"}
+
+            # partially cached, in the same order as uncached
+            assert [d.uuid for d in await database.gets(uids)] == await database.conn.sort_keys(uids)
+            assert database.cache_stats()["size"] == 2
+            assert [d.uuid for d in await database.gets(uids, sort_by="title", reverse=False)] == \
+                await database.conn.sort_keys(uids, sort_by="title", reverse=False)
+            await database.close()
+        asyncio.run(_test())
+
+    def test_summary_batch(self):
+        async def _test():
+            database = await DataBase().init(db_dir, cache_size=1)
+            uids = await database.keys()
+            expected = [d.summary.json() for d in await database.gets(uids)]
+            # uncached and partially cached
+            await database.close()
+            database = await DataBase().init(db_dir, cache_size=1)
+            assert [s.json() for s in await database.gets_batch(uids)] == expected
+            await database.get(uids[0])
+            batch = await database.gets_batch(uids)
+            assert len(batch) == len(uids) and [s.json() for s in batch] == expected
+            assert batch.json()["uuid"] == [x["uuid"] for x in expected]
+            assert SummaryBatch(json.loads(json.dumps(batch.json())))[0] == batch[0]
+            await database.close()
+        asyncio.run(_test())
+
+    def test_blob_store(self, monkeypatch: pytest.MonkeyPatch):
+        root = os.path.join(LRS_HOME, "blob_tmp")
+        store = BlobStore(os.path.join(root, ".blobs"))
+        for d in ["a", "b"]:
+            os.makedirs(os.path.join(root, d), exist_ok=True)
+        pa, pb = os.path.join(root, "a", "x.pdf"), os.path.join(root, "b", "y.pdf")
+        digest = store.put(b"blob content" * 100, pa)
+        assert store.put(b"blob content" * 100, pb) == digest
+        assert os.path.samefile(pa, pb) and store.ref_count(digest) == 2
+        assert os.stat(pa).st_mode & stat.S_IWUSR, "the documents should stay writable"
+        store.release(pa)
+        assert store.ref_count(digest) == 1
+        store.release(pb)
+        assert not os.path.exists(store.blob_path(digest))
+
+        # the blob of a replaced document is released
+        digest = store.put(b"replaced content" * 100, pa)
+        digest_new = store.put(b"new content" * 100, pa)
+        assert not os.path.exists(store.blob_path(digest)) and store.ref_count(digest_new) == 1
+        store.release(pa)
+
+        # without hard links (e.g. across devices), the documents are kept out of the store, not copied
+        def _no_link(*_):
+            raise OSError("Invalid cross-device link")
+        with monkeypatch.context() as m:
+            m.setattr(os, "link", _no_link)
+            digest = store.put(b"unlinked content" * 100, pa)
+            assert not os.path.exists(store.blob_path(digest)) and not os.path.exists(pa + ".tmp")
+            with open(pa, "rb") as f:
+                assert f.read() == b"unlinked content" * 100
+        store.release(pa)
+        assert not os.path.exists(pa)
+
+        # migration of the existing documents
+        for p in [pa, pb]:
+            with open(p, "wb") as f:
+                f.write(b"old content" * 100)
+        assert store.dedupe([pa])["bytes_saved"] == 0
+        stats = store.dedupe([pb])
+        assert stats["n_linked"] == 1 and stats["bytes_saved"] == 1100
+        assert os.path.samefile(pa, pb)
+        shutil.rmtree(os.path.join(root, "a")); shutil.rmtree(os.path.join(root, "b"))
+        assert store.gc() == 1
+        shutil.rmtree(root)
+
     def test_finalize(self, conn: DBConnection):
         asyncio.run(conn.commit())
         asyncio.run(conn.close())